@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+FragDB - Approximate Nearest Neighbour Index Example (v4.6)
+
+Demonstrates how to answer "similar to X" queries without scoring the whole
+catalog. The index uses random-projection LSH (SimHash) over the profile
+vectors of a FeatureStore (see feature_store.py):
+
+- each of n_tables hash tables draws n_bits random hyperplanes; a fragrance's
+  bucket code is the sign pattern of its profile against them
+- a query collects the fragrances sharing its bucket in any table (plus
+  neighbouring buckets with multi-probe) and re-ranks only those candidates
+  with the exact cosine similarity
+
+More tables or probes raise recall at the cost of more candidates; more bits
+make buckets smaller and queries faster. recall_at_k() measures the tradeoff
+against the exact FeatureStore.top_k() scan.
+"""
+
+import json
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from load_database import load_fragdb
+from feature_store import FeatureStore, build_feature_store
+
+
+class LSHIndex:
+    """Random-projection LSH tables over the rows of a FeatureStore."""
+
+    def __init__(self, store: FeatureStore, planes: np.ndarray, codes: np.ndarray, order: np.ndarray):
+        """
+        Args:
+            store: FeatureStore the index was built from (used for re-ranking)
+            planes: (n_tables, n_features, n_bits) random hyperplanes
+            codes: (n_tables, n_rows) bucket codes, sorted within each table
+            order: (n_tables, n_rows) row position of each sorted code
+        """
+        self.store = store
+        self.planes = planes
+        self.codes = codes
+        self.order = order
+
+    @property
+    def n_tables(self) -> int:
+        return self.planes.shape[0]
+
+    @property
+    def n_bits(self) -> int:
+        return self.planes.shape[2]
+
+    def _project(self, positions: Optional[np.ndarray] = None) -> np.ndarray:
+        """Hyperplane projections, shaped (rows, n_tables, n_bits)."""
+        n_features = self.planes.shape[1]
+        flat = np.transpose(self.planes, (1, 0, 2)).reshape(n_features, -1)
+        if positions is None:
+            projected = self.store.project(flat)
+        else:
+            vectors = np.hstack([
+                np.vstack([self.store.accord_vector(p) for p in positions]),
+                self.store.dense[positions]
+            ])
+            projected = vectors @ flat
+        return projected.reshape(len(projected), self.n_tables, self.n_bits)
+
+    def _bucket_codes(self, projected: np.ndarray) -> np.ndarray:
+        """Pack sign bits into one uint64 code per table."""
+        weights = np.left_shift(np.uint64(1), np.arange(self.n_bits, dtype=np.uint64))
+        return ((projected > 0).astype(np.uint64) * weights).sum(axis=-1, dtype=np.uint64)
+
+    def candidates(self, position: int, n_probes: int = 0) -> np.ndarray:
+        """Rows sharing a bucket with `position` in any table.
+
+        Args:
+            position: Row of the query fragrance
+            n_probes: Extra buckets probed per table, flipping the bits whose
+                hyperplane the query is closest to (multi-probe LSH)
+
+        Returns:
+            Sorted array of candidate row positions (including the query)
+        """
+        projected = self._project(np.array([position]))[0]
+        base = self._bucket_codes(projected)
+        found = []
+
+        for t in range(self.n_tables):
+            probe_codes = [base[t]]
+            for bit in np.argsort(np.abs(projected[t]))[:n_probes]:
+                probe_codes.append(base[t] ^ np.uint64(1 << int(bit)))
+
+            for code in probe_codes:
+                lo = np.searchsorted(self.codes[t], code, side="left")
+                hi = np.searchsorted(self.codes[t], code, side="right")
+                found.append(self.order[t, lo:hi])
+
+        return np.unique(np.concatenate(found))
+
+    def query(
+        self,
+        position: int,
+        k: int = 10,
+        n_probes: int = 0,
+        exclude: Optional[np.ndarray] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Approximate top-k most similar rows to row `position`.
+
+        Args:
+            position: Row of the query fragrance
+            k: Number of results
+            n_probes: Extra buckets probed per table (see candidates())
+            exclude: Optional boolean mask of rows to leave out; the query
+                row itself is always left out
+
+        Returns:
+            (row positions, similarities), best first
+        """
+        candidates = self.candidates(position, n_probes)
+        keep = candidates != position
+        if exclude is not None:
+            keep &= ~exclude[candidates]
+        candidates = candidates[keep]
+
+        scores = self.store.row_similarities(position, candidates)
+        k = min(k, len(candidates))
+        if k == 0:
+            return candidates[:0], scores[:0]
+
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.lexsort((candidates[top], -scores[top]))]
+        return candidates[top], scores[top]
+
+    def save(self, directory: str) -> None:
+        """Write the hash tables as .npy arrays (the store is saved separately)."""
+        path = Path(directory)
+        path.mkdir(parents=True, exist_ok=True)
+        np.save(path / "planes.npy", self.planes)
+        np.save(path / "codes.npy", self.codes)
+        np.save(path / "order.npy", self.order)
+        with open(path / "lsh.json", "w", encoding="utf-8") as f:
+            json.dump({"n_tables": self.n_tables, "n_bits": self.n_bits, "rows": len(self.store)}, f)
+
+    @classmethod
+    def load(cls, directory: str, store: FeatureStore, mmap: bool = True) -> "LSHIndex":
+        """Load saved hash tables for an already loaded store."""
+        path = Path(directory)
+        mode = "r" if mmap else None
+        with open(path / "lsh.json", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta["rows"] != len(store):
+            raise ValueError(f"Index was built for {meta['rows']} rows, store has {len(store)}")
+        return cls(
+            store,
+            planes=np.load(path / "planes.npy", mmap_mode=mode),
+            codes=np.load(path / "codes.npy", mmap_mode=mode),
+            order=np.load(path / "order.npy", mmap_mode=mode)
+        )
+
+
+def build_lsh_index(store: FeatureStore, n_tables: int = 8, n_bits: int = 12, seed: int = 0) -> LSHIndex:
+    """Hash every row of a FeatureStore into n_tables LSH tables.
+
+    Args:
+        store: FeatureStore with the profile vectors
+        n_tables: Number of independent hash tables
+        n_bits: Hyperplanes per table (at most 63)
+        seed: Random seed for the hyperplanes
+
+    Returns:
+        LSHIndex over the store
+    """
+    if not 0 < n_bits < 64:
+        raise ValueError("n_bits must be between 1 and 63")
+
+    n_features = len(store.accord_ids) + len(store.dense_columns)
+    rng = np.random.default_rng(seed)
+    planes = rng.standard_normal((n_tables, n_features, n_bits)).astype(np.float32)
+
+    index = LSHIndex(store, planes, codes=np.empty(0), order=np.empty(0))
+    codes = index._bucket_codes(index._project()).T
+
+    order = np.argsort(codes, axis=1, kind="stable").astype(np.int32)
+    index.codes = np.take_along_axis(codes, order, axis=1)
+    index.order = order
+    return index
+
+
+def recall_at_k(
+    index: LSHIndex,
+    positions: Sequence[int],
+    k: int = 10,
+    n_probes: int = 0
+) -> Dict[str, float]:
+    """Compare approximate results with the exact scan for some queries.
+
+    Returns:
+        Dictionary with mean recall@k, mean candidates scored, and mean
+        milliseconds per query for the index and for the exact scan
+    """
+    recalls, candidates = [], []
+    ann_seconds = exact_seconds = 0.0
+
+    for position in positions:
+        exclude = np.zeros(len(index.store), dtype=bool)
+        exclude[position] = True
+
+        start = time.perf_counter()
+        exact, _ = index.store.top_k(position, k, exclude=exclude)
+        exact_seconds += time.perf_counter() - start
+
+        start = time.perf_counter()
+        approx, _ = index.query(position, k, n_probes=n_probes)
+        ann_seconds += time.perf_counter() - start
+
+        recalls.append(len(np.intersect1d(exact, approx)) / max(len(exact), 1))
+        candidates.append(len(index.candidates(position, n_probes)))
+
+    return {
+        "recall": float(np.mean(recalls)),
+        "candidates": float(np.mean(candidates)),
+        "ann_ms": ann_seconds * 1000 / len(positions),
+        "exact_ms": exact_seconds * 1000 / len(positions)
+    }
+
+
+def _jittered_store(store: FeatureStore, seed: int = 0) -> FeatureStore:
+    """Randomly scale every profile value so replicated samples differ."""
+    rng = np.random.default_rng(seed)
+    data = (store.data * rng.lognormal(0, 0.5, len(store.data))).astype(np.float32)
+    dense = (store.dense * rng.lognormal(0, 0.5, store.dense.shape)).astype(np.float32)
+    rows = np.repeat(np.arange(len(store)), np.diff(store.indptr))
+    sq_norms = np.bincount(rows, weights=data.astype(np.float64) ** 2, minlength=len(store))
+    sq_norms += (dense.astype(np.float64) ** 2).sum(axis=1)
+    return FeatureStore(store.pids, store.accord_ids, store.indptr, store.indices, data,
+                        store.dense_columns, dense, np.sqrt(sq_norms).astype(np.float32))
+
+
+def main():
+    db = load_fragdb()
+    fragrances = db["fragrances"]
+
+    print("=== FragDB v4.6 ANN Index ===\n")
+
+    # The samples have 10 rows; replicate and jitter them to get a catalog
+    big = pd.concat([fragrances] * 5000, ignore_index=True)
+    store = _jittered_store(build_feature_store(big, db["accords"]))
+    queries = np.random.default_rng(1).choice(len(store), 50, replace=False)
+    print(f"Catalog: {len(store):,} profiles, {len(queries)} queries, k=10")
+    print()
+
+    print(f"{'tables':>6} {'bits':>5} {'probes':>6} {'recall@10':>10} {'candidates':>11} "
+          f"{'ann ms':>8} {'exact ms':>9}")
+    for n_tables, n_bits, n_probes in [(4, 16, 0), (8, 16, 0), (8, 16, 2), (8, 12, 0), (16, 12, 2)]:
+        index = build_lsh_index(store, n_tables=n_tables, n_bits=n_bits)
+        stats = recall_at_k(index, queries, k=10, n_probes=n_probes)
+        print(f"{n_tables:>6} {n_bits:>5} {n_probes:>6} {stats['recall']:>10.2f} "
+              f"{stats['candidates']:>11.0f} {stats['ann_ms']:>8.2f} {stats['exact_ms']:>9.2f}")
+    print()
+
+    # Save, then reload memory-mapped alongside the store
+    with tempfile.TemporaryDirectory() as directory:
+        store.save(f"{directory}/store")
+        index.save(f"{directory}/lsh")
+        mapped_store = FeatureStore.load(f"{directory}/store")
+        mapped = LSHIndex.load(f"{directory}/lsh", mapped_store)
+
+        positions, scores = mapped.query(0, k=3, n_probes=2)
+        print(f"Similar to '{big['name'].iloc[0]}' (memory-mapped index):")
+        for position, score in zip(positions, scores):
+            print(f"  row {position}: {big['name'].iloc[position]} (similarity: {score:.2f})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,462 @@
+#!/usr/bin/env python3
+"""
+FragDB - Benchmark Example (v4.6)
+
+Demonstrates how to measure the examples on a full-size database and keep
+the numbers comparable across versions. A fixed set of pinned scenarios
+(same data, parameters and queries on every run) covers the hot paths:
+
+- cold_load            load_fragdb() of every CSV
+- column_parse         parse_fragrance_columns() of every packed field
+- name_search_scan     search_by_name() scans for fixed queries
+- name_search_index    NameIndex.search() for the same queries
+- brand_search_scan    search_by_brand() scans for fixed brand prefixes
+- brand_search_index   search_by_brand() with a prebuilt brand NameIndex
+- find_similar         recommender.find_similar() on a prebuilt FeatureStore
+- find_similar_index   the same, target found through a prebuilt NameIndex
+- join_merge           load_database.join_with_brands() (pandas merge)
+- join_cache           JoinCache.join_brands() (positional take)
+- comments_scan        comments.parquet, pid + lang columns, language counts
+- comments_filter      comments.parquet, text of one language (pushed-down filter)
+- reviews_full_read    newest reviews of the top pids after a full table read
+- reviews_indexed      the same queries through CommentsReader's sidecar index
+- news_comments_scan   news_comments.parquet, every column
+
+Each scenario runs in a fresh process, so its peak RSS (VmHWM) is not
+inflated by the previous ones. Setup (loading inputs, building indexes the
+scenario does not measure) is untimed; the timed part is repeated and the
+median wall time is reported with the throughput in the scenario's unit.
+Results are written as JSON together with the environment and the data
+files, and compare_reports() lines two reports up to spot regressions.
+
+Run it against synthetic data at the real scale:
+
+    from synthetic_data import generate_fragdb
+    generate_fragdb("/tmp/fragdb", scale=1.0)
+    report = run_benchmarks("/tmp/fragdb")
+    write_report(report, "bench-4.6.json")
+    compare_reports(read_report("bench-4.5.json"), report)
+"""
+
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import statistics
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from load_database import load_fragdb, load_fragrances
+
+# Fixed inputs, so every run measures the same work
+NAME_QUERIES = ("bla", "blue", "rose", "tobac", "mademoi", "vanille", "noir", "eau")
+BRAND_QUERIES = ("dior", "chanel", "gu", "l", "tom ford", "yves", "zara", "ar")
+SIMILAR_TARGETS = 20
+FILTER_LANGUAGE = "fr"
+REVIEW_QUERIES = 10          # most reviewed pids, newest 10 reviews each
+
+# Relative slowdown reported as a regression by compare_reports()
+REGRESSION_THRESHOLD = 0.10
+
+
+class Scenario(NamedTuple):
+    """One pinned benchmark."""
+    description: str
+    unit: str                                   # what run() counts
+    setup: Callable[[Path], Any]                # untimed, returns the state
+    run: Callable[[Any], int]                   # timed, returns items processed
+    files: Tuple[str, ...] = ("fragrances.csv",)  # inputs; skipped when missing
+
+
+def _setup_none(data_dir: Path) -> Path:
+    return data_dir
+
+
+def _setup_fragrances(data_dir: Path) -> pd.DataFrame:
+    return load_fragrances(str(data_dir / "fragrances.csv"))
+
+
+def _run_cold_load(data_dir: Path) -> int:
+    return len(load_fragdb(str(data_dir))["fragrances"])
+
+
+def _run_column_parse(df: pd.DataFrame) -> int:
+    from parse_columns import parse_fragrance_columns
+
+    parse_fragrance_columns(df)
+    return len(df)
+
+
+def _run_name_scan(df: pd.DataFrame) -> int:
+    from search_fragrances import search_by_name
+
+    for query in NAME_QUERIES:
+        search_by_name(df, query)
+    return len(NAME_QUERIES)
+
+
+def _setup_name_index(data_dir: Path):
+    from name_index import NameIndex
+
+    return NameIndex(_setup_fragrances(data_dir)["name"])
+
+
+def _run_name_index(index) -> int:
+    for query in NAME_QUERIES:
+        index.search(query)
+    return len(NAME_QUERIES)
+
+
+def _run_brand_scan(df: pd.DataFrame) -> int:
+    from search_fragrances import search_by_brand
+
+    for query in BRAND_QUERIES:
+        search_by_brand(df, query)
+    return len(BRAND_QUERIES)
+
+
+def _setup_brand_index(data_dir: Path):
+    from search_fragrances import brand_index
+
+    df = _setup_fragrances(data_dir)
+    return df, brand_index(df)
+
+
+def _run_brand_index(state) -> int:
+    from search_fragrances import search_by_brand
+
+    df, index = state
+    for query in BRAND_QUERIES:
+        search_by_brand(df, query, index=index)
+    return len(BRAND_QUERIES)
+
+
+def _setup_similar(data_dir: Path):
+    from feature_store import build_feature_store
+
+    df = _setup_fragrances(data_dir)
+    targets = df["name"].iloc[np.linspace(0, len(df) - 1, SIMILAR_TARGETS).astype(int)].tolist()
+    return df, build_feature_store(df), targets, None
+
+
+def _setup_similar_index(data_dir: Path):
+    from name_index import NameIndex
+
+    df, store, targets, _ = _setup_similar(data_dir)
+    return df, store, targets, NameIndex(df["name"])
+
+
+def _run_similar(state) -> int:
+    from recommender import find_similar
+
+    df, store, targets, names = state
+    for name in targets:
+        find_similar(df, name, n=10, store=store, names=names)
+    return len(targets)
+
+
+def _setup_join(data_dir: Path):
+    db = load_fragdb(str(data_dir))
+    return db["fragrances"], db["brands"]
+
+
+def _run_join_merge(state) -> int:
+    from load_database import join_with_brands
+
+    return len(join_with_brands(*state))
+
+
+def _setup_join_cache(data_dir: Path):
+    from join_cache import JoinCache
+
+    return JoinCache(*_setup_join(data_dir))
+
+
+def _run_join_cache(cache) -> int:
+    return len(cache.join_brands())
+
+
+def _run_comments_scan(data_dir: Path) -> int:
+    table = pq.read_table(data_dir / "comments.parquet", columns=["pid", "lang"])
+    pc.value_counts(table["lang"])
+    return table.num_rows
+
+
+def _run_comments_filter(data_dir: Path) -> int:
+    path = data_dir / "comments.parquet"
+    table = pq.read_table(path, columns=["pid", "text"], filters=[("lang", "=", FILTER_LANGUAGE)])
+    pc.sum(pc.utf8_length(table["text"]))
+    return pq.ParquetFile(path).metadata.num_rows
+
+
+def _setup_review_pids(data_dir: Path):
+    pids = pq.read_table(data_dir / "comments.parquet", columns=["pid"])["pid"].to_numpy()
+    values, counts = np.unique(pids, return_counts=True)
+    # Most reviewed first, ties by pid
+    top = values[np.lexsort((values, -counts))[:REVIEW_QUERIES]]
+    return data_dir, top.tolist()
+
+
+def _run_reviews_full_read(state) -> int:
+    data_dir, pids = state
+    # The documented way: read the whole table, then filter
+    df = pq.read_table(data_dir / "comments.parquet").to_pandas()
+    for pid in pids:
+        df[df["pid"] == pid].sort_values("date", ascending=False).head(10)
+    return len(pids)
+
+
+def _setup_reviews_indexed(data_dir: Path):
+    from comments_reader import CommentsReader
+
+    data_dir, pids = _setup_review_pids(data_dir)
+    return CommentsReader(str(data_dir / "comments.parquet")), pids
+
+
+def _run_reviews_indexed(state) -> int:
+    reader, pids = state
+    for pid in pids:
+        reader.reviews(pid, newest=10)
+    return len(pids)
+
+
+def _run_news_comments_scan(data_dir: Path) -> int:
+    return pq.read_table(data_dir / "news_comments.parquet").num_rows
+
+
+SCENARIOS: Dict[str, Scenario] = {
+    "cold_load": Scenario("load_fragdb() of every CSV", "rows", _setup_none, _run_cold_load),
+    "column_parse": Scenario("parse_fragrance_columns(), every field", "rows", _setup_fragrances,
+                             _run_column_parse),
+    "name_search_scan": Scenario("search_by_name() per query", "queries", _setup_fragrances, _run_name_scan),
+    "name_search_index": Scenario("NameIndex.search() per query", "queries", _setup_name_index,
+                                  _run_name_index),
+    "brand_search_scan": Scenario("search_by_brand() per query", "queries", _setup_fragrances,
+                                  _run_brand_scan),
+    "brand_search_index": Scenario("search_by_brand() with a brand NameIndex", "queries", _setup_brand_index,
+                                   _run_brand_index),
+    "find_similar": Scenario("find_similar() with a prebuilt FeatureStore", "queries", _setup_similar,
+                             _run_similar),
+    "find_similar_index": Scenario("find_similar() with a FeatureStore and a NameIndex", "queries",
+                                   _setup_similar_index, _run_similar),
+    "join_merge": Scenario("join_with_brands() merge", "rows", _setup_join, _run_join_merge),
+    "join_cache": Scenario("JoinCache.join_brands() take", "rows", _setup_join_cache, _run_join_cache),
+    "comments_scan": Scenario("comments.parquet pid + lang, language counts", "rows", _setup_none,
+                              _run_comments_scan, ("comments.parquet",)),
+    "comments_filter": Scenario(f"comments.parquet text where lang == {FILTER_LANGUAGE!r}", "rows scanned",
+                                _setup_none, _run_comments_filter, ("comments.parquet",)),
+    "reviews_full_read": Scenario("newest reviews of top pids via pq.read_table + filter", "queries",
+                                  _setup_review_pids, _run_reviews_full_read, ("comments.parquet",)),
+    "reviews_indexed": Scenario("newest reviews of top pids via CommentsReader", "queries",
+                                _setup_reviews_indexed, _run_reviews_indexed, ("comments.parquet",)),
+    "news_comments_scan": Scenario("news_comments.parquet, every column", "rows", _setup_none,
+                                   _run_news_comments_scan, ("news_comments.parquet",)),
+}
+
+
+def _peak_rss_mb() -> float:
+    """Peak resident set size of this process.
+
+    Reads VmHWM on Linux: ru_maxrss survives exec(), so a spawned child
+    would report its parent's peak. Elsewhere falls back to ru_maxrss
+    (KB on Linux, bytes on macOS).
+    """
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1 << 20) if sys.platform == "darwin" else peak / 1024
+
+
+def run_scenario(name: str, data_dir: str, repeat: int = 3) -> Dict[str, Any]:
+    """Run one scenario in this process.
+
+    Args:
+        name: Key of SCENARIOS
+        data_dir: Directory with the FragDB files
+        repeat: Timed runs; the median is reported
+
+    Returns:
+        Dictionary with wall times, throughput and peak RSS
+    """
+    scenario = SCENARIOS[name]
+    start = time.perf_counter()
+    state = scenario.setup(Path(data_dir))
+    setup_s = time.perf_counter() - start
+    setup_rss = _peak_rss_mb()
+
+    times, items = [], 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        items = scenario.run(state)
+        times.append(time.perf_counter() - start)
+
+    wall_s = statistics.median(times)
+    return {
+        "name": name,
+        "description": scenario.description,
+        "setup_s": round(setup_s, 4),
+        "wall_s": round(wall_s, 4),
+        "wall_s_min": round(min(times), 4),
+        "repeat": repeat,
+        "items": items,
+        "unit": scenario.unit,
+        "throughput": round(items / wall_s, 2) if wall_s > 0 else None,
+        "setup_peak_rss_mb": round(setup_rss, 1),
+        "peak_rss_mb": round(_peak_rss_mb(), 1),
+    }
+
+
+def _environment() -> Dict[str, Any]:
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "pyarrow": pa.__version__,
+    }
+
+
+def _data_files(data_dir: Path) -> Dict[str, int]:
+    """Size in bytes of every data file, to tell datasets apart."""
+    return {path.name: path.stat().st_size for path in sorted(data_dir.iterdir())
+            if path.suffix in (".csv", ".parquet")}
+
+
+def run_benchmarks(
+    data_dir: str,
+    scenarios: Optional[Sequence[str]] = None,
+    repeat: int = 3,
+    isolate: bool = True
+) -> Dict[str, Any]:
+    """Run the pinned scenarios and collect a report.
+
+    Args:
+        data_dir: Directory with the FragDB files (see synthetic_data.py)
+        scenarios: Scenario names; defaults to all of SCENARIOS. Scenarios
+            whose files are missing (e.g. parquet) are skipped.
+        repeat: Timed runs per scenario
+        isolate: Run each scenario in a fresh spawned process so peak RSS
+            is per scenario; False runs them in this process (peak RSS is
+            then cumulative)
+
+    Returns:
+        Report dictionary (see write_report)
+    """
+    base = Path(data_dir)
+    names = list(scenarios or SCENARIOS)
+    unknown = set(names) - set(SCENARIOS)
+    if unknown:
+        raise ValueError(f"Unknown scenarios: {sorted(unknown)}")
+
+    results = []
+    context = multiprocessing.get_context("spawn")
+    for name in names:
+        if not all((base / f).exists() for f in SCENARIOS[name].files):
+            continue
+        if isolate:
+            with context.Pool(1) as pool:
+                results.append(pool.apply(run_scenario, (name, str(base), repeat)))
+        else:
+            results.append(run_scenario(name, str(base), repeat))
+
+    return {
+        "fragdb_version": "4.6",
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "environment": _environment(),
+        "data": {"dir": str(base), "files": _data_files(base)},
+        "scenarios": results,
+    }
+
+
+def write_report(report: Dict[str, Any], path: str) -> None:
+    """Write a report as indented JSON."""
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+        f.write("\n")
+
+
+def read_report(path: str) -> Dict[str, Any]:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def compare_reports(
+    baseline: Dict[str, Any],
+    current: Dict[str, Any],
+    threshold: float = REGRESSION_THRESHOLD
+) -> pd.DataFrame:
+    """Line up two reports scenario by scenario.
+
+    Args:
+        baseline: Earlier report
+        current: New report
+        threshold: Relative wall time increase flagged as a regression
+
+    Returns:
+        DataFrame with baseline / current wall time and peak RSS, the time
+        ratio and a 'regression' flag, one row per scenario in both reports
+    """
+    def frame(report: Dict[str, Any]) -> pd.DataFrame:
+        return pd.DataFrame(report["scenarios"]).set_index("name")[["wall_s", "peak_rss_mb"]]
+
+    table = frame(baseline).join(frame(current), lsuffix="_baseline", rsuffix="_current", how="inner")
+    table["time_ratio"] = (table["wall_s_current"] / table["wall_s_baseline"]).round(3)
+    table["regression"] = table["time_ratio"] > 1 + threshold
+    if baseline["data"]["files"] != current["data"]["files"]:
+        print("Warning: the reports were measured on different data files")
+    return table
+
+
+def main(data_dir: Optional[str] = None, scale: float = 0.05, report_path: Optional[str] = None):
+    import contextlib
+    import tempfile
+
+    from synthetic_data import generate_fragdb
+
+    print("=== FragDB v4.6 Benchmark ===\n")
+
+    with contextlib.ExitStack() as stack:
+        if data_dir is None:
+            # Generated data is removed on exit; pass data_dir to keep it
+            data_dir = stack.enter_context(tempfile.TemporaryDirectory(prefix="fragdb_bench_"))
+            start = time.perf_counter()
+            written = generate_fragdb(data_dir, scale=scale)
+            print(f"Synthetic data at scale {scale} ({written['fragrances']:,} fragrances, "
+                  f"{written['comments']:,} comments) generated in {time.perf_counter() - start:.1f} s")
+            print()
+
+        report = run_benchmarks(data_dir)
+        print(f"{'scenario':20s} {'wall':>11s} {'peak RSS':>10s}  throughput")
+        for result in report["scenarios"]:
+            print(f"{result['name']:20s} {result['wall_s'] * 1000:8.1f} ms {result['peak_rss_mb']:7.0f} MB  "
+                  f"{result['throughput']:,.0f} {result['unit']}/s")
+        print()
+
+        if report_path is not None:
+            write_report(report, report_path)
+            print(f"Report written to {report_path}")
+            print()
+
+        # A second run on the same data, compared with the first
+        rerun = run_benchmarks(data_dir, scenarios=["cold_load", "name_search_index"])
+        print("Rerun vs first run:")
+        print(compare_reports(report, rerun).to_string())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,419 @@
+#!/usr/bin/env python3
+"""
+FragDB - Comments Reader Example (v4.6)
+
+Demonstrates how to answer per-fragrance review queries on comments.parquet
+(4.6M rows, 1.23 GB) without pq.read_table('comments.parquet'), which
+decodes every review to show the ones of a single perfume.
+
+A sidecar index maps every run of rows with the same (pid, lang) to its
+row group, offset and length:
+
+    pid    lang  row_group  offset  count
+    704    en    3          1520    412
+    704    ru    3          1932    97
+
+It is built once by reading only the pid and lang columns, one row group
+at a time, and saved next to the file as .npy arrays plus a JSON manifest.
+Each row group is fingerprinted by its row count and a SHA-1 of the stored
+bytes of its pid and lang column chunks, the only data the index depends
+on: when a new release keeps the leading row groups and appends new ones,
+only the new row groups are indexed again, and a rewritten row group is
+indexed again even if its size and pid range did not change.
+
+Queries look up the runs with a binary search, then read only the row
+groups that hold them and only the requested columns. reviews() reads
+pid, lang and date first, then decodes the other columns (the large text)
+only up to the last row it returns:
+
+    reader = CommentsReader("comments.parquet")
+    reader.count(704, "en")                      # index only, no I/O
+    reader.reviews(704, "en", newest=10)         # DataFrame
+    for batch in reader.iter_batches(704):       # bounded memory
+        ...
+
+A query's I/O is bounded by the size of the row groups holding the pid,
+so files written with smaller row groups (see synthetic_data.py) prune
+better.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from instrumentation import span
+from parse_dates import parse_dates
+
+INDEX_ARRAYS = ("pids", "langs", "row_groups", "offsets", "counts")
+INDEX_VERSION = 2
+
+# Columns always read by reviews(); date orders the newest first
+KEY_COLUMNS = ["pid", "lang", "date"]
+
+# Rows decoded at a time when reviews() fetches the other columns of its rows
+FETCH_BATCH_ROWS = 4096
+
+# Columns the index is built from; their stored bytes fingerprint a row group
+INDEXED_COLUMNS = ("pid", "lang")
+
+
+def _fingerprint(metadata: pq.FileMetaData, row_group: int, f) -> list:
+    """Identity of a row group: its rows and a SHA-1 of its pid and lang column chunks.
+
+    Args:
+        metadata: Parquet file metadata
+        row_group: Row group number
+        f: The parquet file, opened in binary mode
+    """
+    group = metadata.row_group(row_group)
+    digest = hashlib.sha1()
+    for i in range(group.num_columns):
+        column = group.column(i)
+        if column.path_in_schema in INDEXED_COLUMNS:
+            start = column.dictionary_page_offset if column.has_dictionary_page else column.data_page_offset
+            f.seek(start)
+            digest.update(f.read(column.total_compressed_size))
+    return [group.num_rows, digest.hexdigest()]
+
+
+def _runs(pids: np.ndarray, codes: np.ndarray) -> Dict[str, np.ndarray]:
+    """Start offset, length and key of every run of equal (pid, lang) rows."""
+    if len(pids) == 0:
+        empty = np.zeros(0, dtype=np.int64)
+        return {"pids": empty, "langs": empty, "offsets": empty, "counts": empty}
+    change = np.flatnonzero((pids[1:] != pids[:-1]) | (codes[1:] != codes[:-1])) + 1
+    starts = np.concatenate(([0], change))
+    return {
+        "pids": pids[starts],
+        "langs": codes[starts],
+        "offsets": starts,
+        "counts": np.diff(np.concatenate((starts, [len(pids)]))),
+    }
+
+
+class CommentsIndex:
+    """(pid, lang) -> row group runs of a comments parquet file, sorted by pid."""
+
+    def __init__(self, pids: np.ndarray, langs: np.ndarray, row_groups: np.ndarray, offsets: np.ndarray,
+                 counts: np.ndarray, languages: List[str], fingerprints: List[list]):
+        self.pids = pids
+        self.langs = langs
+        self.row_groups = row_groups
+        self.offsets = offsets
+        self.counts = counts
+        self.languages = languages
+        self.fingerprints = fingerprints
+        self._lang_codes = {lang: i for i, lang in enumerate(languages)}
+
+    def __len__(self) -> int:
+        return len(self.pids)
+
+    def runs(self, pid: int, lang: Optional[str] = None) -> np.ndarray:
+        """Positions of the runs of a pid (and language), in file order."""
+        lo, hi = np.searchsorted(self.pids, [pid, pid + 1])
+        positions = np.arange(lo, hi)
+        if lang is not None:
+            code = self._lang_codes.get(lang)
+            if code is None:
+                return positions[:0]
+            positions = positions[self.langs[positions] == code]
+        return positions
+
+    def save(self, directory: str, source: Dict) -> None:
+        """Write the index as .npy arrays plus a JSON manifest."""
+        path = Path(directory)
+        path.mkdir(parents=True, exist_ok=True)
+        for name in INDEX_ARRAYS:
+            np.save(path / f"{name}.npy", getattr(self, name))
+        manifest = {"version": INDEX_VERSION, "source": source, "languages": self.languages,
+                    "fingerprints": self.fingerprints}
+        tmp_path = path / f"manifest.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, path / "manifest.json")
+
+    @classmethod
+    def load(cls, directory: str) -> Optional["CommentsIndex"]:
+        """Load a saved index, or None if there is none (or of another version)."""
+        path = Path(directory)
+        if not (path / "manifest.json").exists():
+            return None
+        with open(path / "manifest.json", encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get("version") != INDEX_VERSION:
+            return None
+        arrays = {name: np.load(path / f"{name}.npy", mmap_mode="r") for name in INDEX_ARRAYS}
+        index = cls(**arrays, languages=manifest["languages"], fingerprints=manifest["fingerprints"])
+        index.source = manifest["source"]
+        return index
+
+
+def build_comments_index(
+    path: str,
+    previous: Optional[CommentsIndex] = None
+) -> CommentsIndex:
+    """Index every (pid, lang) run, reusing the row groups an older index covers.
+
+    Args:
+        path: Comments parquet file
+        previous: Index of an earlier version of the file. Leading row
+            groups whose fingerprints still match keep their entries; the
+            rest are read again.
+
+    Returns:
+        CommentsIndex sorted by (pid, row group, offset), i.e. file order within a pid
+    """
+    parquet_file = pq.ParquetFile(path, memory_map=True)
+    metadata = parquet_file.metadata
+    with open(path, "rb") as f:
+        fingerprints = [_fingerprint(metadata, rg, f) for rg in range(metadata.num_row_groups)]
+
+    reused = 0
+    if previous is not None:
+        while (reused < min(len(previous.fingerprints), len(fingerprints))
+               and previous.fingerprints[reused] == fingerprints[reused]):
+            reused += 1
+
+    languages = list(previous.languages) if previous is not None else []
+    codes = {lang: i for i, lang in enumerate(languages)}
+    parts = []
+    if reused:
+        keep = np.asarray(previous.row_groups) < reused
+        parts.append({name: np.asarray(getattr(previous, name))[keep] for name in INDEX_ARRAYS})
+
+    for rg in range(reused, metadata.num_row_groups):
+        with span("index.comments_row_group") as s:
+            table = parquet_file.read_row_group(rg, columns=["pid", "lang"])
+            encoded = pc.dictionary_encode(table["lang"]).combine_chunks()
+            for lang in encoded.dictionary.to_pylist():
+                codes.setdefault(lang, len(codes))
+            mapping = np.array([codes[lang] for lang in encoded.dictionary.to_pylist()], dtype=np.int16)
+            lang_codes = mapping[encoded.indices.to_numpy(zero_copy_only=False)]
+            runs = _runs(table["pid"].to_numpy(), lang_codes)
+            runs["row_groups"] = np.full(len(runs["pids"]), rg)
+            parts.append(runs)
+            s.add(rows=table.num_rows)
+    languages = sorted(codes, key=codes.get)
+
+    columns = {name: np.concatenate([p[name] for p in parts]) if parts else np.zeros(0, dtype=np.int64)
+               for name in INDEX_ARRAYS}
+    order = np.lexsort((columns["offsets"], columns["row_groups"], columns["pids"]))
+    return CommentsIndex(
+        pids=columns["pids"][order].astype(np.int64),
+        langs=columns["langs"][order].astype(np.int16),
+        row_groups=columns["row_groups"][order].astype(np.int32),
+        offsets=columns["offsets"][order].astype(np.int64),
+        counts=columns["counts"][order].astype(np.int64),
+        languages=languages,
+        fingerprints=fingerprints,
+    )
+
+
+class CommentsReader:
+    """Per-fragrance queries on comments.parquet through a sidecar index."""
+
+    def __init__(self, path: str, index_dir: Optional[str] = None):
+        """
+        Args:
+            path: comments.parquet (or a file with the same schema)
+            index_dir: Where the index lives; defaults to '<path>.index'.
+                Built on first use and refreshed when the file changes.
+        """
+        self.path = path
+        self.index_dir = index_dir or f"{path}.index"
+        self.file = pq.ParquetFile(path, memory_map=True)
+        self.index = self._load_or_build()
+
+    def _load_or_build(self) -> CommentsIndex:
+        stat = os.stat(self.path)
+        source = {"path": os.path.abspath(self.path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+        index = CommentsIndex.load(self.index_dir)
+        if index is not None and index.source["size"] == source["size"] \
+                and index.source["mtime_ns"] == source["mtime_ns"]:
+            return index
+        # Missing or stale: reuse what still matches, index the rest
+        index = build_comments_index(self.path, previous=index)
+        index.save(self.index_dir, source)
+        return index
+
+    @property
+    def columns(self) -> List[str]:
+        return self.file.schema_arrow.names
+
+    def count(self, pid: int, lang: Optional[str] = None) -> int:
+        """Number of reviews of a pid (in one language), from the index alone."""
+        return int(self.index.counts[self.index.runs(pid, lang)].sum())
+
+    def languages(self, pid: int) -> Dict[str, int]:
+        """Review count per language of a pid."""
+        positions = self.index.runs(pid)
+        counts = pd.Series(self.index.counts[positions]).groupby(self.index.langs[positions]).sum()
+        return {self.index.languages[code]: int(n) for code, n in counts.sort_values(ascending=False).items()}
+
+    def _row_ranges(self, pid: int, lang: Optional[str]) -> List[Tuple[int, np.ndarray]]:
+        """(row group, row numbers within it) of the matching rows, in file order."""
+        positions = self.index.runs(pid, lang)
+        row_groups = self.index.row_groups[positions]
+        ranges = []
+        for rg in np.unique(row_groups):
+            runs = positions[row_groups == rg]
+            ranges.append((int(rg), np.concatenate([np.arange(o, o + c) for o, c in
+                                                    zip(self.index.offsets[runs], self.index.counts[runs])])))
+        return ranges
+
+    def _read(self, rg: int, rows: np.ndarray, columns: Sequence[str]) -> pa.Table:
+        """Some rows of one row group, reading only the given columns."""
+        with span("read.comments_row_group") as s:
+            table = self.file.read_row_group(rg, columns=list(columns))
+            metadata = self.file.metadata.row_group(rg)
+            chunks = (metadata.column(i) for i in range(metadata.num_columns))
+            s.add(rows=len(rows), bytes_read=sum(c.total_compressed_size for c in chunks
+                                                 if c.path_in_schema in columns))
+        return table.take(pa.array(rows))
+
+    def _fetch(self, rg: int, rows: np.ndarray, columns: Sequence[str]) -> pa.Table:
+        """A few rows of one row group, in ascending row order.
+
+        Decodes FETCH_BATCH_ROWS rows at a time and stops after the last
+        wanted row instead of decoding the whole row group.
+        """
+        rows = np.sort(rows)
+        parts, start = [], 0
+        with span("read.comments_rows") as s:
+            for batch in self.file.iter_batches(batch_size=FETCH_BATCH_ROWS, row_groups=[rg], columns=list(columns)):
+                stop = start + batch.num_rows
+                inside = rows[np.searchsorted(rows, start):np.searchsorted(rows, stop)]
+                if len(inside):
+                    parts.append(batch.take(pa.array(inside - start)))
+                    s.add(rows=len(inside))
+                start = stop
+                if start > rows[-1]:
+                    break
+        return pa.Table.from_batches(parts)
+
+    def _tables(self, pid: int, lang: Optional[str], columns: Sequence[str]) -> Iterator[pa.Table]:
+        """Matching rows, one table per row group read."""
+        for rg, rows in self._row_ranges(pid, lang):
+            yield self._read(rg, rows, columns)
+
+    def iter_batches(
+        self,
+        pid: int,
+        lang: Optional[str] = None,
+        columns: Optional[Sequence[str]] = None,
+        batch_size: int = 1024
+    ) -> Iterator[pa.RecordBatch]:
+        """Stream the reviews of a pid in file order, one row group in memory at a time."""
+        for table in self._tables(pid, lang, columns or self.columns):
+            yield from table.to_batches(max_chunksize=batch_size)
+
+    def reviews(
+        self,
+        pid: int,
+        lang: Optional[str] = None,
+        newest: Optional[int] = None,
+        columns: Optional[Sequence[str]] = None
+    ) -> pd.DataFrame:
+        """Reviews of a pid, newest first.
+
+        Args:
+            pid: Fragrance ID
+            lang: Optional language code ('en', 'ru', ...)
+            newest: Keep only the N most recent reviews
+            columns: Columns to return (all by default); pid, lang and date
+                are always read
+
+        Returns:
+            DataFrame sorted by date descending (ties keep file order)
+        """
+        columns = list(columns or self.columns)
+        ranges = self._row_ranges(pid, lang)
+        if not ranges:
+            return pd.DataFrame({name: pd.Series(dtype=object) for name in columns})
+
+        # Keys first, then the other columns only of the rows that are kept
+        keys = pa.concat_tables([self._read(rg, rows, KEY_COLUMNS) for rg, rows in ranges])
+        # Page dates (MM/DD/YY HH:MM) do not sort as strings; stable, so ties keep file order
+        order = np.argsort(-parse_dates(keys.column("date")).epoch, kind="stable")
+        if newest is not None:
+            order = order[:newest]
+        table = keys.take(order)
+
+        rest = [name for name in columns if name not in KEY_COLUMNS]
+        if rest and len(order):
+            row_groups = np.concatenate([np.full(len(rows), rg) for rg, rows in ranges])[order]
+            file_rows = np.concatenate([rows for _, rows in ranges])[order]
+            # Row group by row group, in file order within each
+            kept = np.lexsort((file_rows, row_groups))
+            fetched = pa.concat_tables([self._fetch(int(rg), file_rows[kept][row_groups[kept] == rg], rest)
+                                        for rg in np.unique(row_groups)])
+            # Back to newest first
+            fetched = fetched.take(np.argsort(kept))
+            for name in rest:
+                table = table.append_column(fetched.schema.field(name), fetched.column(name))
+        elif rest:
+            table = self.file.schema_arrow.empty_table().select(KEY_COLUMNS + rest)
+        return table.select(columns).to_pandas()
+
+def main():
+    from benchmark import REVIEW_QUERIES, run_benchmarks
+    from synthetic_data import synthetic_dataset
+
+    print("=== FragDB v4.6 Comments Reader ===\n")
+
+    # The 25-row sample
+    with tempfile.TemporaryDirectory(prefix="fragdb_comments_") as sample_dir:
+        reader = CommentsReader("../../samples/comments_sample.parquet", index_dir=f"{sample_dir}/index")
+        print(f"Sample index: {len(reader.index)} runs, languages {reader.index.languages}")
+        print(f"pid 704: {reader.count(704)} reviews, by language {reader.languages(704)}")
+        print(reader.reviews(704, newest=3, columns=["lang", "date", "author"]).to_string(index=False))
+        print()
+
+    # Synthetic full-scale layout, small row groups
+    with synthetic_dataset(scale=0.1, row_group_size=20_000) as data_dir:
+        path = f"{data_dir}/comments.parquet"
+        metadata = pq.ParquetFile(path).metadata
+        print(f"Synthetic comments.parquet: {metadata.num_rows:,} rows, {metadata.num_row_groups} row groups, "
+              f"{os.path.getsize(path) / 1e6:.0f} MB")
+
+        start = time.perf_counter()
+        reader = CommentsReader(path)
+        build_s = time.perf_counter() - start
+        start = time.perf_counter()
+        CommentsReader(path)
+        reopen_ms = (time.perf_counter() - start) * 1000
+        print(f"  index build: {build_s:.2f} s once ({len(reader.index):,} runs); reopen: {reopen_ms:.1f} ms")
+
+        pid = int(reader.index.pids[np.argmax(reader.index.counts)])
+        full = pq.read_table(path, columns=["pid", "lang", "date", "comment_id"]).to_pandas()
+        expected = full[(full["pid"] == pid) & (full["lang"] == "en")]
+        top = expected.iloc[np.argsort(-parse_dates(pa.array(expected["date"])).epoch, kind="stable")[:10]]
+        newest = reader.reviews(pid, "en", newest=10)
+        assert newest["comment_id"].tolist() == top["comment_id"].tolist()
+        print(f"  newest 10 'en' reviews of pid {pid} ({reader.count(pid, 'en'):,} in total) match a full read")
+
+        streamed = [batch.column("comment_id") for batch in reader.iter_batches(pid, columns=["comment_id", "text"])]
+        streamed = pa.chunked_array(streamed).to_pylist()
+        assert streamed == full.loc[full["pid"] == pid, "comment_id"].tolist()
+        print(f"  iter_batches streamed {len(streamed):,} rows of pid {pid}, in file order")
+        print()
+
+        # Latency and peak memory, each in a fresh process
+        report = run_benchmarks(data_dir, scenarios=["reviews_full_read", "reviews_indexed"], repeat=1)
+        print(f"=== Newest 10 reviews of the {REVIEW_QUERIES} most reviewed pids ===")
+        for result in report["scenarios"]:
+            print(f"  {result['description']:55s} {result['wall_s'] * 1000:8.1f} ms  "
+                  f"peak RSS {result['peak_rss_mb']:6.0f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+FragDB - Compact Tables Example (v4.6)
+
+Demonstrates how to shrink the loaded tables in memory. The loaders keep
+every field as an object-dtype Python string; compact mode converts:
+
+- low-cardinality text (gender, country, main_activity, status, group and
+  their translations) to categoricals
+- pids, years and counts to 32-bit integers (nullable Int32 where values
+  are missing)
+- reference IDs (b72, p24, n54, a24) to their int32 numeric part
+- the compound brand field (Dior;b3) to a categorical brand_name plus an
+  int32 brand_id, split once at load time
+
+Compact fragrances no longer have the raw brand field, so use them for
+joins, filters and aggregations rather than with the string parsers in
+parse_fields.py. Packed list fields (accords, notes_pyramid, ...) are kept
+as text.
+"""
+
+import re
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from load_database import load_fragdb
+from parse_columns import parse_brand_column
+from reference import id_numbers
+
+# Prefix of the IDs in each reference table
+ID_PREFIXES = {"brands": "b", "perfumers": "p", "notes": "n", "accords": "a"}
+
+# Integer fields of each table
+INTEGER_FIELDS = {
+    "fragrances": ["pid", "year", "reviews_count"],
+    "brands": ["brand_count"],
+    "perfumers": ["perfumes_count"],
+    "notes": ["fragrance_count"],
+    "accords": ["fragrance_count"],
+}
+
+# Low-cardinality text fields; their translated variants (field_xx) follow
+CATEGORICAL_FIELDS = {
+    "fragrances": ["gender"],
+    "brands": ["country", "main_activity", "parent_company"],
+    "perfumers": ["status", "company"],
+    "notes": ["group", "note_group"],
+    "accords": ["bar_color", "font_color"],
+}
+
+
+def _to_int32(series: pd.Series) -> pd.Series:
+    """Convert to int32, or to nullable Int32 when values are missing."""
+    values = pd.to_numeric(series, errors="coerce")
+    if values.isna().any():
+        return values.astype("Int32")
+    return values.astype(np.int32)
+
+
+def _id_numbers(series: pd.Series, prefix: str) -> pd.Series:
+    """Numeric part of IDs like 'b72' as int32 (missing where absent)."""
+    text = series.astype("string")
+    numbers = id_numbers(pa.array(text, type=pa.string()), prefix)
+    if ((numbers < 0) & text.notna().to_numpy()).any():
+        raise ValueError(f"IDs are not all of the form {prefix}<number>")
+    return _to_int32(pd.Series(numbers, index=series.index).where(text.notna().to_numpy()))
+
+
+def _categorical_columns(df: pd.DataFrame, fields: List[str]) -> List[str]:
+    """The given fields plus their translations (field_de, field_zh, ...)."""
+    patterns = [re.compile(f"{re.escape(field)}(_[a-z]{{2}})?$") for field in fields]
+    return [column for column in df.columns if any(p.match(column) for p in patterns)]
+
+
+def format_id(prefix: str, number: int) -> str:
+    """Turn an integer ID back into its text form (e.g. 'b', 72 -> 'b72')."""
+    return f"{prefix}{number}"
+
+
+def compact_table(name: str, df: pd.DataFrame) -> pd.DataFrame:
+    """Return a compact copy of one FragDB table.
+
+    Args:
+        name: Table name ('fragrances', 'brands', 'perfumers', 'notes', 'accords')
+        df: Table as returned by the loaders (any column projection)
+
+    Returns:
+        DataFrame with categorical, int32 and integer-ID columns
+    """
+    df = df.copy()
+
+    if name in ID_PREFIXES and "id" in df.columns:
+        df["id"] = _id_numbers(df["id"], ID_PREFIXES[name])
+
+    for field in INTEGER_FIELDS.get(name, []):
+        if field in df.columns:
+            df[field] = _to_int32(df[field])
+
+    if name == "fragrances" and "brand" in df.columns:
+        brand = parse_brand_column(df["brand"])
+        position = df.columns.get_loc("brand")
+        df = df.drop(columns="brand")
+        brand_id = brand["id"].where(brand["id"] != "")
+        df.insert(position, "brand_name", brand["name"].to_numpy())
+        df.insert(position + 1, "brand_id", _id_numbers(brand_id, ID_PREFIXES["brands"]).to_numpy())
+        df["brand_name"] = df["brand_name"].astype("category")
+
+    for column in _categorical_columns(df, CATEGORICAL_FIELDS.get(name, [])):
+        df[column] = df[column].astype("category")
+
+    return df
+
+
+def compact_fragdb(db: Dict[str, pd.DataFrame]) -> Dict[str, pd.DataFrame]:
+    """Compact every table of a loaded database (see load_fragdb)."""
+    return {name: compact_table(name, df) for name, df in db.items()}
+
+
+def memory_report(before: Dict[str, pd.DataFrame], after: Dict[str, pd.DataFrame]) -> pd.DataFrame:
+    """Compare deep memory usage of two versions of the same tables.
+
+    Returns:
+        DataFrame indexed by table with before_kb, after_kb and ratio columns
+    """
+    rows = []
+    for name in before:
+        before_bytes = before[name].memory_usage(deep=True).sum()
+        after_bytes = after[name].memory_usage(deep=True).sum()
+        rows.append({
+            "table": name,
+            "before_kb": before_bytes / 1024,
+            "after_kb": after_bytes / 1024,
+            "ratio": before_bytes / after_bytes if after_bytes else float("nan")
+        })
+    report = pd.DataFrame(rows).set_index("table")
+    report.loc["total"] = [report["before_kb"].sum(), report["after_kb"].sum(),
+                           report["before_kb"].sum() / report["after_kb"].sum()]
+    return report
+
+
+def main():
+    db = load_fragdb()
+    compact = load_fragdb(compact=True)
+
+    print("=== FragDB v4.6 Compact Tables ===\n")
+
+    fragrances = compact["fragrances"]
+    print("Fragrance dtypes (changed columns):")
+    for column in ["pid", "brand_name", "brand_id", "year", "gender", "reviews_count"]:
+        print(f"  {column}: {fragrances[column].dtype}")
+    print()
+
+    print("Brand split once into name + integer ID:")
+    print(fragrances[["name", "brand_name", "brand_id"]].head())
+    print()
+
+    print("Memory usage (deep), sample files:")
+    print(memory_report(db, compact).round(1).to_string())
+    print()
+
+    # The samples are tiny; categoricals pay off with many repeated values
+    big = {name: pd.concat([df] * 2000, ignore_index=True) for name, df in db.items()}
+    print(f"Memory usage (deep), samples x 2000 ({len(big['fragrances']):,} fragrances):")
+    print(memory_report(big, compact_fragdb(big)).round(1).to_string())
+    print()
+
+    # Long text fields dominate the fragrances table; combine with a projection
+    fields = ["pid", "brand", "name", "year", "gender", "reviews_count"]
+    slim = {"fragrances": big["fragrances"][fields]}
+    print(f"Memory usage (deep), fragrances projected to {', '.join(fields)}:")
+    print(memory_report(slim, compact_fragdb(slim)).round(1).to_string())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,616 @@
+#!/usr/bin/env python3
+"""
+FragDB - Delta Ingestion Example (v4.6)
+
+Demonstrates how to move from one FragDB release to the next without
+re-parsing and re-indexing the whole catalog. Every release ships the
+full files again, but only a small share of the rows change between two
+releases.
+
+Every row of every table gets a 64-bit content hash keyed by its stable
+ID (pid for fragrances, id for the reference tables, comment_id for
+reviews, nid for news). Comparing the hashes of two releases gives the
+added, changed and removed keys of each table. The hashes of a release
+are kept as Feather files in a state directory, keyed by the SHA-1 of
+the source file, so each release is hashed once.
+
+The derived artifacts are then updated from the delta only:
+
+- row-aligned artifacts (parsed columns, FeatureStore, CatalogMatrix)
+  parse just the added and changed rows, and splice them with the reused
+  rows of the previous build in the row order of the new release
+- posting lists drop the postings of changed and removed pids and merge
+  the postings of the delta rows into the sorted lists
+- the review text index marks changed and removed reviews as deleted,
+  appends one segment for the changed and added ones and points the
+  older segments at the new release
+
+Parsing, the expensive part, costs time in proportion to the delta. The
+splices are NumPy gathers over the arrays of the previous build, and the
+results are identical to a build from scratch.
+
+    old = snapshot_hashes("fragdb-4.5", state_dir="state")
+    new = snapshot_hashes("fragdb-4.6", state_dir="state")
+    deltas = compute_deltas(old, new)
+    plan = plan_rows(store.pids, fragrances["pid"], deltas["fragrances"])
+    store = update_feature_store(store, fragrances, plan)
+"""
+
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from batch_recommend import CatalogMatrix, _ranges, build_catalog_matrix
+from feature_store import FeatureStore, build_feature_store
+from instrumentation import span, traced
+from load_database import load_fragrances
+from parse_columns import RaggedColumns, VotingMatrix, parse_fragrance_columns
+from posting_index import PostingIndex, PostingLists, build_posting_index
+from snapshot_cache import hash_file, read_manifest, write_manifest
+from text_search import build_text_index, delete_documents, rebase_segments
+
+# Stable row key of every table
+TABLE_KEYS = {
+    "fragrances": "pid",
+    "brands": "id",
+    "perfumers": "id",
+    "notes": "id",
+    "accords": "id",
+    "comments": "comment_id",
+    "news": "nid",
+    "news_comments": "comment_id",
+}
+
+# Keys stored as integers; the others are strings
+INTEGER_KEYS = ("pid", "nid")
+
+
+class RowHashes(NamedTuple):
+    """Content hash of every row of a table, by row key."""
+    keys: np.ndarray      # (n,) int64 or object key of every row
+    hashes: np.ndarray    # (n,) uint64 hash of the row's values
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def save(self, filepath: str) -> None:
+        """Write the hashes as an uncompressed Feather file."""
+        import pyarrow.feather as feather
+
+        tmp_path = f"{filepath}.{os.getpid()}.tmp"
+        feather.write_feather(pd.DataFrame({"key": self.keys, "hash": self.hashes}), tmp_path,
+                              compression="uncompressed")
+        os.replace(tmp_path, filepath)
+
+    @classmethod
+    def load(cls, filepath: str) -> "RowHashes":
+        """Load hashes written by save()."""
+        import pyarrow.feather as feather
+
+        frame = feather.read_feather(filepath)
+        return cls(frame["key"].to_numpy(), frame["hash"].to_numpy(dtype=np.uint64))
+
+
+class Delta(NamedTuple):
+    """Keys of the rows that differ between two releases of a table."""
+    added: np.ndarray      # In the new release only
+    changed: np.ndarray    # In both, with different content
+    removed: np.ndarray    # In the old release only
+    unchanged: int         # Number of rows with the same content
+
+    def __len__(self) -> int:
+        return len(self.added) + len(self.changed) + len(self.removed)
+
+    @property
+    def stale(self) -> np.ndarray:
+        """Keys whose rows must be parsed again: changed and added."""
+        return np.concatenate([self.changed, self.added])
+
+    @property
+    def dropped(self) -> np.ndarray:
+        """Keys whose old rows are no longer valid: changed and removed."""
+        return np.concatenate([self.changed, self.removed])
+
+
+class RowPlan(NamedTuple):
+    """How to assemble a row-aligned artifact of the new release.
+
+    Row i of the new artifact is row source[i] of the old artifact followed
+    by the rebuilt rows, i.e. a reused old row when source[i] < n_old and
+    rebuilt row source[i] - n_old otherwise. delta_rows are the rows of the
+    new table to rebuild, in order.
+    """
+    source: np.ndarray
+    delta_rows: np.ndarray
+    n_old: int
+
+    @property
+    def reused(self) -> int:
+        return len(self.source) - len(self.delta_rows)
+
+
+def _keys(values: Any, key: str) -> np.ndarray:
+    """Row keys as int64 (pid, nid) or object strings."""
+    if key in INTEGER_KEYS:
+        return pd.to_numeric(pd.Series(values), errors="coerce").fillna(-1).to_numpy(dtype=np.int64)
+    return pd.Series(values).astype(str).to_numpy(dtype=object)
+
+
+def table_hashes(df: pd.DataFrame, key: str) -> RowHashes:
+    """Hash every row of a DataFrame; columns are taken in name order.
+
+    Args:
+        df: Table with raw (string) values, e.g. read with dtype=str
+        key: Name of the row key column
+
+    Returns:
+        RowHashes aligned with the rows of df
+    """
+    hashes = pd.util.hash_pandas_object(df[sorted(df.columns)], index=False)
+    return RowHashes(_keys(df[key], key), hashes.to_numpy(dtype=np.uint64))
+
+
+def parquet_hashes(filepath: str, key: str, batch_size: int = 65536) -> RowHashes:
+    """Hash every row of a parquet file, one record batch at a time."""
+    parquet_file = pq.ParquetFile(filepath, memory_map=True)
+    keys, hashes = [], []
+    for batch in parquet_file.iter_batches(batch_size=batch_size):
+        part = table_hashes(batch.to_pandas(), key)
+        keys.append(part.keys)
+        hashes.append(part.hashes)
+    if not keys:
+        return RowHashes(_keys([], key), np.zeros(0, dtype=np.uint64))
+    return RowHashes(np.concatenate(keys), np.concatenate(hashes))
+
+
+def _read_raw(filepath: str) -> pd.DataFrame:
+    """A pipe-delimited table as raw strings, so hashes see the exact field text."""
+    return pd.read_csv(filepath, delimiter="|", encoding="utf-8", dtype=str, keep_default_na=False)
+
+
+def snapshot_hashes(
+    data_dir: str,
+    state_dir: Optional[str] = None,
+    tables: Optional[Sequence[str]] = None,
+    batch_size: int = 65536
+) -> Dict[str, RowHashes]:
+    """Row hashes of every table of a release.
+
+    Args:
+        data_dir: Directory with the release files (fragrances.csv,
+            comments.parquet, ...); missing tables are skipped
+        state_dir: Optional directory caching the hashes by file SHA-1, so
+            a release already hashed (e.g. the previous one) is not read again
+        tables: Tables to hash; defaults to every table in TABLE_KEYS
+        batch_size: Rows per batch when reading parquet files
+
+    Returns:
+        Dictionary mapping table name to its RowHashes
+    """
+    base = Path(data_dir)
+    manifest = {}
+    if state_dir is not None:
+        Path(state_dir).mkdir(parents=True, exist_ok=True)
+        manifest = read_manifest(state_dir)
+
+    result = {}
+    for name in tables or TABLE_KEYS:
+        key = TABLE_KEYS[name]
+        paths = [base / f"{name}.csv", base / f"{name}.parquet"]
+        path = next((p for p in paths if p.exists()), None)
+        if path is None:
+            continue
+        with span(f"delta.hash_{name}") as s:
+            s.read(str(path))
+            sha1 = hash_file(str(path))
+            cache_name = f"{name}-{sha1[:16]}.hashes.feather"
+            if state_dir is not None and (Path(state_dir) / cache_name).exists():
+                result[name] = RowHashes.load(str(Path(state_dir) / cache_name))
+                continue
+            if path.suffix == ".csv":
+                result[name] = table_hashes(_read_raw(str(path)), key)
+            else:
+                result[name] = parquet_hashes(str(path), key, batch_size)
+            s.add(rows=len(result[name]))
+            if state_dir is not None:
+                result[name].save(str(Path(state_dir) / cache_name))
+                manifest[cache_name] = {"table": name, "source": os.path.abspath(path), "sha1": sha1,
+                                        "rows": len(result[name])}
+    if state_dir is not None:
+        write_manifest(state_dir, manifest)
+    return result
+
+
+def _last_per_key(hashes: RowHashes) -> Tuple[pd.Index, np.ndarray]:
+    """Unique keys (the last row wins for repeated keys) and their hashes."""
+    keys = pd.Index(hashes.keys)
+    last = ~keys.duplicated(keep="last")
+    return keys[last], hashes.hashes[last]
+
+
+def diff_hashes(old: RowHashes, new: RowHashes) -> Delta:
+    """Compare the row hashes of two releases of one table."""
+    old_keys, old_hashes = _last_per_key(old)
+    new_keys, new_hashes = _last_per_key(new)
+    at = old_keys.get_indexer(new_keys)
+    found = at >= 0
+    same = found.copy()
+    same[found] = old_hashes[at[found]] == new_hashes[found]
+    removed = new_keys.get_indexer(old_keys) < 0
+    return Delta(
+        added=new_keys[~found].to_numpy(),
+        changed=new_keys[found & ~same].to_numpy(),
+        removed=old_keys[removed].to_numpy(),
+        unchanged=int(same.sum())
+    )
+
+
+def compute_deltas(old: Dict[str, RowHashes], new: Dict[str, RowHashes]) -> Dict[str, Delta]:
+    """Deltas of every table hashed in both releases."""
+    return {name: diff_hashes(old[name], new[name]) for name in new if name in old}
+
+
+def plan_rows(old_keys: np.ndarray, new_keys: Any, delta: Delta) -> RowPlan:
+    """Match the rows of a new table with the rows of an old artifact.
+
+    Args:
+        old_keys: Key of every row of the old artifact (e.g. store.pids)
+        new_keys: Key of every row of the new table (e.g. fragrances['pid'])
+        delta: Delta of the table between the two releases
+
+    Returns:
+        RowPlan reusing every old row whose content did not change
+    """
+    new_keys = np.asarray(new_keys)
+    at = pd.Index(old_keys).get_indexer(new_keys)
+    rebuild = (at < 0) | np.isin(new_keys, delta.changed)
+    delta_rows = np.flatnonzero(rebuild)
+    source = at.astype(np.int64)
+    source[delta_rows] = len(old_keys) + np.arange(len(delta_rows))
+    return RowPlan(source, delta_rows, len(old_keys))
+
+
+def _splice_offsets(old: np.ndarray, part: np.ndarray, plan: RowPlan) -> Tuple[np.ndarray, np.ndarray]:
+    """Offsets of spliced ragged rows, and the entries of [old; part] they take.
+
+    Args:
+        old: (n_old + 1,) row offsets of the old artifact
+        part: (len(delta_rows) + 1,) row offsets of the rebuilt rows
+        plan: RowPlan of the splice
+
+    Returns:
+        (new offsets, positions in the concatenated old and rebuilt entries)
+    """
+    old = np.asarray(old)
+    lengths = np.concatenate([np.diff(old), np.diff(part)])[plan.source]
+    starts = np.concatenate([old[:-1], part[:-1] + old[-1]])[plan.source]
+    offsets = np.concatenate(([0], np.cumsum(lengths))).astype(np.int64)
+    return offsets, _ranges(starts, lengths)
+
+
+def _splice_rows(old: np.ndarray, part: np.ndarray, plan: RowPlan) -> np.ndarray:
+    """Row-aligned array of the new release from the old rows and the rebuilt ones."""
+    return np.concatenate([old, part])[plan.source]
+
+
+def splice_parsed(old: Any, part: Any, plan: RowPlan) -> Any:
+    """Splice one output of the columnar parsers (see parse_columns.py)."""
+    if isinstance(old, RaggedColumns):
+        offsets, entries = _splice_offsets(old.offsets, part.offsets, plan)
+        return RaggedColumns(offsets, {name: np.concatenate([values, part.fields[name]])[entries]
+                                       for name, values in old.fields.items()})
+    if isinstance(old, VotingMatrix):
+        return VotingMatrix(old.categories, *(_splice_rows(getattr(old, name), getattr(part, name), plan)
+                                              for name in ("votes", "percent", "present")))
+    return pd.concat([old, part], ignore_index=True).iloc[plan.source].reset_index(drop=True)
+
+
+@traced("delta.parsed")
+def update_parsed(parsed: Dict[str, Any], fragrances: pd.DataFrame, plan: RowPlan) -> Dict[str, Any]:
+    """Columnar parser outputs of the new release from those of the previous one.
+
+    Args:
+        parsed: parse_fragrance_columns() output of the previous release
+        fragrances: Fragrances DataFrame of the new release
+        plan: RowPlan from the previous fragrances to the new ones
+
+    Returns:
+        The same fields, aligned with the rows of fragrances
+    """
+    part = parse_fragrance_columns(fragrances.iloc[plan.delta_rows], list(parsed))
+    return {field: splice_parsed(parsed[field], part[field], plan) for field in parsed}
+
+
+@traced("delta.features")
+def update_feature_store(store: FeatureStore, fragrances: pd.DataFrame, plan: RowPlan) -> FeatureStore:
+    """FeatureStore of the new release, profiling only the delta rows.
+
+    Accord columns keep their positions; accords first seen in the delta
+    are appended.
+    """
+    part = build_feature_store(fragrances.iloc[plan.delta_rows], pd.DataFrame({"id": store.accord_ids}))
+    indptr, entries = _splice_offsets(store.indptr, part.indptr, plan)
+    return FeatureStore(
+        pids=_splice_rows(store.pids, part.pids, plan),
+        accord_ids=part.accord_ids,
+        indptr=indptr,
+        indices=np.concatenate([store.indices, part.indices])[entries],
+        data=np.concatenate([store.data, part.data])[entries],
+        dense_columns=store.dense_columns,
+        dense=_splice_rows(store.dense, part.dense, plan),
+        norms=_splice_rows(store.norms, part.norms, plan)
+    )
+
+
+@traced("delta.catalog")
+def update_catalog_matrix(
+    catalog: CatalogMatrix,
+    fragrances: pd.DataFrame,
+    plan: RowPlan,
+    accords: Optional[pd.DataFrame] = None,
+    notes: Optional[pd.DataFrame] = None
+) -> CatalogMatrix:
+    """CatalogMatrix of the new release, vectorizing only the delta rows.
+
+    Feature columns keep their positions; features first seen in the delta
+    are appended, named from accords / notes when given.
+    """
+    known = pd.DataFrame({"id": catalog.columns, "name": catalog.names})
+    reference = pd.concat([known] + [r[["id", "name"]] for r in (accords, notes) if r is not None])
+    reference = reference.drop_duplicates("id", keep="first")
+    part = build_catalog_matrix(fragrances.iloc[plan.delta_rows], accords=reference)
+
+    # Gender codes of the delta rows in the old vocabulary, extended if needed
+    genders = list(catalog.genders) + [g for g in part.genders if g not in catalog.genders]
+    remap = np.append(pd.Index(genders).get_indexer(part.genders), -1).astype(np.int16)
+    indptr, entries = _splice_offsets(catalog.indptr, part.indptr, plan)
+    return CatalogMatrix(
+        pids=_splice_rows(catalog.pids, part.pids, plan),
+        columns=part.columns,
+        names=[old or new for old, new in zip(catalog.names + [""] * len(part.columns), part.names)],
+        indptr=indptr,
+        indices=np.concatenate([catalog.indices, part.indices])[entries],
+        data=np.concatenate([catalog.data, part.data])[entries],
+        genders=genders,
+        gender_codes=_splice_rows(catalog.gender_codes, remap[part.gender_codes], plan),
+        years=_splice_rows(catalog.years, part.years, plan)
+    )
+
+
+def _merge_lists(old: PostingLists, part: PostingLists, dropped: np.ndarray) -> PostingLists:
+    """Posting lists without the dropped pids, merged with the lists of the delta rows.
+
+    Both sides are sorted by (key, pid) and share no pid, so the rebuilt
+    postings are placed with a binary search instead of a full sort.
+    """
+    codes = np.repeat(np.arange(len(old.keys)), np.diff(old.offsets))
+    keep = ~np.isin(old.pids, dropped)
+    keys = np.unique(np.concatenate([old.keys, part.keys]).astype(str))
+    old_codes = np.searchsorted(keys, old.keys.astype(str))[codes]
+    part_codes = np.searchsorted(keys, part.keys.astype(str))[np.repeat(np.arange(len(part.keys)),
+                                                                        np.diff(part.offsets))]
+
+    # Composite (key, pid) sort keys; the rebuilt entries go after equal kept ones
+    width = int(max(old.pids.max(initial=0), part.pids.max(initial=0))) + 1
+    kept_order = old_codes[keep].astype(np.int64) * width + old.pids[keep]
+    part_order = part_codes.astype(np.int64) * width + part.pids
+    at = np.searchsorted(kept_order, part_order, side="right") + np.arange(len(part_order))
+    from_old = np.ones(len(kept_order) + len(part_order), dtype=bool)
+    from_old[at] = False
+
+    def merge(old_values: np.ndarray, part_values: np.ndarray) -> np.ndarray:
+        out = np.empty(len(from_old), dtype=old_values.dtype)
+        out[from_old] = old_values[keep]
+        out[at] = part_values
+        return out
+
+    counts = np.bincount(merge(old_codes, part_codes), minlength=len(keys))
+    present = counts > 0
+    return PostingLists(
+        keys=keys[present].astype(object),
+        offsets=np.concatenate(([0], np.cumsum(counts[present]))).astype(np.int64),
+        pids=merge(old.pids, part.pids),
+        payload={name: merge(values, part.payload[name]) for name, values in old.payload.items()}
+    )
+
+
+@traced("delta.postings")
+def update_posting_index(index: PostingIndex, fragrances: pd.DataFrame, delta: Delta) -> PostingIndex:
+    """PostingIndex of the new release from the previous one and the fragrances delta.
+
+    Args:
+        index: PostingIndex of the previous release
+        fragrances: Fragrances DataFrame of the new release
+        delta: Delta of the fragrances table
+
+    Returns:
+        PostingIndex equal to build_posting_index(fragrances)
+    """
+    rows = np.flatnonzero(np.isin(_keys(fragrances["pid"], "pid"), delta.stale))
+    part = build_posting_index(fragrances.iloc[rows])
+    dropped = np.sort(delta.dropped.astype(np.int64))
+    return PostingIndex(*(_merge_lists(getattr(index, name), getattr(part, name), dropped)
+                          for name in ("accords", "notes", "perfumers")), pids=_keys(fragrances["pid"], "pid"))
+
+
+@traced("delta.text")
+def update_text_index(index_dir: str, parquet_path: str, delta: Delta, batch_size: int = 65536) -> Dict:
+    """Bring a text index (see text_search.py) up to date with a new release.
+
+    Changed and removed documents are marked as deleted; indexing the new
+    release then adds one segment for the changed and added ones (the
+    others are already indexed and skipped), and every older segment is
+    rebased onto the new release, so the previous release's files can be
+    deleted.
+
+    Args:
+        index_dir: Index directory built from the previous release
+        parquet_path: comments.parquet or news.parquet of the new release
+        delta: Delta of the same table
+        batch_size: Rows per batch when reading parquet_path
+
+    Returns:
+        The index manifest
+    """
+    delete_documents(index_dir, list(delta.dropped))
+    build_text_index(parquet_path, index_dir, batch_size=batch_size)
+    return rebase_segments(index_dir, parquet_path)
+
+
+def _mutate_release(old_dir: Path, new_dir: Path, share: float = 0.01, seed: int = 1) -> Dict[str, int]:
+    """Write a new release: change, remove and add about share of the fragrances and reviews."""
+    rng = np.random.default_rng(seed)
+    shutil.copytree(old_dir, new_dir)
+
+    fragrances = _read_raw(str(old_dir / "fragrances.csv"))
+    n = len(fragrances)
+    picked = rng.permutation(n)[:int(2 * share * n)]
+    changed, removed = picked[:len(picked) // 2], picked[len(picked) // 2:]
+    for field in ("accords", "notes_pyramid", "rating"):
+        fragrances.loc[changed, field] = np.roll(fragrances[field].to_numpy()[changed], 1)
+    added = fragrances.iloc[rng.choice(n, len(removed))].copy()
+    added["pid"] = (fragrances["pid"].astype(int).max() + 1 + np.arange(len(added))).astype(str)
+    fragrances = pd.concat([fragrances.drop(index=removed), added], ignore_index=True)
+    fragrances.to_csv(new_dir / "fragrances.csv", sep="|", index=False)
+
+    comments = pq.read_table(old_dir / "comments.parquet").to_pandas()
+    m = len(comments)
+    picked = rng.permutation(m)[:int(2 * share * m)]
+    edited, deleted = picked[:len(picked) // 2], picked[len(picked) // 2:]
+    comments.loc[edited, "text"] = comments["text"].to_numpy()[edited] + " zzdeltaprobe"
+    posted = comments.iloc[rng.choice(m, len(deleted))].copy()
+    posted["comment_id"] = posted["comment_id"] + "_new"
+    comments = pd.concat([comments.drop(index=deleted), posted], ignore_index=True)
+    pq.write_table(pa.Table.from_pandas(comments, preserve_index=False), new_dir / "comments.parquet",
+                   row_group_size=100_000, compression="zstd")
+    return {"fragrances": len(changed) + 2 * len(removed), "comments": len(edited) + 2 * len(deleted)}
+
+
+def _equal_csr(a: Any, b: Any, names: Sequence[str]) -> bool:
+    return all(np.array_equal(np.asarray(getattr(a, name)), np.asarray(getattr(b, name))) for name in names)
+
+
+def main():
+    from synthetic_data import generate_fragdb
+    from text_search import TextIndex
+
+    with tempfile.TemporaryDirectory(prefix="fragdb_delta_") as tmp:
+        old_dir, new_dir, state_dir = Path(tmp) / "4.5", Path(tmp) / "4.6", f"{tmp}/state"
+        generate_fragdb(str(old_dir), scale=0.05)
+        edits = _mutate_release(old_dir, new_dir)
+
+        # Artifacts of the previous release, as a nightly job would have left them
+        old_fragrances = load_fragrances(str(old_dir / "fragrances.csv"))
+        parsed = parse_fragrance_columns(old_fragrances)
+        accords, notes = _read_raw(str(old_dir / "accords.csv")), _read_raw(str(old_dir / "notes.csv"))
+        store = build_feature_store(old_fragrances, accords)
+        catalog = build_catalog_matrix(old_fragrances, accords, notes)
+        postings = build_posting_index(old_fragrances)
+        index_dir = f"{tmp}/reviews.idx"
+        build_text_index(str(old_dir / "comments.parquet"), index_dir)
+        start = time.perf_counter()
+        old_hashes = snapshot_hashes(str(old_dir), state_dir)
+        first_hash_s = time.perf_counter() - start
+
+        print("=== FragDB v4.6 Delta Ingestion ===\n")
+        print(f"Release 4.5: {len(old_fragrances):,} fragrances, {len(old_hashes['comments']):,} reviews "
+              f"(hashed once in {first_hash_s:.1f} s)")
+        print(f"Release 4.6: about {edits['fragrances']:,} fragrance and {edits['comments']:,} review edits\n")
+
+        # Full rebuild of the new release
+        start = time.perf_counter()
+        fragrances = load_fragrances(str(new_dir / "fragrances.csv"))
+        full = {
+            "parsed": parse_fragrance_columns(fragrances),
+            "store": build_feature_store(fragrances, accords),
+            "catalog": build_catalog_matrix(fragrances, accords, notes),
+            "postings": build_posting_index(fragrances),
+        }
+        build_text_index(str(new_dir / "comments.parquet"), f"{tmp}/full.idx")
+        full_s = time.perf_counter() - start
+
+        # Delta ingestion: hash the new release, diff, update
+        timings = {}
+        start = time.perf_counter()
+        old_hashes = snapshot_hashes(str(old_dir), state_dir)
+        new_hashes = snapshot_hashes(str(new_dir), state_dir)
+        deltas = compute_deltas(old_hashes, new_hashes)
+        timings["hash + diff"] = time.perf_counter() - start
+
+        print("=== Deltas ===")
+        for name, delta in deltas.items():
+            print(f"  {name:14} +{len(delta.added):<6,} ~{len(delta.changed):<6,} -{len(delta.removed):<6,} "
+                  f"{delta.unchanged:,} unchanged")
+        print()
+
+        start = time.perf_counter()
+        fragrances = load_fragrances(str(new_dir / "fragrances.csv"))
+        plan = plan_rows(store.pids, fragrances["pid"], deltas["fragrances"])
+        timings["load + plan"] = time.perf_counter() - start
+        updates = {
+            "parsed": lambda: update_parsed(parsed, fragrances, plan),
+            "store": lambda: update_feature_store(store, fragrances, plan),
+            "catalog": lambda: update_catalog_matrix(catalog, fragrances, plan, accords, notes),
+            "postings": lambda: update_posting_index(postings, fragrances, deltas["fragrances"]),
+            "text": lambda: update_text_index(index_dir, str(new_dir / "comments.parquet"), deltas["comments"]),
+        }
+        updated = {}
+        for name, update in updates.items():
+            start = time.perf_counter()
+            updated[name] = update()
+            timings[name] = time.perf_counter() - start
+
+        print(f"=== Update times ({len(plan.delta_rows):,} of {len(fragrances):,} fragrances re-parsed) ===")
+        for name, seconds in timings.items():
+            print(f"  {name:12} {seconds * 1000:8.0f} ms")
+        print(f"  {'total':12} {sum(timings.values()):8.1f} s   vs full rebuild {full_s:.1f} s")
+        print()
+
+        # The updated artifacts match a build from scratch
+        for field, value in full["parsed"].items():
+            mine = updated["parsed"][field]
+            if isinstance(value, RaggedColumns):
+                assert np.array_equal(mine.offsets, value.offsets)
+                assert all(np.array_equal(mine.fields[k], value.fields[k]) for k in value.fields)
+            elif isinstance(value, VotingMatrix):
+                assert _equal_csr(mine, value, ("votes", "present"))
+                assert np.allclose(mine.percent, value.percent, equal_nan=True)
+            else:
+                pd.testing.assert_frame_equal(mine, value)
+        assert updated["store"].accord_ids == full["store"].accord_ids
+        assert _equal_csr(updated["store"], full["store"], FeatureStore.ARRAYS)
+        assert updated["catalog"].columns == full["catalog"].columns
+        assert _equal_csr(updated["catalog"], full["catalog"], CatalogMatrix.ARRAYS)
+        for name in ("accords", "notes", "perfumers"):
+            mine, fresh = getattr(updated["postings"], name), getattr(full["postings"], name)
+            assert list(mine.keys) == list(fresh.keys)
+            assert _equal_csr(mine, fresh, ("offsets", "pids"))
+            assert all(np.array_equal(mine.payload[k], fresh.payload[k]) for k in fresh.payload)
+        assert np.array_equal(updated["postings"].pids, full["postings"].pids)
+
+        # Every segment reads its text from the new release now
+        os.remove(old_dir / "comments.parquet")
+        index = TextIndex(index_dir)
+        probes = index.search("zzdeltaprobe", k=10 ** 6)
+        print("=== Checks ===")
+        print("  parsed columns, feature store, catalog matrix and posting lists equal a full rebuild")
+        texts = pq.read_table(new_dir / "comments.parquet", columns=["text"]).column("text")
+        expected = pc.sum(pc.match_substring(texts, "zzdeltaprobe")).as_py()
+        assert len(probes) == expected
+        assert all("zzdeltaprobe" in text for text in index.texts(probes.head(20)))
+        hits = index.search("the", k=20)
+        assert index.texts(hits) == [texts[row].as_py() for row in hits["row"]]
+        print(f"  text index: {len(probes):,} hits for the edited reviews' new word, as in the release; "
+              f"{updated['text']['deleted']:,} stale documents skipped")
+
+
+if __name__ == "__main__":
+    main()
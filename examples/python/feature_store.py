@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""
+FragDB - Feature Store Example (v4.6)
+
+Demonstrates how to turn every fragrance into a numeric profile once and
+keep the result as arrays that can be saved, memory-mapped and scored in a
+single vectorized pass:
+
+- accords: a CSR sparse matrix of accord percentages (columns = accord IDs
+  from accords.csv), stored as indptr / indices / data arrays
+- longevity and sillage: a dense block of vote percentages
+- L2 norms of the full profile, precomputed for cosine similarity
+
+The profile is the same one recommender.get_fragrance_profile() builds, so
+scores match recommender.cosine_similarity().
+"""
+
+import json
+import tempfile
+import time
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from instrumentation import traced
+from load_database import load_fragdb
+from parse_columns import VOTING_CATEGORIES, parse_accords_column, parse_voting_column
+
+# Voting fields included in the dense block of the profile
+DENSE_FIELDS = ("longevity", "sillage")
+
+
+class FeatureStore:
+    """Fragrance profile vectors for fast cosine similarity.
+
+    Row i describes the fragrance with pid pids[i]; rows are in the order of
+    the DataFrame the store was built from.
+    """
+
+    ARRAYS = ("pids", "indptr", "indices", "data", "dense", "norms")
+
+    def __init__(
+        self,
+        pids: np.ndarray,
+        accord_ids: List[str],
+        indptr: np.ndarray,
+        indices: np.ndarray,
+        data: np.ndarray,
+        dense_columns: List[str],
+        dense: np.ndarray,
+        norms: np.ndarray
+    ):
+        self.pids = pids
+        self.accord_ids = accord_ids
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+        self.dense_columns = dense_columns
+        self.dense = dense
+        self.norms = norms
+
+        # Row of every stored accord value, for bincount-based mat-vec
+        self.rows = np.repeat(np.arange(len(pids), dtype=np.int32), np.diff(indptr))
+
+    def __len__(self) -> int:
+        return len(self.pids)
+
+    def accord_vector(self, position: int) -> np.ndarray:
+        """Dense accord vector (len(accord_ids),) of one row."""
+        start, stop = self.indptr[position], self.indptr[position + 1]
+        vector = np.zeros(len(self.accord_ids), dtype=np.float64)
+        vector[self.indices[start:stop]] = self.data[start:stop]
+        return vector
+
+    def dot(self, accord_vector: np.ndarray, dense_vector: np.ndarray) -> np.ndarray:
+        """Dot product of a query profile with every row (one sparse mat-vec)."""
+        weights = self.data * accord_vector[self.indices]
+        sparse_part = np.bincount(self.rows, weights=weights, minlength=len(self))
+        return sparse_part + self.dense @ dense_vector
+
+    def row_similarities(self, position: int, candidates: np.ndarray) -> np.ndarray:
+        """Cosine similarity of row `position` to the given rows only."""
+        candidates = np.asarray(candidates, dtype=np.int64)
+        starts = self.indptr[candidates]
+        lengths = self.indptr[candidates + 1] - starts
+
+        # Positions of every stored accord of every candidate, concatenated
+        owner = np.repeat(np.arange(len(candidates)), lengths)
+        entry = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        entry += np.repeat(starts, lengths)
+
+        query = self.accord_vector(position)
+        weights = self.data[entry] * query[self.indices[entry]]
+        dots = np.bincount(owner, weights=weights, minlength=len(candidates))
+        dots += self.dense[candidates] @ self.dense[position].astype(np.float64)
+
+        denom = self.norms[candidates] * float(self.norms[position])
+        return np.divide(dots, denom, out=np.zeros(len(candidates)), where=denom > 0)
+
+    def project(self, weights: np.ndarray, chunk_rows: int = 65536) -> np.ndarray:
+        """Multiply every profile by a (n_accords + n_dense, k) matrix.
+
+        Rows are processed in chunks so the temporary (stored accords x k)
+        block stays bounded.
+
+        Returns:
+            (len(self), k) float64 array
+        """
+        n_accords = len(self.accord_ids)
+        out = self.dense @ weights[n_accords:].astype(np.float64)
+
+        for start in range(0, len(self), chunk_rows):
+            stop = min(start + chunk_rows, len(self))
+            lo, hi = self.indptr[start], self.indptr[stop]
+            if lo == hi:
+                continue
+            block = self.data[lo:hi, None] * weights[self.indices[lo:hi]]
+
+            # reduceat needs non-empty segments, so skip rows without accords
+            lengths = np.diff(self.indptr[start:stop + 1])
+            nonempty = np.flatnonzero(lengths)
+            out[start + nonempty] += np.add.reduceat(block, self.indptr[start + nonempty] - lo, axis=0)
+
+        return out
+
+    def similarities(self, position: int) -> np.ndarray:
+        """Cosine similarity of row `position` to every row."""
+        dots = self.dot(self.accord_vector(position), self.dense[position].astype(np.float64))
+        denom = self.norms * float(self.norms[position])
+        return np.divide(dots, denom, out=np.zeros(len(self)), where=denom > 0)
+
+    def top_k(
+        self,
+        position: int,
+        k: int,
+        exclude: Optional[np.ndarray] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Find the k rows most similar to row `position`.
+
+        Args:
+            position: Row of the query fragrance
+            k: Number of results
+            exclude: Optional boolean mask of rows to leave out
+
+        Returns:
+            (row positions, similarities), best first
+        """
+        scores = self.similarities(position)
+        candidates = np.flatnonzero(~exclude) if exclude is not None else np.arange(len(self))
+        k = min(k, len(candidates))
+        if k == 0:
+            return candidates[:0], scores[:0]
+
+        top = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        # Best first; ties keep catalog order like a stable sort would
+        top = top[np.lexsort((top, -scores[top]))]
+        return top, scores[top]
+
+    def save(self, directory: str) -> None:
+        """Write the store as .npy arrays plus a JSON column manifest."""
+        path = Path(directory)
+        path.mkdir(parents=True, exist_ok=True)
+        for name in self.ARRAYS:
+            np.save(path / f"{name}.npy", getattr(self, name))
+        with open(path / "columns.json", "w", encoding="utf-8") as f:
+            json.dump({"accord_ids": self.accord_ids, "dense_columns": self.dense_columns}, f)
+
+    @classmethod
+    def load(cls, directory: str, mmap: bool = True) -> "FeatureStore":
+        """Load a saved store; with mmap the arrays stay in the page cache."""
+        path = Path(directory)
+        mode = "r" if mmap else None
+        arrays = {name: np.load(path / f"{name}.npy", mmap_mode=mode) for name in cls.ARRAYS}
+        with open(path / "columns.json", encoding="utf-8") as f:
+            columns = json.load(f)
+        return cls(
+            pids=arrays["pids"],
+            accord_ids=columns["accord_ids"],
+            indptr=arrays["indptr"],
+            indices=arrays["indices"],
+            data=arrays["data"],
+            dense_columns=columns["dense_columns"],
+            dense=arrays["dense"],
+            norms=arrays["norms"]
+        )
+
+
+@traced("index.features")
+def build_feature_store(fragrances: pd.DataFrame, accords: Optional[pd.DataFrame] = None) -> FeatureStore:
+    """Build profile vectors for every fragrance.
+
+    Args:
+        fragrances: Fragrances DataFrame
+        accords: Optional accords DataFrame; its IDs define the column order.
+            Accord IDs seen in the data but missing from it are appended.
+
+    Returns:
+        FeatureStore aligned with the rows of fragrances
+    """
+    parsed = parse_accords_column(fragrances["accords"])
+    item_ids = parsed.fields["id"]
+
+    accord_ids = list(accords["id"]) if accords is not None else []
+    known = set(accord_ids)
+    accord_ids += [a for a in pd.unique(item_ids) if a not in known]
+
+    rows = np.repeat(np.arange(len(fragrances)), np.diff(parsed.offsets))
+    cols = pd.Index(accord_ids).get_indexer(item_ids)
+
+    # An accord repeated within a row: the last value wins, as in a dict profile
+    last = ~pd.DataFrame({"row": rows, "col": cols}).duplicated(keep="last").to_numpy()
+    rows, cols = rows[last], cols[last]
+    values = parsed.fields["percentage"][last] / 100.0
+
+    indptr = np.concatenate(([0], np.cumsum(np.bincount(rows, minlength=len(fragrances)))))
+
+    dense_blocks, dense_columns = [], []
+    for field in DENSE_FIELDS:
+        matrix = parse_voting_column(fragrances[field], VOTING_CATEGORIES[field])
+        dense_blocks.append(matrix.percent / 100.0)
+        dense_columns += [f"{field}_{category}" for category in matrix.categories]
+    dense = np.hstack(dense_blocks)
+
+    sq_norms = np.bincount(rows, weights=values ** 2, minlength=len(fragrances))
+    sq_norms += (dense ** 2).sum(axis=1)
+
+    return FeatureStore(
+        pids=fragrances["pid"].to_numpy(dtype=np.int64),
+        accord_ids=accord_ids,
+        indptr=indptr.astype(np.int64),
+        indices=cols.astype(np.int32),
+        data=values.astype(np.float32),
+        dense_columns=dense_columns,
+        dense=dense.astype(np.float32),
+        norms=np.sqrt(sq_norms).astype(np.float32)
+    )
+
+
+def main():
+    from recommender import cosine_similarity, find_similar, get_fragrance_profile
+
+    db = load_fragdb()
+    fragrances = db["fragrances"]
+
+    print("=== FragDB v4.6 Feature Store ===\n")
+
+    store = build_feature_store(fragrances, db["accords"])
+    print(f"Rows: {len(store)}, accord columns: {len(store.accord_ids)}, "
+          f"dense columns: {len(store.dense_columns)}, stored accords: {len(store.data)}")
+    print()
+
+    with tempfile.TemporaryDirectory() as directory:
+        store.save(directory)
+        mapped = FeatureStore.load(directory)
+
+        # Scores match the dict-based profile comparison
+        target = get_fragrance_profile(fragrances.iloc[0])
+        expected = [cosine_similarity(target, get_fragrance_profile(row)) for _, row in fragrances.iterrows()]
+        assert np.allclose(mapped.similarities(0), expected, atol=1e-6)
+        print("Memory-mapped store matches recommender.cosine_similarity()")
+        print()
+
+        print("Fragrances similar to 'Light Blue':")
+        for item in find_similar(fragrances, "Light Blue", n=3, store=mapped):
+            print(f"  {item['name']} by {item['brand']} (similarity: {item['similarity']:.2f})")
+        print()
+
+    # Compare a single query against the iterrows() scan on a larger frame
+    big = pd.concat([fragrances] * 500, ignore_index=True)
+    big_store = build_feature_store(big, db["accords"])
+    target = get_fragrance_profile(big.iloc[0])
+
+    start = time.perf_counter()
+    for _, row in big.iterrows():
+        cosine_similarity(target, get_fragrance_profile(row))
+    scan_ms = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    big_store.top_k(0, 5)
+    store_ms = (time.perf_counter() - start) * 1000
+
+    print(f"=== One query over {len(big):,} rows ===")
+    print(f"  iterrows + dict profiles: {scan_ms:8.1f} ms")
+    print(f"  feature store mat-vec:    {store_ms:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
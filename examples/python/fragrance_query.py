@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""
+FragDB - Lazy Fragrance Query Example (v4.6)
+
+Demonstrates how to chain search filters without building an intermediate
+DataFrame per filter (as the helpers in search_fragrances.py do):
+
+    query = (FragranceQuery(columns)
+             .brand("dior").years(2000, 2020).min_rating(4.0)
+             .top(5).select(["name", "year"]))
+    query.run()
+
+Nothing runs until run(). The plan:
+
+1. estimates each predicate's selectivity from precomputed statistics
+   (value counts, sorted years / ratings, posting list lengths)
+2. evaluates the most selective predicate over the whole catalog, then
+   every other predicate only on the rows that are still candidates, so
+   the expensive substring match sees as few rows as possible
+3. picks the top N by rating with argpartition
+4. materializes only the surviving rows and the selected columns
+
+All predicates read typed columns prepared once by SearchColumns (lowered
+names, brand name / ID split once, numeric year and rating, accord posting
+lists), so no call copies the frame or re-splits a packed field.
+"""
+
+import time
+from typing import Callable, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+from instrumentation import traced
+from load_database import load_fragdb
+from parse_columns import parse_brand_column, parse_rating_column
+from posting_index import PostingIndex, build_posting_index
+
+
+class SearchColumns:
+    """Typed, precomputed columns of a fragrances DataFrame for querying."""
+
+    def __init__(self, df: pd.DataFrame, index: Optional[PostingIndex] = None):
+        """
+        Args:
+            df: Fragrances DataFrame
+            index: Optional prebuilt PostingIndex for df; built on first use
+                by an accord predicate otherwise
+        """
+        self.df = df
+        self.n = len(df)
+        self.name = df["name"].fillna("").str.lower().to_numpy(dtype=object)
+
+        brand = parse_brand_column(df["brand"])
+        self.brand_name = brand["name"].str.lower().to_numpy(dtype=object)
+        self.brand_id = brand["id"].to_numpy(dtype=object)
+        self.gender = df["gender"].to_numpy(dtype=object)
+        self.year = df["year"].to_numpy(dtype=np.float64)
+        self.rating = parse_rating_column(df["rating"])["average"].to_numpy()
+        self.pid = df["pid"].to_numpy()
+
+        # Statistics for selectivity estimates
+        self.brand_id_counts = pd.Series(self.brand_id).value_counts()
+        self.gender_counts = pd.Series(self.gender).value_counts()
+        self.sorted_year = np.sort(self.year[~np.isnan(self.year)])
+        self.sorted_rating = np.sort(self.rating[~np.isnan(self.rating)])
+
+        self._index = index
+
+    @property
+    def index(self) -> PostingIndex:
+        if self._index is None:
+            self._index = build_posting_index(self.df)
+        return self._index
+
+    def positions_of_pids(self, pids: np.ndarray) -> np.ndarray:
+        """Sorted row positions of the given pids."""
+        positions = pd.Index(self.pid).get_indexer(pids)
+        return np.sort(positions[positions >= 0])
+
+
+class Predicate(NamedTuple):
+    """One filter of a query plan."""
+    description: str
+    estimate: Callable[[SearchColumns], float]                    # expected matching rows
+    cost: int                                                     # 0 = cheap compare, 1 = per-row string work
+    test: Callable[[SearchColumns, np.ndarray], np.ndarray]      # positions -> bool mask
+
+
+def _range_count(sorted_values: np.ndarray, low: float, high: float) -> float:
+    """Number of sorted values within [low, high]."""
+    return float(np.searchsorted(sorted_values, high, side="right") - np.searchsorted(sorted_values, low))
+
+
+class FragranceQuery:
+    """Lazy, chainable fragrance query. Every method returns a new query."""
+
+    def __init__(self, columns: SearchColumns, predicates: Sequence[Predicate] = (),
+                 limit: Optional[int] = None, projection: Optional[List[str]] = None):
+        self.columns = columns
+        self.predicates = list(predicates)
+        self.limit = limit
+        self.projection = projection
+
+    def _with(self, predicate: Predicate) -> "FragranceQuery":
+        return FragranceQuery(self.columns, self.predicates + [predicate], self.limit, self.projection)
+
+    def name(self, text: str) -> "FragranceQuery":
+        """Name contains text (case-insensitive, literal match)."""
+        text = text.lower()
+        return self._with(Predicate(
+            f"name contains {text!r}",
+            lambda c: c.n * 0.5,
+            1,
+            lambda c, pos: np.fromiter((text in s for s in c.name[pos]), dtype=bool, count=len(pos))
+        ))
+
+    def brand(self, prefix: str) -> "FragranceQuery":
+        """Brand name starts with prefix (case-insensitive)."""
+        prefix = prefix.lower()
+        return self._with(Predicate(
+            f"brand starts with {prefix!r}",
+            lambda c: c.n * 0.1,
+            1,
+            lambda c, pos: np.fromiter((s.startswith(prefix) for s in c.brand_name[pos]), dtype=bool,
+                                       count=len(pos))
+        ))
+
+    def brand_id(self, brand_id: str) -> "FragranceQuery":
+        """Brand ID equals brand_id (e.g. 'b3')."""
+        return self._with(Predicate(
+            f"brand_id == {brand_id!r}",
+            lambda c: float(c.brand_id_counts.get(brand_id, 0)),
+            0,
+            lambda c, pos: c.brand_id[pos] == brand_id
+        ))
+
+    def gender(self, gender: str) -> "FragranceQuery":
+        """Gender equals gender."""
+        return self._with(Predicate(
+            f"gender == {gender!r}",
+            lambda c: float(c.gender_counts.get(gender, 0)),
+            0,
+            lambda c, pos: c.gender[pos] == gender
+        ))
+
+    def years(self, start: int, end: int) -> "FragranceQuery":
+        """Release year within [start, end]."""
+        return self._with(Predicate(
+            f"{start} <= year <= {end}",
+            lambda c: _range_count(c.sorted_year, start, end),
+            0,
+            lambda c, pos: (c.year[pos] >= start) & (c.year[pos] <= end)
+        ))
+
+    def min_rating(self, min_rating: float) -> "FragranceQuery":
+        """Average rating at least min_rating."""
+        return self._with(Predicate(
+            f"rating >= {min_rating}",
+            lambda c: _range_count(c.sorted_rating, min_rating, np.inf),
+            0,
+            lambda c, pos: c.rating[pos] >= min_rating
+        ))
+
+    def accords(self, accord_ids: Sequence[str], match_all: bool = True) -> "FragranceQuery":
+        """Has all (or any) of the given accord IDs, answered from posting lists."""
+        accord_ids = list(accord_ids)
+        lookup = "with_all" if match_all else "with_any"
+
+        def estimate(c: SearchColumns) -> float:
+            sizes = [len(c.index.accords.pid_set(a)) for a in accord_ids]
+            return float(min(sizes) if match_all else sum(sizes)) if sizes else 0.0
+
+        def test(c: SearchColumns, pos: np.ndarray) -> np.ndarray:
+            matching = c.positions_of_pids(getattr(c.index.accords, lookup)(accord_ids))
+            return np.isin(pos, matching, assume_unique=True)
+
+        return self._with(Predicate(f"accords {lookup} {accord_ids}", estimate, 0, test))
+
+    def top(self, n: int) -> "FragranceQuery":
+        """Keep the n best rated matches (best first)."""
+        return FragranceQuery(self.columns, self.predicates, n, self.projection)
+
+    def select(self, columns: List[str]) -> "FragranceQuery":
+        """Materialize only these columns."""
+        return FragranceQuery(self.columns, self.predicates, self.limit, list(columns))
+
+    def plan(self) -> List[Predicate]:
+        """Predicates in evaluation order: most selective first, cheap before costly."""
+        return sorted(self.predicates, key=lambda p: (p.cost, p.estimate(self.columns)))
+
+    def explain(self) -> str:
+        """Describe the evaluation order with the estimated matching rows."""
+        lines = [f"{i}. {p.description} (~{p.estimate(self.columns):.0f} rows)"
+                 for i, p in enumerate(self.plan(), 1)]
+        if self.limit is not None:
+            lines.append(f"{len(lines) + 1}. top {self.limit} by rating (argpartition)")
+        lines.append(f"{len(lines) + 1}. materialize {self.projection or 'all columns'}")
+        return "\n".join(lines)
+
+    def positions(self) -> np.ndarray:
+        """Row positions of the result, in result order."""
+        c = self.columns
+        positions = np.arange(c.n)
+        for predicate in self.plan():
+            if len(positions) == 0:
+                break
+            positions = positions[predicate.test(c, positions)]
+
+        if self.limit is not None and len(positions) > self.limit:
+            # Missing ratings rank last
+            scores = np.nan_to_num(c.rating[positions], nan=-np.inf)
+            top = np.argpartition(-scores, self.limit - 1)[:self.limit]
+            positions = positions[top]
+        if self.limit is not None:
+            scores = np.nan_to_num(c.rating[positions], nan=-np.inf)
+            # Best first; ties keep catalog order
+            positions = positions[np.lexsort((positions, -scores))]
+        return positions
+
+    @traced("search.query")
+    def run(self) -> pd.DataFrame:
+        """Execute the plan and materialize the final projection."""
+        positions = self.positions()
+        df = self.columns.df
+        if self.projection is not None:
+            return df.iloc[positions, [df.columns.get_loc(c) for c in self.projection]]
+        return df.iloc[positions]
+
+
+def main():
+    from search_fragrances import (filter_by_rating, filter_by_year_range, get_top_rated, search_by_brand,
+                                   search_by_name)
+
+    db = load_fragdb()
+    df = db["fragrances"]
+
+    print("=== FragDB v4.6 Lazy Fragrance Query ===\n")
+
+    columns = SearchColumns(df)
+
+    query = FragranceQuery(columns).brand("dior").years(2000, 2020).min_rating(3.5)
+    print("Plan:")
+    print(query.explain())
+    print()
+    print("Dior, 2000-2020, rating >= 3.5:")
+    print(query.select(["name", "year", "rating"]).run().to_string(index=False))
+    print()
+
+    query = FragranceQuery(columns).accords(["a75", "a24"], match_all=False).top(3).select(["name", "rating"])
+    print("Top 3 rated with a sweet or citrus accord:")
+    print(query.run().to_string(index=False))
+    print()
+
+    # Same rows as the chained helpers
+    chained = filter_by_rating(filter_by_year_range(search_by_brand(df, "dior"), 2000, 2020), 3.5)
+    assert list(FragranceQuery(columns).brand("dior").years(2000, 2020).min_rating(3.5).run().index) \
+        == list(chained.index)
+    assert list(FragranceQuery(columns).top(5).run().index) == list(get_top_rated(df, 5).index)
+    print("Results match the search_fragrances.py helpers")
+    print()
+
+    # Larger catalog: chained helpers vs one lazy query
+    big = pd.concat([df] * 5000, ignore_index=True)
+    big["pid"] = np.arange(len(big))
+    big_columns = SearchColumns(big)
+
+    start = time.perf_counter()
+    get_top_rated(filter_by_rating(filter_by_year_range(search_by_name(big, "o"), 2005, 2015), 3.9), 10)
+    chained_ms = (time.perf_counter() - start) * 1000
+
+    query = FragranceQuery(big_columns).name("o").years(2005, 2015).min_rating(3.9).top(10).select(["name"])
+    start = time.perf_counter()
+    query.run()
+    lazy_ms = (time.perf_counter() - start) * 1000
+
+    print(f"=== name + years + rating + top 10 over {len(big):,} rows ===")
+    print(f"  chained helpers:  {chained_ms:8.1f} ms")
+    print(f"  lazy query:       {lazy_ms:8.1f} ms")
+    print()
+    print(query.explain())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,412 @@
+#!/usr/bin/env python3
+"""
+FragDB - Instrumentation Example (v4.6)
+
+Demonstrates how to see where the time of a request goes. The examples
+wrap their stages in named spans:
+
+- load.<table>         CSV reads in load_database.py (rows, bytes read)
+- parse.<field>        columnar parsers run by parse_fragrance_columns()
+- join.<table>         join_with_brands() and the JoinCache joins
+- search.<filter>      the search_fragrances.py helpers
+- index.<kind>         posting index / feature store builds
+- recommend.<kind>     the recommender.py entry points
+
+Spans nest (recommend.accords -> index.postings -> parse.accords), and each
+finished span is sent as a record to the configured sinks (LoggingSink,
+JsonLinesSink, MemorySink or any callable). Per-stage counters (calls,
+seconds, rows, bytes read) are kept for a summary table.
+
+Optional capture modes add detail to the outermost spans:
+
+- profile="cprofile":     the top functions by cumulative time
+- profile="tracemalloc":  bytes allocated and peak traced memory
+
+Instrumentation is off by default. A disabled span() is one global lookup
+returning a shared no-op object, and a disabled @traced function is one
+extra call, so the hooks can stay in hot code:
+
+    with recording(JsonLinesSink("trace.jsonl")):
+        recommend_by_accords(df, ["woody"])
+    print(counters())
+"""
+
+import cProfile
+import functools
+import io
+import json
+import logging
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, IO, Iterator, List, Optional, Sequence, Union
+
+import pandas as pd
+
+PROFILE_MODES = ("cprofile", "tracemalloc")
+
+
+class LoggingSink:
+    """Write each span record as one log line."""
+
+    def __init__(self, logger: Optional[logging.Logger] = None, level: int = logging.INFO):
+        self.logger = logger or logging.getLogger("fragdb")
+        self.level = level
+
+    def __call__(self, record: Dict[str, Any]) -> None:
+        extra = {k: v for k, v in record.items() if k not in ("path", "seconds", "rows", "bytes_read")}
+        self.logger.log(self.level, "%s %.2f ms rows=%d bytes=%d %s", record["path"], record["seconds"] * 1000,
+                        record["rows"], record["bytes_read"], json.dumps(extra, default=str))
+
+
+class JsonLinesSink:
+    """Append each span record as one JSON line to a file or stream."""
+
+    def __init__(self, target: Union[str, IO[str]]):
+        self._owned = isinstance(target, (str, os.PathLike))
+        self.stream = open(target, "a", encoding="utf-8") if self._owned else target
+        self._lock = threading.Lock()
+
+    def __call__(self, record: Dict[str, Any]) -> None:
+        line = json.dumps(record, default=str)
+        with self._lock:
+            self.stream.write(line + "\n")
+
+    def close(self) -> None:
+        if self._owned:
+            self.stream.close()
+        else:
+            self.stream.flush()
+
+
+class MemorySink:
+    """Keep span records in a list (for tests and notebooks)."""
+
+    def __init__(self):
+        self.records: List[Dict[str, Any]] = []
+
+    def __call__(self, record: Dict[str, Any]) -> None:
+        self.records.append(record)
+
+
+class _NullSpan:
+    """Span returned while instrumentation is disabled; every method is a no-op."""
+
+    def __enter__(self) -> "_NullSpan":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        return None
+
+    def add(self, rows: int = 0, bytes_read: int = 0, **fields) -> None:
+        pass
+
+    def read(self, filepath: Any) -> None:
+        pass
+
+
+NULL_SPAN = _NullSpan()
+
+
+class Span:
+    """One timed stage; use as a context manager."""
+
+    def __init__(self, recorder: "Recorder", name: str, rows: int = 0, bytes_read: int = 0):
+        self.recorder = recorder
+        self.name = name
+        self.rows = rows
+        self.bytes_read = bytes_read
+        self.fields: Dict[str, Any] = {}
+        self.path = name
+        self.depth = 0
+
+    def add(self, rows: int = 0, bytes_read: int = 0, **fields) -> None:
+        """Add to the span's counters and attach extra record fields."""
+        self.rows += rows
+        self.bytes_read += bytes_read
+        self.fields.update(fields)
+
+    def read(self, filepath: Any) -> None:
+        """Count the size of a file read by this span (paths only)."""
+        if isinstance(filepath, (str, os.PathLike)) and os.path.exists(filepath):
+            self.bytes_read += os.path.getsize(filepath)
+
+    def __enter__(self) -> "Span":
+        self.recorder._enter(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        seconds = time.perf_counter() - self.start
+        if exc_type is not None:
+            self.fields["error"] = exc_type.__name__
+        self.recorder._exit(self, seconds)
+
+
+class Recorder:
+    """Collects spans: counters per stage, records to sinks, optional profiles."""
+
+    def __init__(self, sinks: Sequence[Callable[[Dict[str, Any]], None]] = (), profile: Optional[str] = None,
+                 profile_top: int = 10):
+        """
+        Args:
+            sinks: Callables receiving one record dict per finished span
+            profile: None, 'cprofile' or 'tracemalloc' (outermost spans only)
+            profile_top: Functions kept per cProfile capture
+        """
+        if profile not in (None,) + PROFILE_MODES:
+            raise ValueError(f"profile must be one of {PROFILE_MODES}, got {profile!r}")
+        self.sinks = list(sinks)
+        self.profile = profile
+        self.profile_top = profile_top
+        self.stats: Dict[str, Dict[str, float]] = {}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._started_tracemalloc = False
+
+    def _stack(self) -> List[Span]:
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def span(self, name: str, rows: int = 0, bytes_read: int = 0) -> Span:
+        return Span(self, name, rows, bytes_read)
+
+    def _enter(self, span: Span) -> None:
+        stack = self._stack()
+        if stack:
+            span.path = f"{stack[-1].path}/{span.name}"
+            span.depth = len(stack)
+        elif self.profile == "cprofile":
+            span._profiler = cProfile.Profile()
+            span._profiler.enable()
+        elif self.profile == "tracemalloc":
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._started_tracemalloc = True
+            tracemalloc.reset_peak()
+            span._memory_start = tracemalloc.get_traced_memory()[0]
+        stack.append(span)
+
+    def _exit(self, span: Span, seconds: float) -> None:
+        stack = self._stack()
+        stack.pop()
+        record = {"span": span.name, "path": span.path, "depth": span.depth, "seconds": round(seconds, 6),
+                  "rows": span.rows, "bytes_read": span.bytes_read, "thread": threading.current_thread().name}
+
+        if span.depth == 0 and self.profile == "cprofile":
+            span._profiler.disable()
+            record["profile"] = self._top_functions(span._profiler)
+        elif span.depth == 0 and self.profile == "tracemalloc":
+            current, peak = tracemalloc.get_traced_memory()
+            record["allocated_bytes"] = current - span._memory_start
+            record["peak_bytes"] = peak - span._memory_start
+        record.update(span.fields)
+
+        with self._lock:
+            stage = self.stats.setdefault(span.name, {"calls": 0, "seconds": 0.0, "rows": 0, "bytes_read": 0})
+            stage["calls"] += 1
+            stage["seconds"] += seconds
+            stage["rows"] += span.rows
+            stage["bytes_read"] += span.bytes_read
+        for sink in self.sinks:
+            sink(record)
+
+    def _top_functions(self, profiler: cProfile.Profile) -> List[Dict[str, Any]]:
+        stats = pstats.Stats(profiler, stream=io.StringIO())
+        rows = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)
+        return [{"function": f"{os.path.basename(filename)}:{line}({function})", "calls": calls,
+                 "cumulative_s": round(cumulative, 6)}
+                for (filename, line, function), (_, calls, _, cumulative, _) in rows[:self.profile_top]]
+
+    def close(self) -> None:
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+        for sink in self.sinks:
+            close = getattr(sink, "close", None)
+            if close is not None:
+                close()
+
+
+# The active recorder; None means instrumentation is disabled
+_recorder: Optional[Recorder] = None
+
+
+def enable(sinks: Sequence[Callable[[Dict[str, Any]], None]] = (), profile: Optional[str] = None,
+           profile_top: int = 10) -> Recorder:
+    """Start recording spans (replaces any active recorder).
+
+    Args:
+        sinks: Span record consumers (LoggingSink, JsonLinesSink, MemorySink, ...)
+        profile: Optional capture mode, 'cprofile' or 'tracemalloc'
+        profile_top: Functions kept per cProfile capture
+
+    Returns:
+        The active Recorder
+    """
+    global _recorder
+    disable()
+    _recorder = Recorder(sinks, profile, profile_top)
+    return _recorder
+
+
+def disable() -> Optional[Recorder]:
+    """Stop recording and close the sinks; returns the recorder that was active."""
+    global _recorder
+    recorder, _recorder = _recorder, None
+    if recorder is not None:
+        recorder.close()
+    return recorder
+
+
+def enabled() -> bool:
+    return _recorder is not None
+
+
+@contextmanager
+def recording(*sinks: Callable[[Dict[str, Any]], None], profile: Optional[str] = None,
+              profile_top: int = 10) -> Iterator[Recorder]:
+    """Record spans for the duration of a with block."""
+    recorder = enable(sinks, profile, profile_top)
+    try:
+        yield recorder
+    finally:
+        if _recorder is recorder:
+            disable()
+
+
+def span(name: str, rows: int = 0, bytes_read: int = 0) -> Union[Span, _NullSpan]:
+    """A named span, or the shared no-op span when disabled.
+
+    Args:
+        name: Stage name, e.g. 'load.fragrances'
+        rows: Rows processed (more can be added with span.add)
+        bytes_read: Bytes read (span.read(path) adds a file's size)
+    """
+    recorder = _recorder
+    if recorder is None:
+        return NULL_SPAN
+    return recorder.span(name, rows, bytes_read)
+
+
+def _count(result: Any) -> int:
+    try:
+        return len(result)
+    except TypeError:
+        return 0
+
+
+def traced(name: str) -> Callable[[Callable], Callable]:
+    """Decorator wrapping every call in a span; rows = len(result) when defined."""
+    def decorate(function: Callable) -> Callable:
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            recorder = _recorder
+            if recorder is None:
+                return function(*args, **kwargs)
+            with recorder.span(name) as s:
+                result = function(*args, **kwargs)
+                s.add(rows=_count(result))
+            return result
+        return wrapper
+    return decorate
+
+
+def counters(recorder: Optional[Recorder] = None) -> pd.DataFrame:
+    """Per-stage totals of a recorder (the active one by default).
+
+    Returns:
+        DataFrame indexed by stage with calls, seconds, rows, bytes_read and
+        rows_per_s, slowest stage first
+    """
+    recorder = recorder or _recorder
+    columns = ["calls", "seconds", "rows", "bytes_read"]
+    if recorder is None or not recorder.stats:
+        return pd.DataFrame(columns=columns + ["rows_per_s"])
+    df = pd.DataFrame.from_dict(recorder.stats, orient="index")[columns]
+    df["rows_per_s"] = (df["rows"] / df["seconds"]).where(df["rows"] > 0)
+    df.index.name = "stage"
+    return df.sort_values("seconds", ascending=False)
+
+
+def main():
+    # The examples import this file as 'instrumentation'; record through that
+    # module, not through __main__, so they see the same recorder
+    import instrumentation as inst
+    from load_database import load_fragdb
+    from recommender import find_similar, recommend_by_accords
+    from search_fragrances import filter_by_rating, search_by_name
+
+    print("=== FragDB v4.6 Instrumentation ===\n")
+
+    # Spans and counters for one session
+    memory = inst.MemorySink()
+    with inst.recording(memory) as recorder:
+        db = load_fragdb()
+        df = db["fragrances"]
+        filter_by_rating(search_by_name(df, "o"), 3.5)
+        find_similar(df, "Light Blue", n=3)
+        recommend_by_accords(df, ["fruity", "sweet"], accords=db["accords"])
+
+    print("Span tree (first 12 spans, in completion order):")
+    for record in memory.records[:12]:
+        print(f"  {'  ' * record['depth']}{record['span']:<22s} {record['seconds'] * 1000:7.2f} ms "
+              f"rows={record['rows']:<4d} bytes={record['bytes_read']}")
+    print()
+    print("Counters per stage:")
+    print(inst.counters(recorder).round(4).to_string())
+    print()
+
+    # JSON lines to any stream, with a cProfile capture of the outermost span
+    stream = io.StringIO()
+    with inst.recording(inst.JsonLinesSink(stream), profile="cprofile", profile_top=3):
+        recommend_by_accords(df, ["woody"], accords=db["accords"])
+    last = json.loads(stream.getvalue().splitlines()[-1])
+    print(f"JSON line of {last['path']} with profile:")
+    for entry in last["profile"]:
+        print(f"  {entry['function']:<60s} {entry['cumulative_s'] * 1000:7.2f} ms")
+    print()
+
+    memory = inst.MemorySink()
+    with inst.recording(memory, profile="tracemalloc"):
+        with inst.span("demo.load") as s:
+            load_fragdb()
+            s.add(tables=5)
+    record = memory.records[-1]
+    print(f"tracemalloc capture of {record['path']}: {record['allocated_bytes'] / 1024:,.0f} KB kept, "
+          f"{record['peak_bytes'] / 1024:,.0f} KB peak")
+    print()
+
+    # Cost when disabled
+    calls = 200_000
+
+    def bare(x):
+        return x
+
+    wrapped = inst.traced("demo.noop")(bare)
+    start = time.perf_counter()
+    for i in range(calls):
+        bare(i)
+    bare_ns = (time.perf_counter() - start) * 1e9 / calls
+    start = time.perf_counter()
+    for i in range(calls):
+        wrapped(i)
+    wrapped_ns = (time.perf_counter() - start) * 1e9 / calls
+    start = time.perf_counter()
+    for i in range(calls):
+        with inst.span("demo.noop"):
+            pass
+    span_ns = (time.perf_counter() - start) * 1e9 / calls
+
+    print(f"=== Disabled overhead ({calls:,} calls) ===")
+    print(f"  plain call:             {bare_ns:7.0f} ns")
+    print(f"  @traced call:           {wrapped_ns:7.0f} ns")
+    print(f"  with span(...): block:  {span_ns:7.0f} ns")
+
+
+if __name__ == "__main__":
+    main()
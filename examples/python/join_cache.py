@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+FragDB - Join Cache Example (v4.6)
+
+Demonstrates how to join fragrances with their brands, perfumers and notes
+without re-splitting strings or running a hash merge on every call.
+
+A JoinCache extracts the foreign keys once (the brand ID packed into the
+brand field, the perfumer and note IDs packed into list fields) and turns
+them into row positions of the reference tables using ReferenceResolver
+(see reference.py). Every join after that is a positional take:
+
+- brand: one int32 row position per fragrance
+- perfumers / notes: CSR-style offsets + row positions, one run per fragrance
+
+join_brands() returns the same rows and columns as
+load_database.join_with_brands(). denormalized_view() builds a flat
+fragrance + brand + perfumer table that can be written to a Feather file
+and memory-mapped by later jobs.
+"""
+
+import tempfile
+import time
+from typing import List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+from instrumentation import traced
+from load_database import load_fragdb, join_with_brands
+from parse_columns import parse_brand_column, parse_notes_pyramid_column, parse_perfumers_column
+from reference import ReferenceResolver
+
+
+def _take(table: pd.DataFrame, positions: np.ndarray, columns: Optional[Sequence[str]] = None) -> pd.DataFrame:
+    """Rows of table at positions (-1 gives a row of missing values)."""
+    table = table if columns is None else table[list(columns)]
+    if (positions >= 0).all():
+        return table.take(positions).reset_index(drop=True)
+    # A RangeIndex makes -1 a missing label, so reindex fills it with NaN
+    return table.reset_index(drop=True).reindex(positions).reset_index(drop=True)
+
+
+class JoinCache:
+    """Foreign keys of the fragrances table, resolved to reference row positions."""
+
+    def __init__(
+        self,
+        fragrances: pd.DataFrame,
+        brands: pd.DataFrame,
+        perfumers: Optional[pd.DataFrame] = None,
+        notes: Optional[pd.DataFrame] = None
+    ):
+        """
+        Args:
+            fragrances: Fragrances DataFrame
+            brands: Brands DataFrame
+            perfumers: Optional perfumers DataFrame
+            notes: Optional notes DataFrame
+        """
+        self.fragrances = fragrances
+        self.brands = brands
+        self.perfumers = perfumers
+        self.notes = notes
+
+        brand = parse_brand_column(fragrances["brand"])
+        self.brand_id = brand["id"].to_numpy()
+        self.brand_rows = ReferenceResolver(brands).positions(self.brand_id)
+
+        self.perfumer_offsets = self.perfumer_rows = None
+        if perfumers is not None:
+            parsed = parse_perfumers_column(fragrances["perfumers"])
+            self.perfumer_offsets = parsed.offsets
+            self.perfumer_rows = ReferenceResolver(perfumers).positions(parsed.fields["id"])
+
+        self.note_offsets = self.note_rows = self.note_layers = None
+        if notes is not None:
+            parsed = parse_notes_pyramid_column(fragrances["notes_pyramid"])
+            self.note_offsets = parsed.offsets
+            self.note_rows = ReferenceResolver(notes).positions(parsed.fields["id"])
+            self.note_layers = parsed.fields["layer"]
+
+    def brand_columns(self, columns: Optional[Sequence[str]] = None) -> pd.DataFrame:
+        """Brand columns aligned with the fragrance rows (one take)."""
+        return _take(self.brands, self.brand_rows, columns)
+
+    @traced("join.brands_cache")
+    def join_brands(self, columns: Optional[Sequence[str]] = None, suffix: str = "_brand") -> pd.DataFrame:
+        """Fragrances with brand details, like join_with_brands().
+
+        Args:
+            columns: Brand columns to add (all by default)
+            suffix: Suffix for brand columns whose name is already taken
+
+        Returns:
+            DataFrame with the fragrance columns, brand_id and the brand columns
+        """
+        brand = self.brand_columns(columns)
+        brand.index = self.fragrances.index
+        taken = set(self.fragrances.columns) | {"brand_id"}
+        brand.columns = [f"{c}{suffix}" if c in taken else c for c in brand.columns]
+
+        brand_id = pd.Series(self.brand_id, index=self.fragrances.index, name="brand_id")
+        # Without copy the fragrance columns are shared with the cached frame
+        return pd.concat([self.fragrances, brand_id, brand], axis=1, copy=False)
+
+    def _exploded(self, table: pd.DataFrame, offsets: np.ndarray, rows: np.ndarray,
+                  columns: Optional[Sequence[str]]) -> pd.DataFrame:
+        """One row per (fragrance, reference item) pair."""
+        owner = np.repeat(np.arange(len(self.fragrances)), np.diff(offsets))
+        joined = _take(table, rows, columns)
+        joined.insert(0, "pid", self.fragrances["pid"].to_numpy()[owner])
+        return joined
+
+    def perfumer_pairs(self, columns: Optional[Sequence[str]] = None) -> pd.DataFrame:
+        """Fragrance pid + perfumer columns, one row per credited perfumer."""
+        if self.perfumers is None:
+            raise ValueError("JoinCache was built without the perfumers table")
+        return self._exploded(self.perfumers, self.perfumer_offsets, self.perfumer_rows, columns)
+
+    def note_pairs(self, columns: Optional[Sequence[str]] = None) -> pd.DataFrame:
+        """Fragrance pid + pyramid layer + note columns, one row per note."""
+        if self.notes is None:
+            raise ValueError("JoinCache was built without the notes table")
+        joined = self._exploded(self.notes, self.note_offsets, self.note_rows, columns)
+        joined.insert(1, "layer", self.note_layers)
+        return joined
+
+    @traced("join.denormalized")
+    def denormalized_view(
+        self,
+        fragrance_columns: Sequence[str] = ("pid", "name", "year", "gender"),
+        brand_columns: Sequence[str] = ("name", "country"),
+        perfumer_column: str = "name"
+    ) -> pd.DataFrame:
+        """Flat fragrance + brand + perfumer table, one row per fragrance.
+
+        Perfumer values are joined with '; ' in credit order; perfumer IDs
+        without a row in perfumers.csv are left out.
+        """
+        view = self.fragrances[list(fragrance_columns)].reset_index(drop=True)
+        view["brand_id"] = self.brand_id
+        brand = self.brand_columns(brand_columns)
+        for column in brand_columns:
+            view[f"brand_{column}"] = brand[column].to_numpy()
+
+        if self.perfumers is not None:
+            pairs = self.perfumer_pairs([perfumer_column])
+            owner = np.repeat(np.arange(len(view)), np.diff(self.perfumer_offsets))
+            found = self.perfumer_rows >= 0
+            joined = pd.Series(pairs[perfumer_column].to_numpy()[found]).groupby(owner[found]).agg("; ".join)
+            view[f"perfumer_{perfumer_column}s"] = joined.reindex(np.arange(len(view)), fill_value="").to_numpy()
+
+        return view
+
+
+def save_view(view: pd.DataFrame, path: str) -> None:
+    """Persist a denormalized view as an uncompressed Feather file."""
+    from snapshot_cache import write_snapshot
+    write_snapshot(view, path)
+
+
+def load_view(path: str, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """Memory-map a view written by save_view()."""
+    from snapshot_cache import read_snapshot
+    return read_snapshot(path, columns)
+
+
+def main():
+    db = load_fragdb()
+    fragrances = db["fragrances"]
+
+    print("=== FragDB v4.6 Join Cache ===\n")
+
+    cache = JoinCache(fragrances, db["brands"], db["perfumers"], db["notes"])
+
+    # Same result as the merge-based join
+    expected = join_with_brands(fragrances, db["brands"])
+    assert cache.join_brands().equals(expected)
+    print("join_brands() matches join_with_brands()")
+    print()
+
+    print("Perfumer credits (resolved against perfumers.csv):")
+    pairs = cache.perfumer_pairs(["id", "name", "company"]).dropna(subset=["id"])
+    print(pairs.head().to_string(index=False))
+    print()
+
+    print("Notes of the first fragrance:")
+    notes = cache.note_pairs(["name", "group"])
+    print(notes[notes["pid"] == fragrances["pid"].iloc[0]].head().to_string(index=False))
+    print()
+
+    with tempfile.TemporaryDirectory() as directory:
+        view = cache.denormalized_view()
+        save_view(view, f"{directory}/fragrance_view.feather")
+        mapped = load_view(f"{directory}/fragrance_view.feather")
+        print("Denormalized view (memory-mapped from Feather):")
+        print(mapped[["name", "brand_id", "perfumer_names"]].head().to_string(index=False))
+        print()
+
+    # Benchmark on a larger catalog whose brands all resolve: 20,000
+    # fragrances against 5,000 brands built from the samples
+    big = pd.concat([fragrances] * 2000, ignore_index=True)
+    big["pid"] = np.arange(len(big))
+    brand_ids = np.arange(len(big)) % 5000
+    big["brand"] = [f"Brand {i};b{i}" for i in brand_ids]
+    big_brands = pd.concat([db["brands"]] * 500, ignore_index=True)
+    big_brands["id"] = [f"b{i}" for i in range(len(big_brands))]
+
+    start = time.perf_counter()
+    for _ in range(5):
+        join_with_brands(big, big_brands)
+    merge_ms = (time.perf_counter() - start) * 1000 / 5
+
+    start = time.perf_counter()
+    big_cache = JoinCache(big, big_brands)
+    build_ms = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    for _ in range(5):
+        big_cache.join_brands()
+    take_ms = (time.perf_counter() - start) * 1000 / 5
+
+    start = time.perf_counter()
+    for _ in range(5):
+        big_cache.brand_columns(["name", "country"])
+    narrow_ms = (time.perf_counter() - start) * 1000 / 5
+
+    print(f"=== Brand join, {len(big):,} fragrances x {len(big_brands):,} brands ===")
+    print(f"  join_with_brands (split + merge):   {merge_ms:8.1f} ms per join")
+    print(f"  JoinCache build:                    {build_ms:8.1f} ms (once)")
+    print(f"  JoinCache.join_brands (take):       {take_ms:8.1f} ms per join")
+    print(f"  JoinCache.brand_columns (2 cols):   {narrow_ms:8.1f} ms per join")
+
+
+if __name__ == "__main__":
+    main()
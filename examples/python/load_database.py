@@ -8,139 +8,286 @@ Now includes 5 CSV files: fragrances, brands, perfumers, notes, accords.
 
 import pandas as pd
 from pathlib import Path
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Sequence, Union
+from instrumentation import span, traced
 
+# Numeric fields of the fragrances table
+FRAGRANCE_NUMERIC_FIELDS = ("pid", "year", "reviews_count")
 
-def load_fragrances(filepath: str = "../../samples/fragrances.csv") -> pd.DataFrame:
+
+def _convert_numeric(df: pd.DataFrame, fields: Sequence[str]) -> pd.DataFrame:
+    """Convert the given fields to numbers, skipping fields not loaded."""
+    for field in fields:
+        if field in df.columns:
+            df[field] = pd.to_numeric(df[field], errors="coerce")
+    return df
+
+
+def load_fragrances(
+    filepath: str = "../../samples/fragrances.csv",
+    columns: Optional[List[str]] = None
+) -> pd.DataFrame:
     """Load the fragrances database from a CSV file.
 
     Args:
         filepath: Path to the fragrances CSV file (pipe-delimited)
+        columns: Optional list of fields to read; the other fields are
+            skipped by the CSV parser and never materialized
 
     Returns:
-        DataFrame with fragrance data (30 fields)
+        DataFrame with fragrance data (30 fields, or the requested ones)
+    """
+    with span("load.fragrances") as s:
+        s.read(filepath)
+        df = pd.read_csv(
+            filepath,
+            delimiter="|",
+            encoding="utf-8",
+            dtype=str,  # Load all as strings, convert as needed
+            usecols=columns
+        )
+
+        # Convert numeric fields
+        df = _convert_numeric(df, FRAGRANCE_NUMERIC_FIELDS)
+        s.add(rows=len(df))
+
+    return df
+
+
+class FragranceChunk(NamedTuple):
+    """One chunk of fragrances yielded by iter_fragrances()."""
+    start: int                # Row number of the first row in the file
+    frame: pd.DataFrame       # Typed columns, index start..start + len - 1
+    parsed: Dict[str, Any]    # Field name -> columnar parser output
+
+
+def iter_fragrances(
+    filepath: str = "../../samples/fragrances.csv",
+    columns: Optional[List[str]] = None,
+    chunksize: int = 10000,
+    parse: Union[bool, Sequence[str]] = False
+) -> Iterator[FragranceChunk]:
+    """Stream the fragrances file in typed chunks of bounded size.
+
+    Only one chunk is held in memory at a time, so batch jobs over the full
+    database run in memory proportional to chunksize x requested fields.
+
+    Args:
+        filepath: Path to the fragrances CSV file (pipe-delimited)
+        columns: Optional list of fields to read (all 30 by default)
+        chunksize: Number of rows per chunk
+        parse: Also run the columnar field parsers (see parse_columns.py)
+            on every chunk: True for every packed field that was read, or a
+            list of field names
+
+    Yields:
+        FragranceChunk(start, frame, parsed)
     """
-    df = pd.read_csv(
+    reader = pd.read_csv(
         filepath,
         delimiter="|",
         encoding="utf-8",
-        dtype=str  # Load all as strings, convert as needed
+        dtype=str,
+        usecols=columns,
+        chunksize=chunksize
     )
 
-    # Convert numeric fields
-    df["pid"] = pd.to_numeric(df["pid"], errors="coerce")
-    df["year"] = pd.to_numeric(df["year"], errors="coerce")
-    df["reviews_count"] = pd.to_numeric(df["reviews_count"], errors="coerce")
+    if parse:
+        from parse_columns import parse_fragrance_columns
 
-    return df
+    start = 0
+    with reader:
+        for frame in reader:
+            with span("load.fragrances_chunk", rows=len(frame)):
+                frame = _convert_numeric(frame, FRAGRANCE_NUMERIC_FIELDS)
+                parsed = {}
+                if parse:
+                    parsed = parse_fragrance_columns(frame, None if parse is True else list(parse))
+            yield FragranceChunk(start, frame, parsed)
+            start += len(frame)
 
 
-def load_brands(filepath: str = "../../samples/brands.csv") -> pd.DataFrame:
+def load_brands(filepath: str = "../../samples/brands.csv", columns: Optional[List[str]] = None) -> pd.DataFrame:
     """Load the brands reference table.
 
     Args:
         filepath: Path to the brands CSV file (pipe-delimited)
+        columns: Optional list of fields to read
 
     Returns:
         DataFrame with brand data (10 fields)
     """
-    df = pd.read_csv(
-        filepath,
-        delimiter="|",
-        encoding="utf-8",
-        dtype=str
-    )
-
-    # Convert numeric fields
-    df["brand_count"] = pd.to_numeric(df["brand_count"], errors="coerce")
+    with span("load.brands") as s:
+        s.read(filepath)
+        df = pd.read_csv(
+            filepath,
+            delimiter="|",
+            encoding="utf-8",
+            dtype=str,
+            usecols=columns
+        )
+
+        # Convert numeric fields
+        _convert_numeric(df, ["brand_count"])
+        s.add(rows=len(df))
 
     return df
 
 
-def load_perfumers(filepath: str = "../../samples/perfumers.csv") -> pd.DataFrame:
+def load_perfumers(filepath: str = "../../samples/perfumers.csv", columns: Optional[List[str]] = None) -> pd.DataFrame:
     """Load the perfumers reference table.
 
     Args:
         filepath: Path to the perfumers CSV file (pipe-delimited)
+        columns: Optional list of fields to read
 
     Returns:
         DataFrame with perfumer data (11 fields)
     """
-    df = pd.read_csv(
-        filepath,
-        delimiter="|",
-        encoding="utf-8",
-        dtype=str
-    )
-
-    # Convert numeric fields
-    df["perfumes_count"] = pd.to_numeric(df["perfumes_count"], errors="coerce")
+    with span("load.perfumers") as s:
+        s.read(filepath)
+        df = pd.read_csv(
+            filepath,
+            delimiter="|",
+            encoding="utf-8",
+            dtype=str,
+            usecols=columns
+        )
+
+        # Convert numeric fields
+        _convert_numeric(df, ["perfumes_count"])
+        s.add(rows=len(df))
 
     return df
 
 
-def load_notes(filepath: str = "../../samples/notes.csv") -> pd.DataFrame:
+def load_notes(filepath: str = "../../samples/notes.csv", columns: Optional[List[str]] = None) -> pd.DataFrame:
     """Load the notes reference table (NEW in v3.0).
 
     Args:
         filepath: Path to the notes CSV file (pipe-delimited)
+        columns: Optional list of fields to read
 
     Returns:
         DataFrame with note data (11 fields)
     """
-    df = pd.read_csv(
-        filepath,
-        delimiter="|",
-        encoding="utf-8",
-        dtype=str
-    )
-
-    # Convert numeric fields
-    df["fragrance_count"] = pd.to_numeric(df["fragrance_count"], errors="coerce")
+    with span("load.notes") as s:
+        s.read(filepath)
+        df = pd.read_csv(
+            filepath,
+            delimiter="|",
+            encoding="utf-8",
+            dtype=str,
+            usecols=columns
+        )
+
+        # Convert numeric fields
+        _convert_numeric(df, ["fragrance_count"])
+        s.add(rows=len(df))
 
     return df
 
 
-def load_accords(filepath: str = "../../samples/accords.csv") -> pd.DataFrame:
+def load_accords(filepath: str = "../../samples/accords.csv", columns: Optional[List[str]] = None) -> pd.DataFrame:
     """Load the accords reference table (NEW in v3.0).
 
     Args:
         filepath: Path to the accords CSV file (pipe-delimited)
+        columns: Optional list of fields to read
 
     Returns:
         DataFrame with accord data (5 fields)
     """
-    df = pd.read_csv(
-        filepath,
-        delimiter="|",
-        encoding="utf-8",
-        dtype=str
-    )
+    with span("load.accords") as s:
+        s.read(filepath)
+        df = pd.read_csv(
+            filepath,
+            delimiter="|",
+            encoding="utf-8",
+            dtype=str,
+            usecols=columns
+        )
+
+        # Convert numeric fields
+        _convert_numeric(df, ["fragrance_count"])
+        s.add(rows=len(df))
+
+    return df
+
 
-    # Convert numeric fields
-    df["fragrance_count"] = pd.to_numeric(df["fragrance_count"], errors="coerce")
+def load_translations(filepath: str = "../../samples/translations.csv") -> pd.DataFrame:
+    """Load the translation vocabulary (gender and voting labels).
+
+    Args:
+        filepath: Path to the translations CSV file (pipe-delimited)
+
+    Returns:
+        DataFrame with 'id', 'section' and one column per language (en, de, ...)
+    """
+    with span("load.translations") as s:
+        s.read(filepath)
+        df = pd.read_csv(filepath, delimiter="|", encoding="utf-8", dtype=str, keep_default_na=False)
+        s.add(rows=len(df))
 
     return df
 
 
-def load_fragdb(samples_dir: str = "../../samples") -> dict:
+def load_fragdb(
+    samples_dir: str = "../../samples",
+    snapshot_dir: Optional[str] = None,
+    columns: Optional[Dict[str, List[str]]] = None,
+    compact: bool = False
+) -> dict:
     """Load all FragDB database files.
 
     Args:
         samples_dir: Directory containing the CSV files
+        snapshot_dir: Optional directory for typed Feather snapshots. When set,
+            each table is parsed once and later loads memory-map the snapshot
+            (see snapshot_cache.py). Requires pyarrow.
+        columns: Optional column projection per table, e.g.
+            {"fragrances": ["pid", "brand", "accords"]}. Only the listed
+            fields of those tables are read; other tables load in full.
+        compact: Convert the tables to categoricals, int32 and integer IDs
+            (see compact.py); the brand field becomes brand_name + brand_id.
 
     Returns:
         Dictionary with 'fragrances', 'brands', 'perfumers', 'notes', 'accords' DataFrames
     """
     base = Path(samples_dir)
-    return {
-        "fragrances": load_fragrances(str(base / "fragrances.csv")),
-        "brands": load_brands(str(base / "brands.csv")),
-        "perfumers": load_perfumers(str(base / "perfumers.csv")),
-        "notes": load_notes(str(base / "notes.csv")),
-        "accords": load_accords(str(base / "accords.csv"))
+    loaders = {
+        "fragrances": load_fragrances,
+        "brands": load_brands,
+        "perfumers": load_perfumers,
+        "notes": load_notes,
+        "accords": load_accords
     }
 
+    columns = columns or {}
+
+    with span("load.fragdb") as s:
+        if snapshot_dir is None:
+            db = {
+                name: loader(str(base / f"{name}.csv"), columns=columns.get(name))
+                for name, loader in loaders.items()
+            }
+        else:
+            # Snapshots hold every field; the projection is applied when reading them
+            from snapshot_cache import load_cached
+            db = {
+                name: load_cached(name, str(base / f"{name}.csv"), loader, snapshot_dir, columns=columns.get(name))
+                for name, loader in loaders.items()
+            }
+
+        if compact:
+            from compact import compact_fragdb
+            db = compact_fragdb(db)
+        s.add(rows=sum(len(table) for table in db.values()))
 
+    return db
+
+
+@traced("join.brands")
 def join_with_brands(fragrances: pd.DataFrame, brands: pd.DataFrame) -> pd.DataFrame:
     """Join fragrances with brand details.
 
@@ -213,6 +360,23 @@ def main():
     print("=== Joined Data Example ===")
     joined = join_with_brands(fragrances, brands)
     print(joined[["name", "name_brand", "country", "website"]].head())
+    print()
+
+    # Example: Read only the fields a job needs
+    print("=== Column Projection ===")
+    slim = load_fragdb(columns={"fragrances": ["pid", "brand", "accords"]})["fragrances"]
+    full_kb = fragrances.memory_usage(deep=True).sum() / 1024
+    slim_kb = slim.memory_usage(deep=True).sum() / 1024
+    print(f"All fields: {full_kb:.1f} KB, pid/brand/accords only: {slim_kb:.1f} KB")
+    print()
+
+    # Example: Stream the file in chunks, already parsed
+    print("=== Streaming Chunks ===")
+    for chunk in iter_fragrances(columns=["pid", "name", "accords", "rating"], chunksize=4, parse=True):
+        ratings = chunk.parsed["rating"]
+        print(f"Rows {chunk.start}-{chunk.start + len(chunk.frame) - 1}: "
+              f"{len(chunk.parsed['accords'].fields['id'])} accords, "
+              f"mean rating {ratings['average'].mean():.2f}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+"""
+FragDB - Localization Example (v4.6)
+
+Demonstrates how to show any FragDB vocabulary in any of the 23 languages
+without a Python-level lookup per row. The README localizes with
+
+    df['gender'].map(lambda x: trans.loc[x, 'ru'] if x in trans.index else x)
+
+which runs a .loc per row and again for every language and every field.
+
+Here each vocabulary is encoded as integer codes once:
+
+- translations.csv sections: gender, appreciation, price_value,
+  gender_votes, longevity, sillage, season (season also holds the
+  time_of_day labels); 'translations' holds every ID
+- accords (name, name_xx), notes (name, note_name_xx) and note groups
+  (group, note_group_xx)
+- brand countries (country_xx) and activities (main_activity_xx),
+  perfumer statuses (status_xx)
+
+A Vocabulary is the (codes x languages) lookup table of one of them. A
+language's labels are only built the first time that language is asked
+for, so the 22 translations are not all held in memory up front. A column
+is localized by one array take from its codes into a pd.Categorical,
+whose categories are the localized labels, so the row strings themselves
+are never copied. Missing translations fall back to English, then to the
+key itself.
+
+    localizer = build_localizer(load_fragdb(), load_translations())
+    localizer.localize(df["gender"], "gender", "ru")          # Categorical
+    codes = localizer.encode("gender", df["gender"])          # once
+    {lang: localizer.localize_codes(codes, "gender", lang) for lang in LANGUAGES}
+    localizer.voting_labels("longevity", "de")
+"""
+
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from instrumentation import span
+from load_database import load_fragdb, load_translations
+from parse_columns import VOTING_CATEGORIES
+
+# Languages of translations.csv, English first
+LANGUAGES = ("en", "de", "es", "fr", "cs", "it", "ru", "pl", "pt", "el", "zh", "ja",
+             "nl", "sr", "ro", "ar", "uk", "mn", "ko", "tr", "sv", "he", "hu")
+
+# Vocabularies of the reference tables:
+# name -> (table, key column, English label column, prefix of the <prefix>_xx columns)
+TABLE_VOCABULARIES = {
+    "accords": ("accords", "id", "name", "name"),
+    "notes": ("notes", "id", "name", "note_name"),
+    "note_groups": ("notes", "group", "group", "note_group"),
+    "countries": ("brands", "country", "country", "country"),
+    "activities": ("brands", "main_activity", "main_activity", "main_activity"),
+    "statuses": ("perfumers", "status", "status", "status"),
+}
+
+# translations.csv section holding the labels of each voting field
+VOTING_SECTIONS = {field: field for field in VOTING_CATEGORIES}
+VOTING_SECTIONS["time_of_day"] = "season"
+
+
+class Vocabulary:
+    """Integer codes for one vocabulary and its labels in every language."""
+
+    def __init__(self, name: str, keys: np.ndarray, source: pd.DataFrame, rows: np.ndarray,
+                 columns: Dict[str, str]):
+        """
+        Args:
+            name: Vocabulary name
+            keys: (n_codes,) distinct keys; code i stands for keys[i]
+            source: Table holding the labels
+            rows: (n_codes,) row of each code in source
+            columns: Language -> label column in source ('en' included)
+        """
+        self.name = name
+        self.keys = keys
+        self.source = source
+        self.rows = rows
+        self.columns = columns
+        self._index = pd.Index(keys)
+        self._categories = {}
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def encode(self, values) -> np.ndarray:
+        """int32 codes of the values; -1 for missing or unknown ones."""
+        if isinstance(getattr(values, "dtype", None), pd.CategoricalDtype):
+            # Encode the categories only, then take through the existing codes
+            values = pd.Categorical(values)
+            lookup = np.append(self._index.get_indexer(values.categories), -1)
+            return lookup[values.codes].astype(np.int32)
+        return self._index.get_indexer(np.asarray(values, dtype=object)).astype(np.int32)
+
+    def labels(self, language: str) -> np.ndarray:
+        """Label of every code in a language (English, then the key, where missing)."""
+        if language not in LANGUAGES:
+            raise ValueError(f"Unknown language {language!r}; expected one of {', '.join(LANGUAGES)}")
+        labels = self._column(language)
+        if language != "en":
+            labels = np.where(pd.isna(labels) | (labels == ""), self._column("en"), labels)
+        return np.where(pd.isna(labels) | (labels == ""), self.keys.astype(str), labels).astype(object)
+
+    def _column(self, language: str) -> np.ndarray:
+        column = self.columns.get(language)
+        if column is None:
+            return np.full(len(self), None, dtype=object)
+        return self.source[column].to_numpy(dtype=object)[self.rows]
+
+    def categories(self, language: str) -> Tuple[pd.Index, np.ndarray]:
+        """Distinct labels of a language and the category of every code (-1 appended).
+
+        Built on first use and cached; two keys may share a label (in
+        Japanese 'dislike' and 'hate' are both 嫌い).
+        """
+        cached = self._categories.get(language)
+        if cached is None:
+            with span("localize.labels", rows=len(self)):
+                remap, categories = pd.factorize(self.labels(language))
+            cached = self._categories[language] = (pd.Index(categories), np.append(remap, -1).astype(np.int32))
+        return cached
+
+    def localize_codes(self, codes: np.ndarray, language: str) -> pd.Categorical:
+        """Localize encoded values with one take; -1 codes become missing."""
+        categories, remap = self.categories(language)
+        return pd.Categorical.from_codes(remap[codes], categories=categories)
+
+    def table(self, languages: Sequence[str] = LANGUAGES) -> pd.DataFrame:
+        """The (codes x languages) lookup table, one column per language."""
+        return pd.DataFrame({language: self.labels(language) for language in languages},
+                            index=pd.Index(self.keys, name=self.name))
+
+
+class Localizer:
+    """All FragDB vocabularies by name."""
+
+    def __init__(self, vocabularies: Dict[str, Vocabulary]):
+        self.vocabularies = vocabularies
+
+    def __getitem__(self, name: str) -> Vocabulary:
+        if name not in self.vocabularies:
+            raise KeyError(f"Unknown vocabulary {name!r}; expected one of {', '.join(self.vocabularies)}")
+        return self.vocabularies[name]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.vocabularies
+
+    def encode(self, vocabulary: str, values) -> np.ndarray:
+        """int32 codes of values in a vocabulary (-1 where unknown)."""
+        return self[vocabulary].encode(values)
+
+    def localize_codes(self, codes: np.ndarray, vocabulary: str, language: str) -> pd.Categorical:
+        """Localize values encoded with encode()."""
+        return self[vocabulary].localize_codes(codes, language)
+
+    def localize(self, values, vocabulary: str, language: str) -> pd.Categorical:
+        """Localize raw values (keys) of a vocabulary; unknown values become missing.
+
+        To localize the same values into several languages, encode() them
+        once and use localize_codes().
+        """
+        with span(f"localize.{vocabulary}", rows=len(values)):
+            return self.localize_codes(self.encode(vocabulary, values), vocabulary, language)
+
+    def label(self, vocabulary: str, key, language: str) -> Optional[str]:
+        """Localized label of one key, or None when the key is unknown."""
+        vocab = self[vocabulary]
+        code = int(vocab.encode([key])[0])
+        if code < 0:
+            return None
+        categories, remap = vocab.categories(language)
+        return categories[remap[code]]
+
+    def voting_labels(self, field: str, language: str, categories: Optional[Sequence[str]] = None) -> List[str]:
+        """Localized labels of a voting field's categories.
+
+        Args:
+            field: Voting field ('longevity', 'time_of_day', ...)
+            language: Language code
+            categories: Category IDs in column order, e.g. VotingMatrix.categories
+                (defaults to VOTING_CATEGORIES[field])
+        """
+        categories = VOTING_CATEGORIES[field] if categories is None else categories
+        localized = self.localize(list(categories), VOTING_SECTIONS.get(field, "translations"), language)
+        return [label if isinstance(label, str) else key for key, label in zip(categories, localized)]
+
+    def localize_frame(self, df: pd.DataFrame, columns: Dict[str, str], language: str) -> pd.DataFrame:
+        """Localized copies of several columns, named <column>_<language>.
+
+        Args:
+            df: Source DataFrame
+            columns: Column -> vocabulary, e.g. {"gender": "gender"}
+            language: Language code
+        """
+        return pd.DataFrame({f"{column}_{language}": self.localize(df[column], vocabulary, language)
+                             for column, vocabulary in columns.items()}, index=df.index)
+
+
+def _label_columns(table: pd.DataFrame, english: str, prefix: str) -> Dict[str, str]:
+    """Language -> label column of a reference table, for the languages it has."""
+    columns = {"en": english}
+    for language in LANGUAGES[1:]:
+        if f"{prefix}_{language}" in table.columns:
+            columns[language] = f"{prefix}_{language}"
+    return columns
+
+
+def build_localizer(db: Dict[str, pd.DataFrame], translations: Optional[pd.DataFrame] = None) -> Localizer:
+    """Encode every vocabulary of a loaded database.
+
+    Args:
+        db: Tables as returned by load_fragdb(); vocabularies whose table or
+            key column is missing are skipped
+        translations: translations.csv (see load_translations)
+
+    Returns:
+        Localizer
+    """
+    vocabularies = {}
+
+    if translations is not None:
+        columns = {language: language for language in LANGUAGES if language in translations.columns}
+        ids = translations["id"]
+        groups = [("translations", np.ones(len(translations), dtype=bool))]
+        groups += [(section, (translations["section"] == section).to_numpy())
+                   for section in pd.unique(translations["section"])]
+        for name, in_group in groups:
+            rows = np.flatnonzero(in_group & ~ids.duplicated().to_numpy())
+            vocabularies[name] = Vocabulary(name, ids.to_numpy(dtype=object)[rows], translations, rows, columns)
+
+    for name, (table_name, key, english, prefix) in TABLE_VOCABULARIES.items():
+        table = db.get(table_name)
+        if table is None or key not in table.columns or english not in table.columns:
+            continue
+        keys = table[key]
+        # First row of every distinct key
+        rows = np.flatnonzero((keys.notna() & ~keys.duplicated()).to_numpy())
+        vocabularies[name] = Vocabulary(name, keys.to_numpy(dtype=object)[rows], table, rows,
+                                        _label_columns(table, english, prefix))
+
+    return Localizer(vocabularies)
+
+
+def main():
+    from parse_columns import parse_accords_column
+
+    db = load_fragdb()
+    fragrances = db["fragrances"]
+    localizer = build_localizer(db, load_translations())
+
+    print("=== FragDB v4.6 Localization ===\n")
+    print("Vocabularies: " + ", ".join(f"{name} ({len(v)})" for name, v in localizer.vocabularies.items()))
+    print()
+
+    localized = localizer.localize_frame(fragrances, {"gender": "gender"}, "ru")
+    localized["gender_ja"] = localizer.localize(fragrances["gender"], "gender", "ja")
+    print(pd.concat([fragrances[["name", "gender"]], localized], axis=1).head(4).to_string(index=False))
+    print()
+
+    print("Longevity labels (de):", ", ".join(localizer.voting_labels("longevity", "de")))
+    print("Time of day labels (ko):", ", ".join(localizer.voting_labels("time_of_day", "ko")))
+    print()
+
+    accords = parse_accords_column(fragrances["accords"].head(1))
+    print(f"Accords of {fragrances['name'].iloc[0]} (IDs missing from the sample accords.csv stay empty):")
+    table = pd.DataFrame({"id": accords.fields["id"]})
+    for language in ("en", "fr", "zh", "ar"):
+        table[language] = localizer.localize(accords.fields["id"], "accords", language)
+    print(table.to_string(index=False))
+    print()
+
+    brands = db["brands"]
+    print("Brand countries (uk):", ", ".join(localizer.localize(brands["country"], "countries", "uk")[:3]))
+    print()
+
+    # README localization vs codes + take, on a larger frame
+    big = pd.concat([fragrances[["gender"]]] * 20_000, ignore_index=True)
+    trans = load_translations().set_index("id")
+
+    start = time.perf_counter()
+    readme = big["gender"].map(lambda x: trans.loc[x, "ru"] if x in trans.index else x)
+    readme_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    codes = localizer.encode("gender", big["gender"])
+    every = {language: localizer.localize_codes(codes, "gender", language) for language in LANGUAGES}
+    vectorized_s = time.perf_counter() - start
+    assert (every["ru"].astype(object) == readme.to_numpy()).all()
+
+    print(f"=== Gender of {len(big):,} rows ===")
+    print(f"  README .map(lambda: trans.loc), 1 language: {readme_s:7.3f} s, "
+          f"{readme.memory_usage(deep=True) / 1e6:5.1f} MB")
+    print(f"  encode + take, all {len(LANGUAGES)} languages:      {vectorized_s:7.3f} s, "
+          f"{every['ru'].memory_usage(deep=True) / 1e6:5.1f} MB per language")
+
+
+if __name__ == "__main__":
+    main()
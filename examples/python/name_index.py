@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""
+FragDB - Name Index Example (v4.6)
+
+Demonstrates how to answer type-ahead and fuzzy name queries without
+lowercasing and scanning every name per query. A NameIndex is built once:
+
+- fold(): accent, case and width folding ("Lancôme" -> "lancome"),
+  punctuation collapsed to single spaces; letters of scripts that build
+  on combining marks (kana, Thai, Indic) are kept whole
+- a sorted array of every word-start suffix of every folded name, so
+  "blu" finds "Light Blue" with two binary searches (prefix queries)
+- a trigram posting index (trigram -> sorted name positions) for
+  substring queries (intersect the rarest trigrams, then verify) and
+  typo-tolerant queries (rank names by shared trigrams)
+
+search() combines them: exact > prefix > word prefix > substring > fuzzy.
+"""
+
+import bisect
+import random
+import re
+import time
+import unicodedata
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+from load_database import load_fragdb
+
+# Combining marks that are accents rather than part of a letter: the Latin,
+# Greek and Cyrillic diacritic blocks, Hebrew points and Arabic short vowels
+DIACRITICS = re.compile("[\u0300-\u036f\u1ab0-\u1aff\u1dc0-\u1dff\u20d0-\u20ff\ufe20-\ufe2f"
+                        "\u0591-\u05bd\u05bf\u05c1\u05c2\u05c4\u05c5\u05c7\u064b-\u065f\u0670]")
+
+
+def fold(text: str) -> str:
+    """Accent-, case-, width- and punctuation-insensitive form of a name.
+
+    Only accents are dropped; marks that are part of a letter (kana voicing
+    marks, Indic and Thai vowel signs) are kept, and the result is
+    recomposed, so "ガ" stays "ガ" rather than becoming "カ".
+    """
+    if not isinstance(text, str):
+        return ""
+    stripped = DIACRITICS.sub("", unicodedata.normalize("NFKD", text.casefold()))
+    words = "".join(ch if ch.isalnum() or unicodedata.category(ch)[0] == "M" else " " for ch in stripped).split()
+    return unicodedata.normalize("NFC", " ".join(words))
+
+
+def trigrams(folded: str) -> List[str]:
+    """Distinct trigrams of a folded string, padded so short words count."""
+    padded = f"  {folded} "
+    return sorted({padded[i:i + 3] for i in range(len(padded) - 2)})
+
+
+class NameIndex:
+    """Prefix, substring and fuzzy search over a list of names."""
+
+    def __init__(self, names: Sequence[str]):
+        """
+        Args:
+            names: Names to index; results are positions into this sequence
+        """
+        self.names = list(names)
+        self.keys = [fold(name) for name in self.names]
+
+        # Word-start suffixes ("light blue", "blue"), sorted for prefix search
+        suffixes = []
+        for position, key in enumerate(self.keys):
+            start = 0
+            while True:
+                suffixes.append((key[start:], position))
+                start = key.find(" ", start) + 1
+                if start == 0:
+                    break
+        suffixes.sort()
+        self.suffix_keys = [s for s, _ in suffixes]
+        self.suffix_owner = np.array([p for _, p in suffixes], dtype=np.int32)
+
+        # Trigram postings in CSR form
+        postings: Dict[str, List[int]] = {}
+        self.gram_counts = np.zeros(len(self.keys), dtype=np.int32)
+        for position, key in enumerate(self.keys):
+            grams = trigrams(key)
+            self.gram_counts[position] = len(grams)
+            for gram in grams:
+                postings.setdefault(gram, []).append(position)
+
+        self.grams = {gram: i for i, gram in enumerate(postings)}
+        lengths = np.array([len(p) for p in postings.values()], dtype=np.int64)
+        self.offsets = np.concatenate(([0], np.cumsum(lengths)))
+        self.postings = np.fromiter((p for plist in postings.values() for p in plist), dtype=np.int32,
+                                    count=int(lengths.sum()))
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def _posting(self, gram: str) -> np.ndarray:
+        slot = self.grams.get(gram)
+        if slot is None:
+            return self.postings[:0]
+        return self.postings[self.offsets[slot]:self.offsets[slot + 1]]
+
+    def prefix(self, query: str, words: bool = False, limit: Optional[int] = None) -> np.ndarray:
+        """Names whose folded form (or, with words, any word) starts with query.
+
+        Returns:
+            Sorted unique positions
+        """
+        q = fold(query)
+        lo = bisect.bisect_left(self.suffix_keys, q)
+        # Every string starting with q sorts before q + U+10FFFF
+        hi = bisect.bisect_left(self.suffix_keys, q + "\U0010ffff", lo)
+        owners = self.suffix_owner[lo:hi]
+        if not words:
+            owners = owners[[self.keys[p].startswith(q) for p in owners]] if len(owners) else owners
+        result = np.unique(owners)
+        return result[:limit] if limit is not None else result
+
+    def exact(self, query: str) -> np.ndarray:
+        """Names whose folded form equals the folded query.
+
+        Returns:
+            Sorted positions
+        """
+        q = fold(query)
+        lo = bisect.bisect_left(self.suffix_keys, q)
+        hi = bisect.bisect_right(self.suffix_keys, q, lo)
+        owners = self.suffix_owner[lo:hi]
+        # A later word of a longer name ("blue" of "light blue") is the same suffix
+        return np.unique(owners[[self.keys[p] == q for p in owners]]) if len(owners) else owners
+
+    def contains(self, query: str) -> np.ndarray:
+        """Names whose folded form contains the folded query.
+
+        Returns:
+            Sorted positions
+        """
+        q = fold(query)
+        if len(q) < 3:
+            # Too short for an inner trigram; such queries match most names anyway
+            return np.array([p for p, key in enumerate(self.keys) if q in key], dtype=np.int64)
+
+        inner = sorted((q[i:i + 3] for i in range(len(q) - 2)), key=lambda g: len(self._posting(g)))
+        candidates = self._posting(inner[0])
+        for gram in inner[1:4]:
+            if len(candidates) == 0:
+                break
+            candidates = np.intersect1d(candidates, self._posting(gram), assume_unique=True)
+        return np.array([p for p in candidates if q in self.keys[p]], dtype=np.int64)
+
+    def fuzzy(self, query: str, n: int = 10, min_similarity: float = 0.3) -> pd.DataFrame:
+        """Typo-tolerant matches ranked by trigram similarity.
+
+        Similarity is |shared trigrams| / |union of trigrams| (Jaccard).
+
+        Returns:
+            DataFrame with 'position', 'name' and 'similarity', best first
+        """
+        grams = trigrams(fold(query))
+        lists = [self._posting(g) for g in grams]
+        hits = np.concatenate(lists) if lists else self.postings[:0]
+        if len(hits) == 0:
+            return pd.DataFrame({"position": [], "name": [], "similarity": []})
+
+        candidates, shared = np.unique(hits, return_counts=True)
+        similarity = shared / (len(grams) + self.gram_counts[candidates] - shared)
+        keep = similarity >= min_similarity
+        candidates, similarity = candidates[keep], similarity[keep]
+
+        k = min(n, len(candidates))
+        if k == 0:
+            return pd.DataFrame({"position": [], "name": [], "similarity": []})
+        top = np.argpartition(-similarity, k - 1)[:k]
+        top = top[np.lexsort((candidates[top], -similarity[top]))]
+        return pd.DataFrame({
+            "position": candidates[top],
+            "name": [self.names[p] for p in candidates[top]],
+            "similarity": similarity[top]
+        })
+
+    def search(self, query: str, n: int = 10) -> pd.DataFrame:
+        """Ranked search: exact, prefix, word prefix, substring, then fuzzy.
+
+        Returns:
+            DataFrame with 'position', 'name', 'match' and 'similarity'
+        """
+        q = fold(query)
+        results, seen = [], set()
+
+        def add(positions, match):
+            for p in positions:
+                p = int(p)
+                if p not in seen and len(results) < n:
+                    seen.add(p)
+                    results.append({"position": p, "name": self.names[p], "match": match, "similarity": 1.0})
+
+        prefix = self.prefix(q)
+        add([p for p in prefix if self.keys[p] == q], "exact")
+        add(sorted(prefix, key=lambda p: (len(self.keys[p]), p)), "prefix")
+        add(self.prefix(q, words=True), "word prefix")
+        add(self.contains(q), "substring")
+        if len(results) < n:
+            for row in self.fuzzy(q, n=n).itertuples():
+                if row.position not in seen and len(results) < n:
+                    seen.add(row.position)
+                    results.append({"position": row.position, "name": row.name, "match": "fuzzy",
+                                    "similarity": row.similarity})
+
+        return pd.DataFrame(results, columns=["position", "name", "match", "similarity"])
+
+
+def _synthetic_names(words: Sequence[str], count: int, seed: int = 0) -> List[str]:
+    """Random 1-3 word names drawn from a vocabulary."""
+    rng = random.Random(seed)
+    return [" ".join(rng.sample(words, rng.randint(1, 3))) for _ in range(count)]
+
+
+def main():
+    from search_fragrances import search_by_name
+
+    db = load_fragdb()
+    df = db["fragrances"]
+
+    print("=== FragDB v4.6 Name Index ===\n")
+
+    index = NameIndex(df["name"])
+    print(f"fold('Lancôme La Vie Est Belle') -> {fold('Lancôme La Vie Est Belle')!r}")
+    print()
+
+    for query in ["black", "bel", "poison", "hypnotc poisen", "coco"]:
+        print(f"search({query!r}):")
+        for row in index.search(query, n=3).itertuples():
+            print(f"  {row.name} ({row.match}, {row.similarity:.2f})")
+    print()
+
+    # Same rows as the scan for plain ASCII queries
+    for query in ["o", "black", "vie est", "an"]:
+        expected = list(search_by_name(df, query).index)
+        assert list(df.index[index.contains(query)]) == expected, query
+    print("contains() matches search_fragrances.search_by_name()")
+    print()
+
+    # Type-ahead over 120,000 names built from the reference tables' vocabulary
+    vocabulary = set()
+    for table, column in [("notes", "name"), ("accords", "name"), ("brands", "name"), ("perfumers", "name")]:
+        for name in db[table][column].dropna():
+            vocabulary.update(name.split())
+    vocabulary.update(word for name in df["name"] for word in name.split())
+    names = pd.Series(_synthetic_names(sorted(vocabulary), 120_000))
+
+    start = time.perf_counter()
+    big_index = NameIndex(names)
+    build_s = time.perf_counter() - start
+
+    queries = ["bla", "blue", "rose", "tobac", "mademoi", "vanille"]
+    big_df = pd.DataFrame({"name": names})
+
+    start = time.perf_counter()
+    for query in queries:
+        search_by_name(big_df, query)
+    scan_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+    start = time.perf_counter()
+    for query in queries:
+        big_index.contains(query)
+    contains_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+    start = time.perf_counter()
+    for query in queries:
+        big_index.prefix(query, words=True, limit=10)
+    prefix_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+    start = time.perf_counter()
+    for query in ["vanile tobaco", "mademoisele", "blak orchid"]:
+        big_index.fuzzy(query)
+    fuzzy_ms = (time.perf_counter() - start) * 1000 / 3
+
+    print(f"=== {len(names):,} names (vocabulary of {len(vocabulary)} words) ===")
+    print(f"  index build:                        {build_s:8.2f} s (once)")
+    print(f"  search_by_name scan:                {scan_ms:8.2f} ms per query")
+    print(f"  NameIndex.contains (trigrams):      {contains_ms:8.2f} ms per query")
+    print(f"  NameIndex.prefix (word, type-ahead):{prefix_ms:8.2f} ms per query")
+    print(f"  NameIndex.fuzzy:                    {fuzzy_ms:8.2f} ms per query")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,389 @@
+#!/usr/bin/env python3
+"""
+FragDB - Multilingual Name Lookup Example (v4.6)
+
+Demonstrates how to turn note and accord names typed in any of the 23
+languages ("Bergamotte", "木质味", "ámbar") into their IDs without scanning
+the ~25 name columns of notes.csv and accords.csv per query.
+
+A NameLookup is a hash index built once over every name field:
+
+- notes: name (English), note_name_de ... note_name_hu, the aliases in
+  other_names and the latin_name
+- accords: name (English), name_de ... name_hu
+
+Every name is reduced to its name_index.fold() key (case, width and
+accents folded; kana, Hangul, Thai and Indic letters kept whole), and the
+key maps to all (ID, kind, language, field) entries that share it.
+lookup() is a single dict probe, resolve() picks the canonical ID of an
+ambiguous key (by field role, then accords before notes, then language
+votes), and parse() is a query front end: it finds the longest
+known names in free text, word by word in spaced scripts and character by
+character in Chinese, Japanese and Thai, and returns their IDs ready for
+the posting index, recommend_by_accords() or batch_recommend.
+
+    lookup = build_name_lookup(db["notes"], db["accords"])
+    lookup.resolve("Bergamotte")                  # 'n75'
+    lookup.parse("Bergamotte und 木质味")          # n75 (note), a91 (accord)
+"""
+
+import json
+import re
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+from instrumentation import traced
+from load_database import load_fragdb
+from localization import LANGUAGES
+from name_index import fold
+from text_search import UNSPACED_CHARS
+
+KINDS = ("notes", "accords")
+
+# Roles of the name fields, most authoritative first; the rank of a field
+# is the position of its role, so it is comparable across tables
+FIELD_ROLES = ("name", "translation", "alias", "latin")
+
+# Name fields of each reference table: field -> (language, role)
+NAME_FIELDS = {
+    "notes": {"name": ("en", "name"),
+              **{f"note_name_{lang}": (lang, "translation") for lang in LANGUAGES[1:]},
+              "other_names": ("en", "alias"),
+              "latin_name": ("la", "latin")},
+    "accords": {"name": ("en", "name"),
+                **{f"name_{lang}": (lang, "translation") for lang in LANGUAGES[1:]}},
+}
+
+# When an accord and a note share a name of the same rank (e.g. "Amber"),
+# resolve() without kind= picks the accord: accords are the coarser, more
+# often queried vocabulary, and kind="notes" still reaches the note
+KIND_PRIORITY = ("accords", "notes")
+
+# Separators inside other_names
+ALIAS_SEPARATORS = re.compile(r"\s*[;,|]\s*")
+
+UNSPACED_CHAR = re.compile(f"[{UNSPACED_CHARS}]")
+
+
+class NameLookup:
+    """Folded note / accord name -> (ID, kind, language, field) entries."""
+
+    def __init__(self, keys: List[str], offsets: np.ndarray, ids: np.ndarray, kinds: np.ndarray,
+                 languages: np.ndarray, fields: np.ndarray, field_names: List[str],
+                 names: Dict[str, str]):
+        """
+        Args:
+            keys: Distinct folded names; entries of keys[i] are offsets[i]:offsets[i + 1]
+            offsets: (n_keys + 1,) int64
+            ids: (n_entries,) object reference IDs ('n75', 'a91')
+            kinds: (n_entries,) int8 index into KINDS
+            languages: (n_entries,) object language codes ('en', 'de', 'la', ...)
+            fields: (n_entries,) int16 index into field_names
+            field_names: Source columns ('notes.name', 'accords.name_de', ...)
+            names: ID -> English name
+        """
+        self.keys = keys
+        self.offsets = offsets
+        self.ids = ids
+        self.kinds = kinds
+        self.languages = languages
+        self.fields = fields
+        self.field_names = field_names
+        self.names = names
+
+        # Rank of every entry's field role, and the priority of its kind
+        field_ranks = np.array([FIELD_ROLES.index(_role(name)) for name in field_names] or [0], dtype=np.int8)
+        self.ranks = field_ranks[fields]
+        self.kind_ranks = np.array([KIND_PRIORITY.index(kind) for kind in KINDS], dtype=np.int8)[kinds]
+
+        self.slots = {key: i for i, key in enumerate(keys)}
+        self.max_length = max((len(key) for key in keys), default=0)
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def __contains__(self, name: str) -> bool:
+        return fold(name) in self.slots
+
+    def _entries(self, key: str, kind: Optional[str] = None) -> np.ndarray:
+        """Entry positions of a folded key, optionally of one kind only."""
+        slot = self.slots.get(key)
+        if slot is None:
+            return np.empty(0, dtype=np.int64)
+        entries = np.arange(self.offsets[slot], self.offsets[slot + 1])
+        if kind is not None:
+            entries = entries[self.kinds[entries] == KINDS.index(kind)]
+        return entries
+
+    def lookup(self, name: str, kind: Optional[str] = None) -> pd.DataFrame:
+        """Every entry whose name folds to the same key.
+
+        Args:
+            name: Name in any language
+            kind: 'notes' or 'accords' (both by default)
+
+        Returns:
+            DataFrame with 'id', 'kind', 'language', 'field' and 'name'
+            (English name of the ID), best match first: by field role, then
+            KIND_PRIORITY, then source column
+        """
+        entries = self._entries(fold(name), kind)
+        entries = entries[np.lexsort((entries, self.fields[entries], self.kind_ranks[entries], self.ranks[entries]))]
+        ids = self.ids[entries]
+        return pd.DataFrame({
+            "id": ids,
+            "kind": [KINDS[k] for k in self.kinds[entries]],
+            "language": self.languages[entries],
+            "field": [self.field_names[f] for f in self.fields[entries]],
+            "name": [self.names.get(i, "") for i in ids],
+        })
+
+    def _best(self, entries: np.ndarray) -> Optional[str]:
+        """Canonical ID among entries: best field role, then kind, then most languages agreeing, then first ID."""
+        if len(entries) == 0:
+            return None
+        ids, first, inverse = np.unique(self.ids[entries], return_index=True, return_inverse=True)
+        rank = np.full(len(ids), len(FIELD_ROLES), dtype=np.int64)
+        np.minimum.at(rank, inverse, self.ranks[entries])
+        votes = np.bincount(inverse, minlength=len(ids))
+        kind_rank = self.kind_ranks[entries][first]
+        # Entries are in key order, so the first entry of an ID is its earliest
+        return ids[np.lexsort((first, -votes, kind_rank, rank))[0]]
+
+    def resolve(self, name: str, kind: Optional[str] = None) -> Optional[str]:
+        """Canonical ID of a name in any language, or None when unknown.
+
+        When several IDs share the folded name, the one named so in the most
+        authoritative field role wins (English name, then translations, then
+        aliases, then latin names; the same for notes and accords). On a tie
+        between kinds the accord wins (KIND_PRIORITY), then the ID most
+        languages agree on.
+        """
+        return self._best(self._entries(fold(name), kind))
+
+    def resolve_many(self, names: Sequence[str], kind: Optional[str] = None) -> List[Optional[str]]:
+        """resolve() for several names."""
+        return [self.resolve(name, kind) for name in names]
+
+    def parse(self, text: str, kind: Optional[str] = None) -> pd.DataFrame:
+        """Find the known names in free text, longest match first.
+
+        Matches start and end at word boundaries in spaced scripts and at
+        any character in unspaced ones (Chinese, Japanese, Thai), so
+        "vanille und bergamotte" and "木质味和琥珀" both split into names.
+        Unknown words are skipped.
+
+        Returns:
+            DataFrame with 'text' (the folded span), 'id', 'kind' and
+            'name', in the order they appear
+        """
+        folded = fold(text)
+        n = len(folded)
+        unspaced = [bool(UNSPACED_CHAR.match(ch)) for ch in folded]
+        # A span may start / end here: a word edge, or anywhere next to an unspaced character
+        edge = [i == 0 or i == n or folded[i - 1] == " " or folded[i] == " " or unspaced[i - 1] or unspaced[i]
+                for i in range(n + 1)]
+
+        found = []
+        i = 0
+        while i < n:
+            if folded[i] == " " or not edge[i]:
+                i += 1
+                continue
+            for j in range(min(n, i + self.max_length), i, -1):
+                if not edge[j] or folded[j - 1] == " ":
+                    continue
+                entries = self._entries(folded[i:j], kind)
+                if len(entries):
+                    best = self._best(entries)
+                    found.append({"text": folded[i:j], "id": best,
+                                  "kind": KINDS[self.kinds[entries[self.ids[entries] == best][0]]],
+                                  "name": self.names.get(best, "")})
+                    i = j
+                    break
+            else:
+                i += 1
+        return pd.DataFrame(found, columns=["text", "id", "kind", "name"])
+
+    def ids_in(self, text: str, kind: str) -> List[str]:
+        """Distinct IDs of one kind named in free text, in order (for search / recommendations)."""
+        return list(dict.fromkeys(self.parse(text, kind)["id"]))
+
+    def save(self, directory: str) -> None:
+        """Write the entries as .npy arrays plus a JSON manifest with the keys."""
+        path = Path(directory)
+        path.mkdir(parents=True, exist_ok=True)
+        np.save(path / "offsets.npy", self.offsets)
+        np.save(path / "kinds.npy", self.kinds)
+        np.save(path / "fields.npy", self.fields)
+        with open(path / "names.json", "w", encoding="utf-8") as f:
+            json.dump({"keys": self.keys, "ids": self.ids.tolist(), "languages": self.languages.tolist(),
+                       "field_names": self.field_names, "names": self.names}, f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, directory: str) -> "NameLookup":
+        """Load a saved lookup."""
+        path = Path(directory)
+        with open(path / "names.json", encoding="utf-8") as f:
+            manifest = json.load(f)
+        return cls(
+            keys=manifest["keys"],
+            offsets=np.load(path / "offsets.npy"),
+            ids=np.array(manifest["ids"], dtype=object),
+            kinds=np.load(path / "kinds.npy"),
+            languages=np.array(manifest["languages"], dtype=object),
+            fields=np.load(path / "fields.npy"),
+            field_names=manifest["field_names"],
+            names=manifest["names"]
+        )
+
+
+def _role(field_name: str) -> str:
+    """Role of a 'kind.field' source column (see NAME_FIELDS)."""
+    kind, field = field_name.split(".", 1)
+    return NAME_FIELDS[kind][field][1]
+
+
+@traced("index.names")
+def build_name_lookup(notes: Optional[pd.DataFrame] = None, accords: Optional[pd.DataFrame] = None) -> NameLookup:
+    """Index every name, translation and alias of notes and accords.
+
+    Args:
+        notes: notes.csv DataFrame (fields missing from it are skipped)
+        accords: accords.csv DataFrame
+
+    Returns:
+        NameLookup
+    """
+    keys, ids, kinds, languages, fields = [], [], [], [], []
+    field_names, names = [], {}
+
+    for kind, table in (("notes", notes), ("accords", accords)):
+        if table is None:
+            continue
+        table_ids = table["id"].astype(str).to_numpy()
+        names.update(zip(table_ids, table["name"].fillna("").astype(str)))
+        for field, (language, role) in NAME_FIELDS[kind].items():
+            if field not in table.columns:
+                continue
+            field_names.append(f"{kind}.{field}")
+            for ref_id, value in zip(table_ids, table[field]):
+                if not isinstance(value, str):
+                    continue
+                for name in (ALIAS_SEPARATORS.split(value) if role == "alias" else [value]):
+                    key = fold(name)
+                    if key:
+                        keys.append(key)
+                        ids.append(ref_id)
+                        kinds.append(KINDS.index(kind))
+                        languages.append(language)
+                        fields.append(len(field_names) - 1)
+
+    # Group entries by key; drop repeats of the same (key, ID, language)
+    frame = pd.DataFrame({"key": keys, "id": ids, "kind": kinds, "language": languages, "field": fields})
+    frame = frame.drop_duplicates(["key", "id", "language"]).sort_values(["key", "field"], kind="stable")
+    distinct, starts = np.unique(frame["key"].to_numpy(dtype=object), return_index=True)
+
+    return NameLookup(
+        keys=list(distinct),
+        offsets=np.append(starts, len(frame)).astype(np.int64),
+        ids=frame["id"].to_numpy(dtype=object),
+        kinds=frame["kind"].to_numpy().astype(np.int8),
+        languages=frame["language"].to_numpy(dtype=object),
+        fields=frame["field"].to_numpy().astype(np.int16),
+        field_names=field_names,
+        names=names
+    )
+
+
+def _scan(tables: Dict[str, pd.DataFrame], name: str) -> List[str]:
+    """Reference implementation: compare the query with every name column of every table."""
+    q = name.strip().lower()
+    found = []
+    for kind, table in tables.items():
+        for field in NAME_FIELDS[kind]:
+            if field in table.columns:
+                found += list(table["id"][table[field].str.strip().str.lower() == q])
+    return list(dict.fromkeys(found))
+
+
+def main():
+    from posting_index import build_posting_index
+    from recommender import recommend_by_accords
+
+    db = load_fragdb()
+    lookup = build_name_lookup(db["notes"], db["accords"])
+
+    print("=== FragDB v4.6 Multilingual Name Lookup ===\n")
+    print(f"{len(lookup):,} distinct keys for {len(lookup.ids):,} names "
+          f"({len(db['notes'])} notes, {len(db['accords'])} accords)")
+    print()
+
+    for query in ["Bergamotte", "ＢＥＲＧＡＭＯＴＴＥ", "ámbar", "AMBAR", "木质味", "アンバー", "Амбра", "Bergamot Orange"]:
+        match = lookup.lookup(query).head(2)
+        described = ", ".join(f"{r.id} {r.name} ({r.kind}, {r.language}, {r.field})" for r in match.itertuples())
+        print(f"  {query!r:24} -> {lookup.resolve(query)}: {described}")
+    # Field role ranks the same in both tables; on a tie the accord wins unless kind= asks for notes
+    assert lookup.resolve("amber") == "a4" and lookup.resolve("amber", kind="notes") == "n54"
+    print()
+
+    # Query front end: free text to IDs, then the existing search / recommendation entry points
+    text = "Bergamotte und Vanille, 木质味"
+    parsed = lookup.parse(text)
+    print(f"parse({text!r}):")
+    print(parsed.to_string(index=False))
+    fragrances = db["fragrances"]
+    index = build_posting_index(fragrances)
+    note_ids = lookup.ids_in(text, "notes")
+    with_notes = index.notes.with_all(note_ids)
+    print(f"  fragrances with notes {note_ids}: {list(fragrances.set_index('pid').loc[with_notes, 'name'])}")
+    accord_ids = lookup.ids_in(text, "accords")
+    print(f"  recommend_by_accords({accord_ids}):")
+    for item in recommend_by_accords(fragrances, accord_ids, n=3, index=index):
+        print(f"    {item['name']} by {item['brand']} (score: {item['score']})")
+    print()
+
+    with tempfile.TemporaryDirectory() as directory:
+        lookup.save(directory)
+        assert NameLookup.load(directory).resolve("木质味") == lookup.resolve("木质味")
+
+    # Lookup vs scanning every name column, on reference tables of the full size
+    copies = 250
+    notes = pd.concat([db["notes"].assign(id=db["notes"]["id"] + f"_{i}") for i in range(copies)], ignore_index=True)
+    accords = pd.concat([db["accords"].assign(id=db["accords"]["id"] + f"_{i}") for i in range(10)],
+                        ignore_index=True)
+    queries = ["Bergamotte", "ámbar", "木质味", "Амбра", "vanilla", "unknown"]
+
+    start = time.perf_counter()
+    big = build_name_lookup(notes, accords)
+    build_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    scanned = [_scan({"notes": notes, "accords": accords}, q) for q in queries]
+    scan_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+    start = time.perf_counter()
+    for _ in range(100):
+        looked_up = [list(dict.fromkeys(big.lookup(q)["id"])) for q in queries]
+    lookup_ms = (time.perf_counter() - start) * 10 / len(queries)
+    assert [sorted(ids) for ids in looked_up] == [sorted(ids) for ids in scanned]
+
+    start = time.perf_counter()
+    for _ in range(100):
+        for q in queries:
+            big.resolve(q)
+    resolve_ms = (time.perf_counter() - start) * 10 / len(queries)
+
+    print(f"=== {len(notes):,} notes + {len(accords):,} accords ===")
+    print(f"  build:                       {build_s:8.2f} s (once)")
+    print(f"  scan of every name column:   {scan_ms:8.2f} ms per query")
+    print(f"  NameLookup.lookup:           {lookup_ms:8.3f} ms per query (same IDs)")
+    print(f"  NameLookup.resolve:          {resolve_ms:8.3f} ms per query")
+
+
+if __name__ == "__main__":
+    main()
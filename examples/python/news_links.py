@@ -0,0 +1,384 @@
+#!/usr/bin/env python3
+"""
+FragDB - News Links Example (v4.6)
+
+Demonstrates how to decode the JSON-encoded list columns of news.parquet
+(related_pids, related_brands, related_perfumers, article_images) for the
+whole table at once, and turn them into join tables indexed both ways:
+
+    article -> pids       "which fragrances does this article mention"
+    pid -> articles       "news mentioning this fragrance"
+
+instead of json.loads() per row and a scan of every article per question
+(SPEC 5.3).
+
+decode_json_lists() wraps every value as one line of newline-delimited
+JSON ('{"v": ["1228", "704"]}') and hands the buffer to pyarrow's JSON
+reader, which parses all rows in C++ into a list<string> array.
+
+Brands and perfumers are resolved the way SPEC 5.4 / 5.5 recommend:
+through related_pids and the brand / perfumers fields of those
+fragrances, which always match. The names in related_brands and
+related_perfumers are kept as captured; matched by name against
+brands.csv / perfumers.csv they miss renamed brands and perfumers the
+database does not list, so they are resolved as separate "mentions"
+relations and the misses are counted.
+
+Every relation is a pair of CSR tables over the article rows (nids sorted
+ascending), saved as .npy arrays that load memory-mapped.
+
+    links = build_news_links(news, fragrances, brands, perfumers)
+    links.articles(9828)                  # nids mentioning Aventus
+    links.articles("b92", "brands")       # nids about Mugler fragrances
+    links.targets(17644, "perfumers")     # ['p2', 'p23', ...]
+"""
+
+import json
+import os
+import time
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Union
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.feather as feather
+import pyarrow.json as pa_json
+import pyarrow.parquet as pq
+from instrumentation import span
+from load_database import load_fragdb
+from parse_columns import parse_brand_column, parse_perfumers_column
+from reference import id_numbers
+
+JSON_LIST_COLUMNS = ("related_pids", "related_brands", "related_perfumers", "article_images")
+
+# Relation name -> ID prefix of its targets ('' for pids)
+PREFIXES = {"pids": "", "brands": "b", "perfumers": "p", "brand_mentions": "b", "perfumer_mentions": "p"}
+
+LIST_OF_STRINGS = pa.list_(pa.string())
+
+
+class Links(NamedTuple):
+    """One relation in both directions.
+
+    Article row i links to targets[offsets[i]:offsets[i + 1]] (sorted); target
+    keys[j] is linked from article rows sources[key_offsets[j]:key_offsets[j + 1]].
+    Targets are the numeric part of the IDs (pid, 92 for 'b92', ...).
+    """
+    offsets: np.ndarray
+    targets: np.ndarray
+    keys: np.ndarray
+    key_offsets: np.ndarray
+    sources: np.ndarray
+
+
+def decode_json_lists(values: Union[pa.Array, pa.ChunkedArray, pd.Series]) -> pa.ListArray:
+    """Decode a column of JSON string arrays into a list<string> array.
+
+    Missing and empty values decode as empty lists. If any value is not a
+    JSON array of strings, the column is decoded row by row instead, with
+    such values as empty lists.
+    """
+    if isinstance(values, pd.Series):
+        values = pa.array(values.to_numpy(dtype=object), type=pa.string(), from_pandas=True)
+    if isinstance(values, pa.ChunkedArray):
+        values = values.combine_chunks() if values.num_chunks else pa.array([], type=pa.string())
+    if len(values) == 0:
+        return pa.array([], type=LIST_OF_STRINGS)
+    values = pc.fill_null(values, "[]")
+    values = pc.if_else(pc.equal(pc.utf8_trim_whitespace(values), ""), "[]", values)
+
+    # One NDJSON line per row; the data buffer of the joined strings is the whole document
+    lines = pc.binary_join_element_wise('{"v":', values, "}\n", "").cast(pa.large_string())
+    offsets = np.frombuffer(lines.buffers()[1], dtype=np.int64)[lines.offset:lines.offset + len(lines) + 1]
+    document = pa.py_buffer(lines.buffers()[2])[offsets[0]:offsets[-1]]
+    longest = int(np.diff(offsets).max())
+    try:
+        table = pa_json.read_json(
+            pa.BufferReader(document),
+            read_options=pa_json.ReadOptions(use_threads=True, block_size=max(1 << 20, longest + 1)),
+            parse_options=pa_json.ParseOptions(explicit_schema=pa.schema([("v", LIST_OF_STRINGS)]),
+                                               newlines_in_values=False))
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        return pa.array([_json_list(value) for value in values.to_pylist()], type=LIST_OF_STRINGS)
+    decoded = table.column("v").combine_chunks()
+    if len(decoded) != len(values):
+        # A value spanning several lines (pretty-printed JSON) shifts the rows
+        return pa.array([_json_list(value) for value in values.to_pylist()], type=LIST_OF_STRINGS)
+    return pc.fill_null(decoded, pa.scalar([], type=LIST_OF_STRINGS))
+
+
+def _json_list(value: str) -> List[str]:
+    """One value decoded with json.loads; anything but a list of strings -> []."""
+    try:
+        items = json.loads(value)
+    except (TypeError, ValueError):
+        return []
+    return [item for item in items if isinstance(item, str)] if isinstance(items, list) else []
+
+
+def _name_key(names: pa.Array) -> pa.Array:
+    """Names as compared for mentions: '+' (URL-encoded space) as space, case-insensitive."""
+    return pc.utf8_lower(pc.utf8_trim_whitespace(pc.replace_substring(names, "+", " ")))
+
+
+def _links(rows: np.ndarray, targets: np.ndarray, n_rows: int) -> Links:
+    """Both CSR directions of (article row, target) edges; duplicates and targets < 0 dropped."""
+    keep = targets >= 0
+    rows, targets = rows[keep], targets[keep]
+    edges = np.unique((rows.astype(np.int64) << 32) | targets.astype(np.int64))
+    rows, targets = (edges >> 32).astype(np.int32), (edges & 0xFFFFFFFF).astype(np.int32)
+
+    offsets = np.concatenate(([0], np.cumsum(np.bincount(rows, minlength=n_rows)))).astype(np.int64)
+    order = np.lexsort((rows, targets))
+    keys, counts = np.unique(targets[order], return_counts=True)
+    return Links(offsets=offsets, targets=targets, keys=keys.astype(np.int32),
+                 key_offsets=np.concatenate(([0], np.cumsum(counts))).astype(np.int64), sources=rows[order])
+
+
+class NewsLinks:
+    """Article <-> pid / brand / perfumer join tables over news rows sorted by nid."""
+
+    def __init__(self, nids: np.ndarray, relations: Dict[str, Links], images: Optional[pa.ListArray] = None,
+                 unmatched: Optional[Dict[str, Dict[str, int]]] = None):
+        """
+        Args:
+            nids: (n_articles,) int32 nid of every article row, sorted ascending
+            relations: Relation name -> Links
+            images: article_images per row (list<string>), if decoded
+            unmatched: Mention relation -> {name: mentions} of names not in the reference table
+        """
+        self.nids = nids
+        self.relations = relations
+        self.images = images
+        self.unmatched = unmatched or {}
+
+    def __len__(self) -> int:
+        return len(self.nids)
+
+    def row(self, nid: int) -> int:
+        """Row of an article, or -1."""
+        i = int(np.searchsorted(self.nids, nid))
+        return i if i < len(self.nids) and self.nids[i] == nid else -1
+
+    def targets(self, nid: int, relation: str = "pids") -> List[Union[int, str]]:
+        """Pids (or 'b…' / 'p…' IDs) linked from one article."""
+        links, prefix = self.relations[relation], PREFIXES[relation]
+        i = self.row(nid)
+        if i < 0:
+            return []
+        values = links.targets[links.offsets[i]:links.offsets[i + 1]].tolist()
+        return values if not prefix else [f"{prefix}{value}" for value in values]
+
+    def articles(self, key: Union[int, str], relation: str = "pids") -> np.ndarray:
+        """Nids of the articles linked to a pid (or 'b…' / 'p…' ID), ascending."""
+        links, prefix = self.relations[relation], PREFIXES[relation]
+        if isinstance(key, str):
+            if not (key.startswith(prefix) and key[len(prefix):].isdigit()):
+                return self.nids[:0]
+            key = int(key[len(prefix):])
+        j = int(np.searchsorted(links.keys, key))
+        if j == len(links.keys) or links.keys[j] != key:
+            return self.nids[:0]
+        return self.nids[links.sources[links.key_offsets[j]:links.key_offsets[j + 1]]]
+
+    def counts(self, relation: str = "pids") -> pd.Series:
+        """Articles per target, most mentioned first."""
+        links, prefix = self.relations[relation], PREFIXES[relation]
+        index = links.keys.tolist() if not prefix else [f"{prefix}{key}" for key in links.keys.tolist()]
+        series = pd.Series(np.diff(links.key_offsets), index=pd.Index(index, name=relation), name="articles")
+        return series.sort_values(ascending=False, kind="stable")
+
+    def save(self, directory: str) -> None:
+        """Write the join tables as .npy arrays plus a JSON manifest (images as Feather)."""
+        path = Path(directory)
+        path.mkdir(parents=True, exist_ok=True)
+        np.save(path / "nids.npy", self.nids)
+        for name, links in self.relations.items():
+            for field in Links._fields:
+                np.save(path / f"{name}.{field}.npy", getattr(links, field))
+        if self.images is not None:
+            feather.write_feather(pa.table({"article_images": self.images}), path / "images.feather")
+        # links.json last and atomically: it is what load() reads first
+        tmp_path = path / f"links.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"articles": len(self), "relations": list(self.relations), "unmatched": self.unmatched,
+                       "images": self.images is not None}, f)
+        os.replace(tmp_path, path / "links.json")
+
+    @classmethod
+    def load(cls, directory: str, mmap: bool = True) -> "NewsLinks":
+        """Load saved join tables; with mmap the arrays stay in the page cache."""
+        path = Path(directory)
+        mode = "r" if mmap else None
+        with open(path / "links.json", encoding="utf-8") as f:
+            manifest = json.load(f)
+        relations = {
+            name: Links(**{field: np.load(path / f"{name}.{field}.npy", mmap_mode=mode) for field in Links._fields})
+            for name in manifest["relations"]
+        }
+        images = None
+        if manifest["images"]:
+            images = feather.read_table(path / "images.feather", memory_map=mmap).column("article_images")
+        return cls(np.load(path / "nids.npy", mmap_mode=mode), relations, images, manifest["unmatched"])
+
+
+def _mentions(names: pa.ListArray, reference: pd.DataFrame, prefix: str):
+    """Resolve captured names to reference IDs by name; returns (rows, numbers, unmatched counts)."""
+    rows = pc.list_parent_indices(names).to_numpy().astype(np.int64)
+    flat = pc.list_flatten(names)
+    table_keys = _name_key(pa.array(reference["name"].astype(str).to_numpy(dtype=object), type=pa.string()))
+    position = pc.index_in(_name_key(flat), value_set=table_keys)
+    found = pc.is_valid(position).to_numpy(zero_copy_only=False)
+    numbers = np.full(len(flat), -1, dtype=np.int64)
+    reference_numbers = id_numbers(pa.array(reference["id"].astype(str).to_numpy(dtype=object)), prefix)
+    numbers[found] = reference_numbers[position.filter(pa.array(found)).to_numpy()]
+    missed = pd.Series(flat.filter(pa.array(~found)).to_pylist(), dtype=object).value_counts()
+    return rows, numbers, {str(name): int(count) for name, count in missed.items()}
+
+
+def build_news_links(news: Union[pa.Table, pd.DataFrame], fragrances: pd.DataFrame,
+                     brands: Optional[pd.DataFrame] = None, perfumers: Optional[pd.DataFrame] = None,
+                     images: bool = True) -> NewsLinks:
+    """Decode the JSON list columns of news and build the join tables.
+
+    Args:
+        news: news.parquet table (needs nid and related_pids)
+        fragrances: Fragrances DataFrame (pid, brand, perfumers) for the
+            pid-based brand and perfumer resolution
+        brands: Optional brands table; adds the 'brand_mentions' relation
+        perfumers: Optional perfumers table; adds the 'perfumer_mentions' relation
+        images: Also decode article_images
+
+    Returns:
+        NewsLinks with 'pids', 'brands' and 'perfumers' relations (plus
+        mentions when reference tables are given)
+    """
+    if isinstance(news, pd.DataFrame):
+        news = pa.Table.from_pandas(news, preserve_index=False)
+    news = news.take(pc.sort_indices(news, sort_keys=[("nid", "ascending")]))
+    nids = news.column("nid").to_numpy().astype(np.int32)
+    n = len(nids)
+
+    relations = {}
+    with span("links.related_pids", rows=n):
+        related = decode_json_lists(news.column("related_pids"))
+        rows = pc.list_parent_indices(related).to_numpy().astype(np.int64)
+        pids = id_numbers(pc.list_flatten(related), "")
+        relations["pids"] = _links(rows, pids, n)
+
+    # Brands and perfumers through the pids (SPEC 5.4 / 5.5)
+    with span("links.resolve", rows=len(pids)):
+        catalog = fragrances["pid"].to_numpy(dtype=np.int64)
+        by_pid = np.argsort(catalog, kind="stable")
+        at = np.clip(np.searchsorted(catalog[by_pid], pids), 0, max(len(catalog) - 1, 0))
+        known = (pids >= 0) & (catalog[by_pid][at] == pids) if len(catalog) else np.zeros(len(pids), dtype=bool)
+        fragrance_rows = by_pid[at[known]]
+        edge_rows = rows[known]
+
+        brand_ids = parse_brand_column(fragrances["brand"])["id"].to_numpy(dtype=object)
+        brand_numbers = id_numbers(pa.array(brand_ids, type=pa.string()), "b")
+        relations["brands"] = _links(edge_rows, brand_numbers[fragrance_rows], n)
+
+        noses = parse_perfumers_column(fragrances["perfumers"])
+        nose_numbers = id_numbers(pa.array(noses.fields["id"], type=pa.string()), "p")
+        lengths = np.diff(noses.offsets)[fragrance_rows]
+        positions = np.repeat(noses.offsets[fragrance_rows] - np.cumsum(lengths) + lengths, lengths)
+        positions += np.arange(int(lengths.sum()))
+        relations["perfumers"] = _links(np.repeat(edge_rows, lengths), nose_numbers[positions], n)
+
+    unmatched = {}
+    for relation, column, reference, prefix in (("brand_mentions", "related_brands", brands, "b"),
+                                                ("perfumer_mentions", "related_perfumers", perfumers, "p")):
+        if reference is None or column not in news.column_names:
+            continue
+        with span(f"links.{column}", rows=n):
+            mention_rows, numbers, unmatched[relation] = _mentions(decode_json_lists(news.column(column)),
+                                                                   reference, prefix)
+            relations[relation] = _links(mention_rows, numbers, n)
+
+    decoded_images = None
+    if images and "article_images" in news.column_names:
+        with span("links.article_images", rows=n):
+            decoded_images = decode_json_lists(news.column("article_images"))
+    return NewsLinks(nids, relations, decoded_images, unmatched)
+
+
+def main():
+    from synthetic_data import synthetic_dataset
+
+    print("=== FragDB v4.6 News Links ===\n")
+
+    data = load_fragdb("../../samples")
+    news = pq.read_table("../../samples/news_sample.parquet")
+    links = build_news_links(news, data["fragrances"], data["brands"], data["perfumers"])
+
+    nid = int(links.nids[0])
+    print(f"Article {nid}:")
+    print(f"  pids:      {links.targets(nid)}")
+    print(f"  brands:    {links.targets(nid, 'brands')} (via pids)")
+    print(f"  perfumers: {links.targets(nid, 'perfumers')} (via pids)")
+    print()
+
+    # SPEC 5.3: every article's JSON decoded to answer one question
+    start = time.perf_counter()
+    scan = [n for n, rp in zip(news.column("nid").to_pylist(), news.column("related_pids").to_pylist())
+            if rp and "704" in json.loads(rp)]
+    scan_ms = (time.perf_counter() - start) * 1000
+    start = time.perf_counter()
+    indexed = links.articles(704)
+    index_ms = (time.perf_counter() - start) * 1000
+    assert sorted(scan) == indexed.tolist()
+    print(f"News mentioning pid 704: {len(indexed)} articles "
+          f"(JSON scan {scan_ms:.2f} ms, index {index_ms:.3f} ms)")
+    for relation in ("brands", "perfumers"):
+        top = links.counts(relation).head(3)
+        print(f"  most covered {relation}: " + ", ".join(f"{key} ({count})" for key, count in top.items()))
+    for relation, missed in links.unmatched.items():
+        total = int(np.diff(links.relations[relation].offsets).sum()) + sum(missed.values())
+        print(f"  {relation}: {sum(missed.values())} of {total} names not in the reference table, "
+              f"e.g. {list(missed)[:3]}")
+    print()
+
+    # Synthetic news at full scale (24k articles, ~120k pid references)
+    with synthetic_dataset(scale=0.1, row_group_size=20_000) as data_dir:
+        news = pq.read_table(f"{data_dir}/news.parquet")
+        news = pa.concat_tables([news.set_column(0, "nid", pc.add(news.column("nid"), i * 1_000_000))
+                                 for i in range(10)])
+        fragrances = pd.read_csv(f"{data_dir}/fragrances.csv", sep="|", dtype=str)
+        fragrances["pid"] = fragrances["pid"].astype(np.int64)
+
+        frame = news.to_pandas()
+        print(f"=== Decoding {len(frame):,} articles (10% synthetic news x 10) ===")
+        start = time.perf_counter()
+        for column in JSON_LIST_COLUMNS:
+            frame[column].apply(json.loads)
+        apply_s = time.perf_counter() - start
+        start = time.perf_counter()
+        for column in JSON_LIST_COLUMNS:
+            decode_json_lists(news.column(column))
+        bulk_s = time.perf_counter() - start
+        assert decode_json_lists(news.column("related_brands")).to_pylist() == frame["related_brands"].apply(
+            json.loads).tolist()
+        print(f"  .apply(json.loads), 4 columns:   {apply_s * 1000:7.0f} ms")
+        print(f"  decode_json_lists, 4 columns:    {bulk_s * 1000:7.0f} ms")
+
+        start = time.perf_counter()
+        links = build_news_links(news, fragrances)
+        build_s = time.perf_counter() - start
+        links.save(f"{data_dir}/news_links")
+        links = NewsLinks.load(f"{data_dir}/news_links")
+        pid = int(links.counts().index[0])
+        start = time.perf_counter()
+        for _ in range(1000):
+            links.articles(pid)
+        lookup_us = (time.perf_counter() - start) * 1000
+        references = int(links.relations["pids"].offsets[-1])
+        print(f"  build_news_links:                {build_s * 1000:7.0f} ms ({references:,} pid references)")
+        print(f"  articles({pid}) from saved tables: {lookup_us:.1f} us per lookup, "
+              f"{len(links.articles(pid))} articles")
+
+
+if __name__ == "__main__":
+    main()
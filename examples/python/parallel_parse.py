@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+FragDB - Parallel Parsing Example (v4.6)
+
+Demonstrates how to run the regex-based parsers of parse_fields.py
+(parse_notes_pyramid, parse_pros_cons) over the whole catalog on several
+cores. The fragrances frame is cut into contiguous shards; each shard is
+parsed in a worker process of a ProcessPoolExecutor and returned as flat
+long-form columns:
+
+- notes:     (pid, layer, note_id, opacity, weight), one row per note
+- pros_cons: (pid, kind, text, likes, dislikes), one row per pro / con
+
+Shards are submitted and collected in order, so the result is identical to
+running the serial parsers row by row, whatever the worker count.
+
+Scaling: the work per row is pure Python, so throughput grows with the
+number of physical cores until pickling the shards and results dominates.
+Run this file to measure it on your machine; it prints rows/s for each
+worker count up to os.cpu_count(). On a single-core machine the pool only
+adds process start-up and pickling overhead, so use workers=1 there.
+
+Measured on the samples x 2000 (20,000 rows), on a 1-CPU container:
+
+    workers=1:  ~5,000 rows/s  (x1.00)
+    workers=2:  ~4,000 rows/s  (x0.80, two processes sharing one core)
+
+Multi-core numbers were not measured here. Expect at most one core's
+throughput per worker, minus the cost of pickling each shard's results
+back to the parent.
+"""
+
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+from load_database import load_fragdb
+from parse_fields import parse_notes_pyramid, parse_pros_cons
+
+# Long-form output columns of each field
+OUTPUT_COLUMNS = {
+    "notes_pyramid": ["pid", "layer", "note_id", "opacity", "weight"],
+    "pros_cons": ["pid", "kind", "text", "likes", "dislikes"],
+}
+
+
+def _parse_shard(pids: np.ndarray, values: Dict[str, list]) -> Dict[str, Dict[str, list]]:
+    """Parse one shard with the serial parsers (runs in a worker process)."""
+    result = {}
+
+    if "notes_pyramid" in values:
+        columns = {name: [] for name in OUTPUT_COLUMNS["notes_pyramid"]}
+        for pid, value in zip(pids, values["notes_pyramid"]):
+            for layer, notes in parse_notes_pyramid(value).items():
+                for note in notes:
+                    columns["pid"].append(pid)
+                    columns["layer"].append(layer)
+                    columns["note_id"].append(note["id"])
+                    columns["opacity"].append(note["opacity"])
+                    columns["weight"].append(note["weight"])
+        result["notes_pyramid"] = columns
+
+    if "pros_cons" in values:
+        columns = {name: [] for name in OUTPUT_COLUMNS["pros_cons"]}
+        for pid, value in zip(pids, values["pros_cons"]):
+            for kind, items in parse_pros_cons(value).items():
+                for item in items:
+                    columns["pid"].append(pid)
+                    columns["kind"].append(kind)
+                    columns["text"].append(item["text"])
+                    columns["likes"].append(item["likes"])
+                    columns["dislikes"].append(item["dislikes"])
+        result["pros_cons"] = columns
+
+    return result
+
+
+def _to_frame(field: str, shards: List[Dict[str, Dict[str, list]]]) -> pd.DataFrame:
+    """Concatenate shard results of one field in shard order."""
+    columns = {name: [v for shard in shards for v in shard[field][name]] for name in OUTPUT_COLUMNS[field]}
+    df = pd.DataFrame(columns)
+    return df.astype({"pid": np.int64, **{c: np.float64 for c in ("opacity", "weight") if c in df},
+                      **{c: np.int64 for c in ("likes", "dislikes") if c in df}})
+
+
+def bulk_parse(
+    fragrances: pd.DataFrame,
+    fields: Sequence[str] = ("notes_pyramid", "pros_cons"),
+    workers: Optional[int] = None,
+    shard_size: int = 5000
+) -> Dict[str, pd.DataFrame]:
+    """Parse notes_pyramid and/or pros_cons for every fragrance.
+
+    Args:
+        fragrances: Fragrances DataFrame (needs 'pid' and the fields)
+        fields: Fields to parse ('notes_pyramid', 'pros_cons')
+        workers: Worker processes; None uses os.cpu_count(), 1 parses in
+            this process without a pool
+        shard_size: Rows per task sent to a worker
+
+    Returns:
+        Dictionary mapping field to a long-form DataFrame (see OUTPUT_COLUMNS),
+        ordered by fragrance row and then by position within the field
+    """
+    unknown = set(fields) - set(OUTPUT_COLUMNS)
+    if unknown:
+        raise ValueError(f"No bulk parser for {sorted(unknown)}")
+
+    workers = workers or os.cpu_count() or 1
+    pids = fragrances["pid"].to_numpy(dtype=np.int64)
+
+    # Only the needed columns are pickled to the workers
+    shards = []
+    for start in range(0, len(fragrances), shard_size):
+        stop = start + shard_size
+        shards.append((pids[start:stop], {f: fragrances[f].iloc[start:stop].tolist() for f in fields}))
+
+    if workers == 1:
+        results = [_parse_shard(shard_pids, values) for shard_pids, values in shards]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            # map() yields results in submission order
+            results = list(executor.map(_parse_shard, *zip(*shards))) if shards else []
+
+    return {field: _to_frame(field, results) for field in fields}
+
+
+def main():
+    db = load_fragdb()
+    fragrances = db["fragrances"]
+
+    print("=== FragDB v4.6 Parallel Parsing ===\n")
+
+    parsed = bulk_parse(fragrances, workers=2, shard_size=3)
+    print("Notes (long form):")
+    print(parsed["notes_pyramid"].head().to_string(index=False))
+    print()
+    print("Pros / cons (long form):")
+    print(parsed["pros_cons"].head(3).to_string(index=False))
+    print()
+
+    # Identical to the serial parsers for any worker count and shard size
+    serial = bulk_parse(fragrances, workers=1)
+    for field in serial:
+        assert parsed[field].equals(serial[field]), field
+    print("Parallel results are identical to the serial parsers")
+    print()
+
+    big = pd.concat([fragrances] * 2000, ignore_index=True)
+    cpus = os.cpu_count() or 1
+    print(f"=== {len(big):,} rows, notes_pyramid + pros_cons, {cpus} CPU(s) available ===")
+    baseline = None
+    for workers in sorted({1, 2, cpus}):
+        start = time.perf_counter()
+        bulk_parse(big, workers=workers)
+        seconds = time.perf_counter() - start
+        baseline = baseline or seconds
+        print(f"  workers={workers}: {seconds:6.2f} s  {len(big) / seconds:9,.0f} rows/s  "
+              f"(x{baseline / seconds:.2f})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,524 @@
+#!/usr/bin/env python3
+"""
+FragDB - Columnar Field Parsers Example (v4.6)
+
+Demonstrates how to parse the packed fields of a whole column at once.
+Each function takes a pandas Series (one value per fragrance) and returns
+columnar output. The string splitting runs in Arrow compute kernels (the
+same ones behind pandas' pyarrow string dtype) instead of a Python loop per
+row, and the results are assembled as NumPy arrays:
+
+- scalar-per-row fields (rating, brand) -> typed DataFrame columns
+- voting fields -> (rows x categories) vote / percent matrices
+- list fields (accords, notes_pyramid, perfumers, reminds_of, ID lists)
+  -> flat arrays + row offsets
+
+Results are identical to the one-string-at-a-time parsers in parse_fields.py;
+run this file to verify that on the sample data.
+"""
+
+import time
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+from instrumentation import span
+from load_database import load_fragdb
+import parse_fields
+
+# Translation IDs used by each voting field (see translations.csv)
+VOTING_CATEGORIES = {
+    "appreciation": ("like_love", "like_like", "like_ok", "like_dislike", "like_hate"),
+    "price_value": ("price_way_overpriced", "price_overpriced", "price_ok",
+                    "price_good_value", "price_great_value"),
+    "gender_votes": ("gvotes_female", "gvotes_more_female", "gvotes_unisex",
+                     "gvotes_more_male", "gvotes_male", "gvotes_shared"),
+    "longevity": ("longevity_very_weak", "longevity_weak", "longevity_moderate",
+                  "longevity_long_lasting", "longevity_eternal"),
+    "sillage": ("sillage_intimate", "sillage_moderate", "sillage_strong", "sillage_enormous"),
+    "season": ("season_winter", "season_spring", "season_summer", "season_fall"),
+    "time_of_day": ("season_day", "season_night"),
+}
+
+
+class RaggedColumns(NamedTuple):
+    """A list-per-row field flattened into arrays.
+
+    Row i owns the slice offsets[i]:offsets[i + 1] of every array in fields.
+    """
+    offsets: np.ndarray
+    fields: Dict[str, np.ndarray]
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def row(self, i: int) -> List[Dict[str, Any]]:
+        """Rebuild row i in the list-of-dicts form of the scalar parsers."""
+        start, stop = self.offsets[i], self.offsets[i + 1]
+        names = list(self.fields)
+        values = [self.fields[name][start:stop].tolist() for name in names]
+        return [dict(zip(names, item)) for item in zip(*values)]
+
+
+class VotingMatrix(NamedTuple):
+    """A voting field as dense (rows x categories) matrices.
+
+    present[i, j] is False where row i has no entry for categories[j].
+    """
+    categories: List[str]
+    votes: np.ndarray
+    percent: np.ndarray
+    present: np.ndarray
+
+    def row(self, i: int) -> Dict[str, Dict[str, Any]]:
+        """Rebuild row i in the dict form of parse_voting_field()."""
+        return {
+            category: {"votes": int(self.votes[i, j]), "percent": float(self.percent[i, j])}
+            for j, category in enumerate(self.categories)
+            if self.present[i, j]
+        }
+
+
+def _to_arrow(series: pd.Series) -> pa.Array:
+    """Convert a string column to an Arrow array, with missing values as ''."""
+    arr = pa.array(series.to_numpy(dtype=object), type=pa.string(), from_pandas=True)
+    return pc.fill_null(arr, "")
+
+
+def _explode(series: pd.Series, sep: str = ";") -> Tuple[np.ndarray, pa.Array]:
+    """Split every value on sep and flatten the pieces.
+
+    Missing values become a single empty item, which no parser accepts.
+
+    Returns:
+        (row position of each item, flat Arrow array of items)
+    """
+    lists = pc.split_pattern(_to_arrow(series), sep)
+    rows = pc.list_parent_indices(lists).to_numpy().astype(np.int64)
+    return rows, pc.list_flatten(lists)
+
+
+def _split(items: pa.Array, sep: str = ":") -> Tuple[pa.Array, np.ndarray]:
+    """Split each item on sep, returning the lists and their lengths."""
+    parts = pc.split_pattern(items, sep)
+    return parts, pc.list_value_length(parts).to_numpy()
+
+
+def _offsets(rows: np.ndarray, n_rows: int) -> np.ndarray:
+    """Turn sorted row positions into CSR-style offsets."""
+    counts = np.bincount(rows, minlength=n_rows)
+    return np.concatenate(([0], np.cumsum(counts))).astype(np.int64)
+
+
+def _strings(arr: pa.Array) -> np.ndarray:
+    """Arrow strings to a NumPy object array of Python str."""
+    return arr.to_numpy(zero_copy_only=False).astype(object)
+
+
+def _digits_to_int(arr: pa.Array) -> np.ndarray:
+    """Vectorized `int(x) if x.isdigit() else 0`."""
+    mask = pc.fill_null(pc.utf8_is_digit(arr), False)
+    try:
+        return pc.cast(pc.if_else(mask, arr, "0"), pa.int64()).to_numpy()
+    except pa.ArrowInvalid:
+        # Non-ASCII digits (e.g. Arabic-Indic) that Arrow cannot cast
+        return np.array([int(x) if x.isdigit() else 0 for x in arr.to_pylist()], dtype=np.int64)
+
+
+def _to_float(arr: pa.Array) -> np.ndarray:
+    """Vectorized float conversion; unparsable values become NaN."""
+    try:
+        return pc.cast(arr, pa.float64()).to_numpy(zero_copy_only=False)
+    except pa.ArrowInvalid:
+        return pd.to_numeric(arr.to_pandas(), errors="coerce").to_numpy(dtype=np.float64)
+
+
+def parse_rating_column(ratings: pd.Series) -> pd.DataFrame:
+    """Parse a rating column into float averages and integer vote counts.
+
+    Format: average;vote_count
+
+    Returns:
+        DataFrame with 'average' (float64) and 'votes' (int64), same index
+    """
+    parts, n_parts = _split(_to_arrow(ratings), ";")
+    average = _to_float(pc.list_element(parts, 0))
+
+    has_votes = n_parts >= 2
+    votes = np.zeros(len(ratings), dtype=np.float64)
+    votes[has_votes] = _to_float(pc.list_element(parts.filter(pa.array(has_votes)), 1))
+
+    return pd.DataFrame({
+        "average": np.nan_to_num(average, nan=0.0),
+        "votes": np.nan_to_num(votes, nan=0.0).astype(np.int64)
+    }, index=ratings.index)
+
+
+def parse_brand_column(brands: pd.Series) -> pd.DataFrame:
+    """Parse a brand column into name and ID columns.
+
+    Format: brand_name;brand_id
+
+    Returns:
+        DataFrame with 'name' and 'id' string columns, same index
+    """
+    parts, n_parts = _split(_to_arrow(brands), ";")
+    has_id = n_parts >= 2
+    ids = np.full(len(brands), "", dtype=object)
+    ids[has_id] = _strings(pc.list_element(parts.filter(pa.array(has_id)), 1))
+
+    return pd.DataFrame({
+        "name": _strings(pc.list_element(parts, 0)),
+        "id": ids
+    }, index=brands.index)
+
+
+def parse_accords_column(accords: pd.Series) -> RaggedColumns:
+    """Parse an accords column into flat accord IDs and percentages.
+
+    Format: accord_id:percentage;accord_id:percentage;...
+
+    Returns:
+        RaggedColumns with 'id' (object) and 'percentage' (int64) arrays
+    """
+    rows, items = _explode(accords)
+    parts, n_parts = _split(items)
+    keep = n_parts >= 2
+    parts = parts.filter(pa.array(keep))
+
+    return RaggedColumns(
+        offsets=_offsets(rows[keep], len(accords)),
+        fields={
+            "id": _strings(pc.list_element(parts, 0)),
+            "percentage": _digits_to_int(pc.list_element(parts, 1))
+        }
+    )
+
+
+def parse_notes_pyramid_column(pyramids: pd.Series) -> RaggedColumns:
+    """Parse a notes_pyramid column into flat layer / note ID / opacity / weight arrays.
+
+    v5 Format: layer(note_id,opacity,weight;...)layer(...)
+    (v3.0 format layer(name,note_id,img,opacity,weight;...) is also accepted)
+
+    Note names are not stored in the field; join the 'id' array with notes.csv.
+
+    Returns:
+        RaggedColumns with 'layer' and 'id' (object), 'opacity' and
+        'weight' (float64) arrays, in the order the notes appear
+    """
+    # "top(a;b)middle(c)" -> groups "top(a;b", "middle(c", "" (after the last ')')
+    group_rows, groups = _explode(pyramids, ")")
+    matched = pc.extract_regex(groups, r"(?P<layer>top|middle|mid|base|notes)\((?P<content>[^)]*)$")
+    closed = np.ones(len(groups), dtype=bool)
+    closed[_offsets(group_rows, len(pyramids))[1:] - 1] = False
+    keep = closed & matched.is_valid().to_numpy(zero_copy_only=False)
+
+    group_rows = group_rows[keep]
+    matched = matched.filter(pa.array(keep))
+    layer = pc.struct_field(matched, [0])
+    content = pc.struct_field(matched, [1])
+
+    # A layer repeated within a row: the last group wins but keeps the first
+    # group's place, as when a dict key is assigned twice
+    layer_codes = pc.dictionary_encode(layer).indices.to_numpy(zero_copy_only=False)
+    groups_df = pd.DataFrame({"row": group_rows, "layer": layer_codes, "pos": np.arange(len(group_rows))})
+    first_pos = groups_df.groupby(["row", "layer"])["pos"].transform("min").to_numpy()
+    last = np.flatnonzero(~groups_df.duplicated(["row", "layer"], keep="last").to_numpy())
+    last = last[np.argsort(first_pos[last], kind="stable")]
+    group_rows = group_rows[last]
+    layer = layer.take(pa.array(last))
+    content = content.take(pa.array(last))
+
+    lists = pc.split_pattern(content, ";")
+    item_group = pc.list_parent_indices(lists).to_numpy().astype(np.int64)
+    parts, n_parts = _split(pc.list_flatten(lists), ",")
+    legacy = n_parts >= 5
+    compact = (n_parts >= 3) & ~legacy
+    keep = legacy | compact
+
+    def field(position_compact: int, position_legacy: int) -> pa.Array:
+        """Pick a part by position, depending on the item's format."""
+        safe = parts.filter(pa.array(keep))
+        legacy_kept = legacy[keep]
+        index = np.where(legacy_kept, position_legacy, position_compact)
+        flat = pc.list_flatten(safe)
+        starts = _offsets(np.repeat(np.arange(len(safe)), n_parts[keep]), len(safe))[:-1]
+        return flat.take(pa.array(starts + index))
+
+    def to_float(values: pa.Array) -> np.ndarray:
+        """`float(x) if x else 1.0`."""
+        values = pc.if_else(pc.equal(values, ""), pa.scalar("1.0"), values)
+        return _to_float(values)
+
+    item_group = item_group[keep]
+    return RaggedColumns(
+        offsets=_offsets(group_rows[item_group], len(pyramids)),
+        fields={
+            "layer": _strings(layer.take(pa.array(item_group))),
+            "id": _strings(field(0, 1)),
+            "opacity": to_float(field(1, 3)),
+            "weight": to_float(field(2, 4))
+        }
+    )
+
+
+def parse_perfumers_column(perfumers: pd.Series) -> RaggedColumns:
+    """Parse a perfumers column into flat perfumer names and IDs.
+
+    Format: name1;id1;name2;id2;...
+
+    Returns:
+        RaggedColumns with 'name' and 'id' (object) arrays
+    """
+    rows, items = _explode(perfumers)
+    item_offsets = _offsets(rows, len(perfumers))
+    position = np.arange(len(rows)) - item_offsets[rows]
+    count = np.diff(item_offsets)[rows]
+
+    # A name is kept only when its ID follows it
+    name_idx = np.flatnonzero((position % 2 == 0) & (position + 1 < count))
+
+    return RaggedColumns(
+        offsets=_offsets(rows[name_idx], len(perfumers)),
+        fields={
+            "name": _strings(items.take(pa.array(name_idx))),
+            "id": _strings(items.take(pa.array(name_idx + 1)))
+        }
+    )
+
+
+def parse_reminds_of_column(reminds: pd.Series) -> RaggedColumns:
+    """Parse a reminds_of column into flat pid / likes / dislikes arrays.
+
+    Format: pid:likes:dislikes;pid:likes:dislikes;...
+    (older releases: plain pid;pid;...)
+
+    Returns:
+        RaggedColumns with 'pid', 'likes' and 'dislikes' (int64) arrays
+    """
+    rows, items = _explode(reminds)
+    parts, n_parts = _split(items)
+    pid = _digits_to_int(pc.list_element(parts, 0))
+    is_digit = pc.fill_null(pc.utf8_is_digit(pc.list_element(parts, 0)), False).to_numpy(zero_copy_only=False)
+
+    full = n_parts >= 3
+    keep = full | ((n_parts == 1) & is_digit)
+    likes = np.zeros(len(items), dtype=np.int64)
+    dislikes = np.zeros(len(items), dtype=np.int64)
+    full_parts = parts.filter(pa.array(full))
+    likes[full] = _digits_to_int(pc.list_element(full_parts, 1))
+    dislikes[full] = _digits_to_int(pc.list_element(full_parts, 2))
+
+    return RaggedColumns(
+        offsets=_offsets(rows[keep], len(reminds)),
+        fields={
+            "pid": pid[keep],
+            "likes": likes[keep],
+            "dislikes": dislikes[keep]
+        }
+    )
+
+
+def parse_id_list_column(ids: pd.Series) -> RaggedColumns:
+    """Parse a semicolon-separated ID list column into one flat array.
+
+    Format: id;id;id;...
+    Used for: by_designer, in_collection, also_like, news_ids
+
+    Returns:
+        RaggedColumns with an 'id' (int64) array
+    """
+    rows, items = _explode(ids)
+    keep = pc.fill_null(pc.utf8_is_digit(items), False).to_numpy(zero_copy_only=False)
+    return RaggedColumns(
+        offsets=_offsets(rows[keep], len(ids)),
+        fields={"id": _digits_to_int(items.filter(pa.array(keep)))}
+    )
+
+
+def parse_voting_column(
+    field: pd.Series,
+    categories: Optional[Sequence[str]] = None
+) -> VotingMatrix:
+    """Parse a voting column into (rows x categories) matrices.
+
+    Format: category:votes:percent;category:votes:percent;...
+    (older releases: category:value)
+
+    Args:
+        field: Voting column (e.g. df['longevity'])
+        categories: Column order for the matrices, e.g.
+            VOTING_CATEGORIES['longevity']. Entries with other categories
+            are dropped. Defaults to every category seen, in order of first
+            appearance.
+
+    Returns:
+        VotingMatrix with int64 votes, float64 percent and a bool present mask
+    """
+    rows, items = _explode(field)
+    parts, n_parts = _split(items)
+    keep = n_parts >= 2
+    rows = rows[keep]
+    parts = parts.filter(pa.array(keep))
+    full = n_parts[keep] >= 3
+    category = pc.list_element(parts, 0)
+    second = pc.list_element(parts, 1)
+
+    # v3.0 format: votes only when all digits, percent 0.0 when empty
+    votes_full = _digits_to_int(second)
+    pct_full = np.zeros(len(rows), dtype=np.float64)
+    third = pc.list_element(parts.filter(pa.array(full)), 2)
+    third = pc.if_else(pc.equal(third, ""), pa.scalar(None, pa.string()), third)
+    pct_full[full] = np.nan_to_num(_to_float(third), nan=0.0)
+
+    # Older format: a single float used for both votes and percent
+    value = _to_float(second)
+    value = np.where(np.isfinite(value), value, 0.0)
+
+    votes = np.where(full, votes_full, np.trunc(value).astype(np.int64))
+    percent = np.where(full, pct_full, value)
+
+    if categories is None:
+        categories = pc.unique(category).to_pylist()
+    else:
+        categories = list(categories)
+    col = pc.fill_null(pc.index_in(category, value_set=pa.array(categories, pa.string())), -1)
+    col = col.to_numpy().astype(np.int64)
+
+    # A category repeated within a row: the last entry wins, as in the dict parser
+    key = rows * (len(categories) + 1) + col
+    last = ~pd.Series(key).duplicated(keep="last").to_numpy()
+    sel = (col >= 0) & last
+
+    shape = (len(field), len(categories))
+    votes_m = np.zeros(shape, dtype=np.int64)
+    percent_m = np.zeros(shape, dtype=np.float64)
+    present = np.zeros(shape, dtype=bool)
+    votes_m[rows[sel], col[sel]] = votes[sel]
+    percent_m[rows[sel], col[sel]] = percent[sel]
+    present[rows[sel], col[sel]] = True
+
+    return VotingMatrix(categories, votes_m, percent_m, present)
+
+
+# Columnar parser for every packed field (voting fields use VOTING_CATEGORIES)
+COLUMN_PARSERS = {
+    "rating": parse_rating_column,
+    "brand": parse_brand_column,
+    "accords": parse_accords_column,
+    "notes_pyramid": parse_notes_pyramid_column,
+    "perfumers": parse_perfumers_column,
+    "reminds_of": parse_reminds_of_column,
+    "by_designer": parse_id_list_column,
+    "in_collection": parse_id_list_column,
+    "also_like": parse_id_list_column,
+    "news_ids": parse_id_list_column,
+}
+
+
+def parse_fragrance_columns(df: pd.DataFrame, fields: Optional[Sequence[str]] = None) -> Dict[str, Any]:
+    """Run the columnar parser of every packed field in a DataFrame.
+
+    Args:
+        df: Fragrances DataFrame (or a chunk / projection of it)
+        fields: Fields to parse; defaults to every packed field present
+
+    Returns:
+        Dictionary mapping field name to the parser output
+    """
+    if fields is None:
+        known = list(COLUMN_PARSERS) + list(VOTING_CATEGORIES)
+        fields = [field for field in known if field in df.columns]
+
+    parsed = {}
+    for field in fields:
+        if field not in VOTING_CATEGORIES and field not in COLUMN_PARSERS:
+            raise ValueError(f"No columnar parser for field '{field}'")
+        with span(f"parse.{field}", rows=len(df)):
+            if field in VOTING_CATEGORIES:
+                parsed[field] = parse_voting_column(df[field], VOTING_CATEGORIES[field])
+            else:
+                parsed[field] = COLUMN_PARSERS[field](df[field])
+    return parsed
+
+
+def check_against_scalar(df: pd.DataFrame) -> None:
+    """Assert that every columnar parser matches its scalar counterpart."""
+    rating = parse_rating_column(df["rating"])
+    brand = parse_brand_column(df["brand"])
+    accords = parse_accords_column(df["accords"])
+    perfumers = parse_perfumers_column(df["perfumers"])
+    reminds = parse_reminds_of_column(df["reminds_of"])
+    id_lists = {field: parse_id_list_column(df[field]) for field in ("by_designer", "in_collection", "also_like")}
+    pyramids = parse_notes_pyramid_column(df["notes_pyramid"])
+    voting = {field: parse_voting_column(df[field]) for field in VOTING_CATEGORIES}
+
+    for i, (_, row) in enumerate(df.iterrows()):
+        expected = parse_fields.parse_rating(row["rating"])
+        assert rating.iloc[i].to_dict() == expected, (i, "rating")
+        assert brand.iloc[i].to_dict() == parse_fields.parse_brand(row["brand"]), (i, "brand")
+        assert accords.row(i) == parse_fields.parse_accords(row["accords"]), (i, "accords")
+        assert perfumers.row(i) == parse_fields.parse_perfumers(row["perfumers"]), (i, "perfumers")
+        assert reminds.row(i) == parse_fields.parse_reminds_of(row["reminds_of"]), (i, "reminds_of")
+        for field, parsed in id_lists.items():
+            assert [item["id"] for item in parsed.row(i)] == parse_fields.parse_id_list(row[field]), (i, field)
+        expected_notes = [
+            {"layer": layer, "id": note["id"], "opacity": note["opacity"], "weight": note["weight"]}
+            for layer, notes in parse_fields.parse_notes_pyramid(row["notes_pyramid"]).items()
+            for note in notes
+        ]
+        assert pyramids.row(i) == expected_notes, (i, "notes_pyramid")
+        for field, matrix in voting.items():
+            assert matrix.row(i) == parse_fields.parse_voting_field(row[field]), (i, field)
+
+
+def main():
+    db = load_fragdb()
+    fragrances = db["fragrances"]
+
+    print("=== FragDB v4.6 Columnar Parsers ===\n")
+
+    check_against_scalar(fragrances)
+    print(f"All columnar parsers match parse_fields.py on {len(fragrances)} sample rows")
+    print()
+
+    print("=== Rating ===")
+    print(parse_rating_column(fragrances["rating"]).head())
+    print()
+
+    print("=== Longevity matrix (percent) ===")
+    longevity = parse_voting_column(fragrances["longevity"], VOTING_CATEGORIES["longevity"])
+    print(pd.DataFrame(longevity.percent, columns=longevity.categories, index=fragrances["name"]).head())
+    print()
+
+    print("=== Reminds Of (flat arrays) ===")
+    reminds = parse_reminds_of_column(fragrances["reminds_of"])
+    print(f"  {len(reminds.fields['pid'])} edges, offsets: {reminds.offsets.tolist()}")
+    print()
+
+    # Compare against .apply over a larger frame built from the samples
+    big = pd.concat([fragrances] * 2000, ignore_index=True)
+    print(f"=== Timing on {len(big):,} rows ===")
+    for field, scalar, columnar in [
+        ("rating", parse_fields.parse_rating, parse_rating_column),
+        ("accords", parse_fields.parse_accords, parse_accords_column),
+        ("notes_pyramid", parse_fields.parse_notes_pyramid, parse_notes_pyramid_column),
+        ("longevity", parse_fields.parse_voting_field, parse_voting_column),
+        ("reminds_of", parse_fields.parse_reminds_of, parse_reminds_of_column),
+        ("also_like", parse_fields.parse_id_list, parse_id_list_column),
+    ]:
+        start = time.perf_counter()
+        big[field].apply(scalar)
+        apply_ms = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        columnar(big[field])
+        columnar_ms = (time.perf_counter() - start) * 1000
+        print(f"  {field:<13} apply: {apply_ms:8.1f} ms   columnar: {columnar_ms:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
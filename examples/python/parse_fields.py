@@ -7,22 +7,30 @@ Updated for v3.0 field formats.
 """
 
 import re
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Union
 import pandas as pd
 from load_database import load_fragdb
+from reference import ReferenceResolver, as_resolver
 
 
-def parse_accords(accords_str: str, accords_df: Optional[pd.DataFrame] = None) -> List[Dict[str, Any]]:
+def parse_accords(
+    accords_str: str,
+    accords_df: Union[pd.DataFrame, ReferenceResolver, None] = None
+) -> List[Dict[str, Any]]:
     """Parse the accords field into a list of dictionaries.
 
     v3.0 Format: accord_id:percentage;accord_id:percentage;...
     Example: a24:100;a34:64;a38:60
 
-    Use accords_df to look up accord names and colors.
+    Use accords_df to look up accord names and colors. It may be the accords
+    DataFrame or a ReferenceResolver built from it; pass a resolver when
+    parsing many rows so the lookup table is built only once.
     """
     if not accords_str or pd.isna(accords_str):
         return []
 
+    resolver = as_resolver(accords_df)
+
     accords = []
     for accord in accords_str.split(";"):
         parts = accord.split(":")
@@ -33,10 +41,9 @@ def parse_accords(accords_str: str, accords_df: Optional[pd.DataFrame] = None) -
             accord_info = {"id": accord_id, "percentage": percentage}
 
             # Look up name and colors from accords.csv if provided
-            if accords_df is not None:
-                match = accords_df[accords_df["id"] == accord_id]
-                if not match.empty:
-                    row = match.iloc[0]
+            if resolver is not None:
+                row = resolver.record(accord_id, ("name", "bar_color", "font_color"))
+                if row is not None:
                     accord_info["name"] = row["name"]
                     accord_info["bar_color"] = row["bar_color"]
                     accord_info["font_color"] = row["font_color"]
@@ -46,54 +53,67 @@ def parse_accords(accords_str: str, accords_df: Optional[pd.DataFrame] = None) -
     return accords
 
 
-def parse_notes_pyramid(notes_str: str, notes_df: Optional[pd.DataFrame] = None) -> Dict[str, List[Dict[str, Any]]]:
+def parse_notes_pyramid(
+    notes_str: str,
+    notes_df: Union[pd.DataFrame, ReferenceResolver, None] = None
+) -> Dict[str, List[Dict[str, Any]]]:
     """Parse the notes_pyramid field into a structured dictionary.
 
-    v3.0 Format: layer(name,note_id,img,opacity,weight;...)
-    Layers: top, mid, base, or notes (flat)
+    v5 Format: layer(note_id,opacity,weight;...)
+    Example: top(n75,0.96,3.73;n132,0.92,3.42)middle(...)base(...)
+    Layers: top, middle, base, or notes (flat)
 
     Opacity: 0-1 float indicating note transparency
     Weight: visual size/importance of the note
+
+    The v3.0 format layer(name,note_id,img,opacity,weight;...) is still accepted.
+    Use notes_df (the notes DataFrame or a ReferenceResolver built from it)
+    to look up note names (the v5 format carries IDs only).
     """
     if not notes_str or pd.isna(notes_str):
         return {}
 
+    resolver = as_resolver(notes_df)
+
     result = {}
     # Match layer(contents) pattern
-    layers = re.findall(r'(top|mid|base|notes)\(([^)]*)\)', notes_str)
+    layers = re.findall(r'(top|middle|mid|base|notes)\(([^)]*)\)', notes_str)
 
     for layer_name, notes_content in layers:
         notes = []
         for note in notes_content.split(";"):
             parts = note.split(",")
             if len(parts) >= 5:
-                note_id = parts[1]
+                # v3.0 format: name,note_id,img,opacity,weight
                 note_info = {
                     "name": parts[0],
-                    "id": note_id,
+                    "id": parts[1],
                     "image": parts[2],
                     "opacity": float(parts[3]) if parts[3] else 1.0,
                     "weight": float(parts[4]) if parts[4] else 1.0
                 }
-
-                # Look up additional info from notes.csv if provided
-                if notes_df is not None and note_id:
-                    match = notes_df[notes_df["id"] == note_id]
-                    if not match.empty:
-                        row = match.iloc[0]
-                        note_info["latin_name"] = row.get("latin_name", "")
-                        note_info["group"] = row.get("group", "")
-
-                notes.append(note_info)
             elif len(parts) >= 3:
-                # Fallback for simpler format
-                notes.append({
-                    "name": parts[0],
-                    "id": parts[1] if len(parts) > 1 else "",
-                    "image": parts[2] if len(parts) > 2 else "",
-                    "opacity": 1.0,
-                    "weight": 1.0
-                })
+                # v5 compact format: note_id,opacity,weight
+                note_info = {
+                    "name": "",
+                    "id": parts[0],
+                    "image": "",
+                    "opacity": float(parts[1]) if parts[1] else 1.0,
+                    "weight": float(parts[2]) if parts[2] else 1.0
+                }
+            else:
+                continue
+
+            # Look up additional info from notes.csv if provided
+            note_id = note_info["id"]
+            if resolver is not None and note_id:
+                row = resolver.record(note_id, ("name", "latin_name", "group"))
+                if row is not None:
+                    note_info["name"] = note_info["name"] or row.get("name", "")
+                    note_info["latin_name"] = row.get("latin_name", "")
+                    note_info["group"] = row.get("group", "")
+
+            notes.append(note_info)
         result[layer_name] = notes
 
     return result
@@ -277,13 +297,13 @@ def main():
         print(f"  {name}: {accord['percentage']}% {color}")
     print()
 
-    # Parse notes pyramid (v3.0 format with opacity and weight)
-    print("=== Notes Pyramid (v3.0 format) ===")
+    # Parse notes pyramid (v5 format: note_id,opacity,weight)
+    print("=== Notes Pyramid (v5 format) ===")
     notes_pyramid = parse_notes_pyramid(row.get("notes_pyramid", ""), notes)
     for layer, note_list in notes_pyramid.items():
         print(f"  {layer.upper()}:")
         for n in note_list[:3]:
-            print(f"    - {n['name']} (opacity: {n['opacity']}, weight: {n['weight']})")
+            print(f"    - {n['name'] or n['id']} (opacity: {n['opacity']}, weight: {n['weight']})")
     print()
 
     # Parse perfumers
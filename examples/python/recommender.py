@@ -5,29 +5,37 @@ FragDB - Simple Recommender Example (v4.6)
 Demonstrates how to build a basic fragrance recommendation system.
 """
 
+import weakref
+
+import numpy as np
 import pandas as pd
-from typing import List, Dict
+from typing import List, Dict, Optional, Tuple
+from instrumentation import traced
 from load_database import load_fragdb
 from parse_fields import parse_accords, parse_voting_field, parse_brand
+from feature_store import FeatureStore, build_feature_store
+from ann_index import LSHIndex
+from name_index import NameIndex
+from posting_index import PostingIndex, build_posting_index
 
 
 def get_fragrance_profile(row: pd.Series) -> Dict[str, float]:
     """Extract a numeric profile from a fragrance for similarity comparison."""
     profile = {}
 
-    # Add accords
+    # Add accords (keyed by accord ID, names live in accords.csv)
     accords = parse_accords(row["accords"])
     for accord in accords:
-        profile[f"accord_{accord['name']}"] = accord["percentage"] / 100.0
+        profile[f"accord_{accord['id']}"] = accord["percentage"] / 100.0
 
     # Add characteristics
     longevity = parse_voting_field(row.get("longevity", ""))
-    for cat, pct in longevity.items():
-        profile[f"longevity_{cat}"] = pct / 100.0
+    for cat, data in longevity.items():
+        profile[f"longevity_{cat}"] = data["percent"] / 100.0
 
     sillage = parse_voting_field(row.get("sillage", ""))
-    for cat, pct in sillage.items():
-        profile[f"sillage_{cat}"] = pct / 100.0
+    for cat, data in sillage.items():
+        profile[f"sillage_{cat}"] = data["percent"] / 100.0
 
     return profile
 
@@ -56,25 +64,88 @@ def cosine_similarity(profile1: Dict[str, float], profile2: Dict[str, float]) ->
     return dot_product / (mag1 ** 0.5 * mag2 ** 0.5)
 
 
-def find_similar(df: pd.DataFrame, target_name: str, n: int = 5) -> List[Dict]:
-    """Find N most similar fragrances to the target."""
+def _check_rows(pids: np.ndarray, df: pd.DataFrame) -> None:
+    """Raise ValueError unless the rows of a prebuilt structure are the rows of df."""
+    if len(pids) != len(df) or not np.array_equal(pids, df["pid"].to_numpy(dtype=np.int64)):
+        raise ValueError(f"Prebuilt store or index ({len(pids)} rows) does not match the pids of df "
+                         f"({len(df)} rows); build it from the same DataFrame")
+
+
+# Posting indexes built on the fly, by id() of the DataFrame, while it is alive
+_POSTING_INDEXES: Dict[int, Tuple[weakref.ref, PostingIndex]] = {}
+
+
+def _posting_index(df: pd.DataFrame) -> PostingIndex:
+    """PostingIndex of df, built on first use and reused for later calls with the same df.
+
+    The index reflects df as it was at the first call; pass index= explicitly
+    after editing the accords, notes_pyramid or perfumers columns in place.
+    """
+    key = id(df)
+    cached = _POSTING_INDEXES.get(key)
+    if cached is not None and cached[0]() is df and len(cached[1].pids) == len(df):
+        return cached[1]
+    index = build_posting_index(df)
+    _POSTING_INDEXES[key] = (weakref.ref(df, lambda _: _POSTING_INDEXES.pop(key, None)), index)
+    return index
+
+
+@traced("recommend.similar")
+def find_similar(
+    df: pd.DataFrame,
+    target_name: str,
+    n: int = 5,
+    store: Optional[FeatureStore] = None,
+    index: Optional[LSHIndex] = None,
+    names: Optional[NameIndex] = None
+) -> List[Dict]:
+    """Find N most similar fragrances to the target.
+
+    Args:
+        df: Fragrances DataFrame
+        target_name: Name of the fragrance to compare against
+        n: Number of results
+        store: Prebuilt FeatureStore for df (see feature_store.py). Built on
+            the fly when omitted; build or load it once when serving queries.
+        index: Optional LSHIndex over the store (see ann_index.py). When set,
+            only its candidates are scored instead of the whole catalog.
+        names: Optional NameIndex built from df["name"] (see name_index.py).
+            When set, the target is found with an exact key lookup instead
+            of lowercasing every name; the match also ignores accents.
+
+    Raises:
+        ValueError: If store or index was built from other rows than df
+    """
+    if index is not None:
+        store = index.store
+    if store is not None:
+        _check_rows(store.pids, df)
+
     # Find target fragrance
-    target_mask = df["name"].str.lower() == target_name.lower()
+    if names is not None:
+        if len(names) != len(df):
+            raise ValueError(f"NameIndex ({len(names)} names) does not match the {len(df)} rows of df")
+        target_mask = np.zeros(len(df), dtype=bool)
+        target_mask[names.exact(target_name)] = True
+    else:
+        target_mask = (df["name"].str.lower() == target_name.lower()).to_numpy()
     if not target_mask.any():
         print(f"Fragrance '{target_name}' not found")
         return []
 
-    target_row = df[target_mask].iloc[0]
-    target_profile = get_fragrance_profile(target_row)
+    position = int(target_mask.argmax())
+    if index is not None:
+        positions, scores = index.query(position, n, exclude=target_mask)
+    else:
+        if store is None:
+            store = build_feature_store(df)
 
-    # Calculate similarity to all other fragrances
-    similarities = []
-    for idx, row in df.iterrows():
-        if row["name"].lower() == target_name.lower():
-            continue
+        # One sparse mat-vec against every fragrance, then partial sort for top N
+        positions, scores = store.top_k(position, n, exclude=target_mask)
 
-        profile = get_fragrance_profile(row)
-        sim = cosine_similarity(target_profile, profile)
+    similarities = []
+    for position, sim in zip(positions, scores):
+        row = df.iloc[position]
 
         # Extract brand name from brand field (v2.0 format: name;id)
         brand_info = parse_brand(row["brand"])
@@ -83,57 +154,90 @@ def find_similar(df: pd.DataFrame, target_name: str, n: int = 5) -> List[Dict]:
             "name": row["name"],
             "brand": brand_info["name"],
             "brand_id": brand_info["id"],
-            "similarity": sim
+            "similarity": float(sim)
         })
 
-    # Sort by similarity and return top N
-    similarities.sort(key=lambda x: x["similarity"], reverse=True)
-    return similarities[:n]
+    return similarities
 
 
-def recommend_by_accords(df: pd.DataFrame, preferred_accords: List[str], n: int = 5) -> List[Dict]:
-    """Recommend fragrances based on preferred accords."""
-    scores = []
-
-    for idx, row in df.iterrows():
-        accords = parse_accords(row["accords"])
-        accord_names = {a["name"].lower() for a in accords}
-
-        # Count matching accords
-        matches = sum(1 for pref in preferred_accords if pref.lower() in accord_names)
+@traced("recommend.accords")
+def recommend_by_accords(
+    df: pd.DataFrame,
+    preferred_accords: List[str],
+    n: int = 5,
+    accords: Optional[pd.DataFrame] = None,
+    index: Optional[PostingIndex] = None
+) -> List[Dict]:
+    """Recommend fragrances based on preferred accords.
+
+    Args:
+        df: Fragrances DataFrame
+        preferred_accords: Accord names (resolved through accords.csv when
+            accords is given) or accord IDs such as 'a24'
+        n: Number of results
+        accords: Optional accords DataFrame for name lookup
+        index: Prebuilt PostingIndex for df (see posting_index.py). Built on
+            the first call when omitted and reused while df is alive.
+
+    Raises:
+        ValueError: If index was built from other rows than df
+    """
+    if accords is not None:
+        ids_by_name = dict(zip(accords["name"].str.lower(), accords["id"]))
+        accord_ids = [ids_by_name.get(a.lower(), a) for a in preferred_accords]
+    else:
+        accord_ids = list(preferred_accords)
+
+    if index is None:
+        index = _posting_index(df)
+    _check_rows(index.pids, df)
+
+    # Only fragrances posted under one of the accords are scored
+    scores = index.accord_scores(accord_ids)
+    positions = index.positions(scores["pid"].to_numpy())
+    keep = positions >= 0
+    positions = positions[keep]
+    matches = scores["matches"].to_numpy()[keep]
+    score = scores["score"].to_numpy()[keep]
+
+    # Highest score first; ties keep catalog order
+    order = np.lexsort((positions, -score))[:n]
 
-        if matches > 0:
-            # Weight by accord percentages
-            score = 0
-            for accord in accords:
-                if accord["name"].lower() in [p.lower() for p in preferred_accords]:
-                    score += accord["percentage"]
+    results = []
+    for i in order:
+        row = df.iloc[positions[i]]
 
-            # Extract brand name (v2.0 format: name;id)
-            brand_info = parse_brand(row["brand"])
+        # Extract brand name (v2.0 format: name;id)
+        brand_info = parse_brand(row["brand"])
 
-            scores.append({
-                "name": row["name"],
-                "brand": brand_info["name"],
-                "brand_id": brand_info["id"],
-                "matches": matches,
-                "score": score
-            })
+        results.append({
+            "name": row["name"],
+            "brand": brand_info["name"],
+            "brand_id": brand_info["id"],
+            "matches": int(matches[i]),
+            "score": int(score[i])
+        })
 
-    # Sort by score
-    scores.sort(key=lambda x: x["score"], reverse=True)
-    return scores[:n]
+    return results
 
 
+@traced("recommend.perfumer")
 def recommend_by_perfumer(
     fragrances: pd.DataFrame,
     perfumers: pd.DataFrame,
     perfumer_name: str,
-    n: int = 5
+    n: int = 5,
+    index: Optional[PostingIndex] = None
 ) -> List[Dict]:
     """Recommend fragrances by a specific perfumer.
 
-    Uses perfumers.csv to find fragrances created by a perfumer.
+    Uses perfumers.csv to find the perfumer ID, then the perfumer posting
+    list to find the fragrances (exact ID match, so p2 never matches p24).
+    The posting index is built on the first call when omitted and reused
+    while fragrances is alive.
+
+    Raises:
+        ValueError: If index was built from other rows than fragrances
     """
     # Find perfumer ID
     perfumer_mask = perfumers["name"].str.lower().str.contains(perfumer_name.lower(), na=False)
@@ -144,19 +248,26 @@ def recommend_by_perfumer(
     perfumer_row = perfumers[perfumer_mask].iloc[0]
     perfumer_id = perfumer_row["id"]
 
-    # Find fragrances by this perfumer
+    if index is None:
+        index = _posting_index(fragrances)
+    _check_rows(index.pids, fragrances)
+
+    # Find fragrances by this perfumer, in catalog order
+    pids = index.perfumers.pid_set(perfumer_id)
+    positions = np.sort(index.positions(pids))
+    positions = positions[positions >= 0]
+
     results = []
-    for idx, row in fragrances.iterrows():
-        perfumers_field = row.get("perfumers", "")
-        if perfumers_field and f";{perfumer_id}" in perfumers_field:
-            brand_info = parse_brand(row["brand"])
-            results.append({
-                "name": row["name"],
-                "brand": brand_info["name"],
-                "year": row["year"]
-            })
+    for position in positions[:n]:
+        row = fragrances.iloc[position]
+        brand_info = parse_brand(row["brand"])
+        results.append({
+            "name": row["name"],
+            "brand": brand_info["name"],
+            "year": row["year"]
+        })
 
-    return results[:n]
+    return results
 
 
 def main():
@@ -176,7 +287,7 @@ def main():
 
     # Recommend by preferred accords
     print("Fragrances with fruity and sweet accords:")
-    recommendations = recommend_by_accords(fragrances, ["fruity", "sweet"], n=5)
+    recommendations = recommend_by_accords(fragrances, ["fruity", "sweet"], n=5, accords=db["accords"])
     for item in recommendations:
         print(f"  {item['name']} by {item['brand']} (score: {item['score']})")
     print()
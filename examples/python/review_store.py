@@ -0,0 +1,346 @@
+#!/usr/bin/env python3
+"""
+FragDB - Review Text Store Example (v4.6)
+
+Demonstrates how to serve review text from comments.parquet without turning
+it into pandas object strings. The text column is a large_string of more
+than 4 GB; as Python str objects (plus the DataFrame's pointer array) it
+takes several times that in RAM, in every serving process.
+
+export_review_store() rewrites the text once as:
+
+- text.bin       every review's UTF-8 bytes, back to back
+- offsets.npy    int64, review i is text.bin[offsets[i]:offsets[i + 1]]
+- pids.npy, langs.npy, dates.npy, rows.npy
+                 the sort key (pid, language code or -1 if missing, epoch
+                 seconds or 0 if unparseable) and the review's row number
+                 in the parquet file
+
+with reviews sorted by (pid, lang, date), so the reviews of a pid (and of
+a pid in one language) are one contiguous range found by binary search.
+ReviewStore opens every file with mmap: nothing is read until a range is
+touched, no Python string is built until a caller asks for one, and all
+processes opening the store share one copy in the page cache.
+
+    store = ReviewStore("reviews/")
+    reviews = store.reviews(704, "en", newest=10)    # ReviewTexts view
+    reviews[0]                                       # decode one review
+    store.to_arrow(704)                              # zero-copy Arrow array
+
+The export streams the parquet file one batch at a time (text bytes are
+copied straight from the Arrow buffers), then reorders the blob from a
+memory map if the file is not already in (pid, lang, date) order.
+"""
+
+import json
+import mmap
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from instrumentation import span
+from parse_dates import parse_dates
+
+KEY_ARRAYS = ("pids", "langs", "dates", "rows")
+BLOB_NAME = "text.bin"
+
+# Bytes copied per step when reordering the blob
+COPY_CHUNK_BYTES = 64 << 20
+
+
+def _string_bytes(array: pa.Array) -> Tuple[np.ndarray, memoryview]:
+    """Offsets (rebased to 0) and data bytes of a (large_)string array, without copying."""
+    array = array.cast(pa.large_string())
+    offsets = np.frombuffer(array.buffers()[1], dtype=np.int64)[array.offset:array.offset + len(array) + 1]
+    data = array.buffers()[2]
+    data = memoryview(data)[offsets[0]:offsets[-1]] if data is not None else memoryview(b"")
+    return offsets - offsets[0], data
+
+
+def _gather(source: np.ndarray, starts: np.ndarray, ends: np.ndarray, out) -> None:
+    """Append source[starts[i]:ends[i]] for every i to out, in bounded chunks."""
+    lengths = ends - starts
+    cumulative = np.cumsum(lengths)
+    first = 0
+    while first < len(starts):
+        # As many ranges as fit in one chunk (at least one)
+        base = cumulative[first - 1] if first else 0
+        last = max(int(np.searchsorted(cumulative, base + COPY_CHUNK_BYTES, side="right")), first + 1)
+        chunk = lengths[first:last]
+        total = int(chunk.sum())
+        if total:
+            index = np.repeat(starts[first:last] - (np.cumsum(chunk) - chunk), chunk) + np.arange(total)
+            out.write(source[index].tobytes())
+        first = last
+
+
+def export_review_store(parquet_path: str, out_dir: str, batch_size: int = 65536) -> Dict:
+    """Write the review text of a comments parquet file as a memory-mappable store.
+
+    Args:
+        parquet_path: comments.parquet (needs pid, lang, date and text)
+        out_dir: Output directory (created if missing)
+        batch_size: Rows read per batch
+
+    Returns:
+        The manifest written to out_dir/manifest.json
+    """
+    out = Path(out_dir)
+    out.mkdir(parents=True, exist_ok=True)
+    parquet_file = pq.ParquetFile(parquet_path, memory_map=True)
+
+    pids, langs, dates, lengths = [], [], [], []
+    codes: Dict[str, int] = {}
+    unsorted_path = out / f"{BLOB_NAME}.{os.getpid()}.unsorted"
+
+    # Pass 1: keys into memory, text bytes to disk in file order
+    with span("export.reviews_scan") as s, open(unsorted_path, "wb") as blob:
+        for batch in parquet_file.iter_batches(batch_size=batch_size, columns=["pid", "lang", "date", "text"]):
+            encoded = pc.dictionary_encode(batch.column("lang"))
+            for lang in encoded.dictionary.to_pylist():
+                codes.setdefault(lang, len(codes))
+            # A trailing -1 that null indices (filled with -1) pick up
+            mapping = np.array([codes[lang] for lang in encoded.dictionary.to_pylist()] + [-1], dtype=np.int16)
+            langs.append(mapping[pc.fill_null(encoded.indices, -1).to_numpy()])
+            pids.append(batch.column("pid").to_numpy(zero_copy_only=False).astype(np.int32))
+            dates.append(parse_dates(batch.column("date")).epoch)
+
+            offsets, data = _string_bytes(batch.column("text"))
+            blob.write(data)
+            lengths.append(np.diff(offsets))
+            s.add(rows=batch.num_rows, bytes_read=len(data))
+
+    # Language codes in alphabetical order, so the sort groups languages by name
+    languages = sorted(codes)
+    remap = np.full(len(codes) + 1, -1, dtype=np.int16)
+    for lang, code in codes.items():
+        remap[code] = languages.index(lang)
+
+    pids = np.concatenate(pids) if pids else np.zeros(0, dtype=np.int32)
+    langs = remap[np.concatenate(langs)] if langs else np.zeros(0, dtype=np.int16)
+    dates = np.concatenate(dates) if dates else np.zeros(0, dtype=np.int64)
+    lengths = np.concatenate(lengths) if lengths else np.zeros(0, dtype=np.int64)
+    file_offsets = np.concatenate(([0], np.cumsum(lengths))).astype(np.int64)
+
+    # Pass 2: reorder the blob by (pid, lang, date) unless it already is
+    order = np.lexsort((dates, langs, pids))
+    with span("export.reviews_sort", rows=len(order)):
+        if np.array_equal(order, np.arange(len(order))):
+            os.replace(unsorted_path, out / BLOB_NAME)
+        else:
+            # np.memmap cannot map an empty file
+            source = (np.memmap(unsorted_path, dtype=np.uint8, mode="r") if file_offsets[-1]
+                      else np.zeros(0, dtype=np.uint8))
+            with open(out / BLOB_NAME, "wb") as blob:
+                _gather(source, file_offsets[order], file_offsets[order + 1], blob)
+            del source
+            os.remove(unsorted_path)
+
+    np.save(out / "offsets.npy", np.concatenate(([0], np.cumsum(lengths[order]))).astype(np.int64))
+    np.save(out / "pids.npy", pids[order])
+    np.save(out / "langs.npy", langs[order])
+    np.save(out / "dates.npy", dates[order])
+    np.save(out / "rows.npy", order.astype(np.int64))
+
+    stat = os.stat(parquet_path)
+    manifest = {
+        "source": {"path": os.path.abspath(parquet_path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns},
+        "reviews": int(len(order)),
+        "text_bytes": int(file_offsets[-1]),
+        "languages": languages,
+    }
+    tmp_path = out / f"manifest.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, out / "manifest.json")
+    return manifest
+
+
+class ReviewTexts:
+    """A lazy view of some reviews of a store; strings are decoded on access."""
+
+    def __init__(self, store: "ReviewStore", positions: np.ndarray):
+        self.store = store
+        self.positions = positions
+
+    def __len__(self) -> int:
+        return len(self.positions)
+
+    def __getitem__(self, i: int) -> str:
+        return self.store.text(int(self.positions[i]))
+
+    def __iter__(self) -> Iterator[str]:
+        for position in self.positions:
+            yield self.store.text(int(position))
+
+    def raw(self, i: int) -> memoryview:
+        """UTF-8 bytes of the i-th review, as a view of the memory map."""
+        return self.store.raw(int(self.positions[i]))
+
+    @property
+    def nbytes(self) -> int:
+        offsets = self.store.offsets
+        return int((offsets[self.positions + 1] - offsets[self.positions]).sum())
+
+    @property
+    def dates(self) -> np.ndarray:
+        return self.store.dates[self.positions].astype("datetime64[s]")
+
+    @property
+    def languages(self) -> List[str]:
+        return [self.store.languages[code] if code >= 0 else None for code in self.store.langs[self.positions]]
+
+
+class ReviewStore:
+    """Memory-mapped review texts sorted by (pid, lang, date)."""
+
+    def __init__(self, directory: str):
+        """
+        Args:
+            directory: Output directory of export_review_store()
+        """
+        path = Path(directory)
+        with open(path / "manifest.json", encoding="utf-8") as f:
+            self.manifest = json.load(f)
+        self.languages: List[str] = self.manifest["languages"]
+        self._codes = {lang: code for code, lang in enumerate(self.languages)}
+
+        self.offsets = np.load(path / "offsets.npy", mmap_mode="r")
+        for name in KEY_ARRAYS:
+            setattr(self, name, np.load(path / f"{name}.npy", mmap_mode="r"))
+
+        # mmap cannot map an empty file
+        self._file = open(path / BLOB_NAME, "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        self.blob = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        self._view = memoryview(self.blob)
+
+    def __len__(self) -> int:
+        return len(self.pids)
+
+    def close(self) -> None:
+        self._view.release()
+        if isinstance(self.blob, mmap.mmap):
+            self.blob.close()
+        self._file.close()
+
+    def range(self, pid: int, lang: Optional[str] = None) -> Tuple[int, int]:
+        """Positions [start, stop) of a pid's reviews (in one language)."""
+        lo, hi = (int(x) for x in np.searchsorted(self.pids, [pid, pid + 1]))
+        if lang is not None:
+            code = self._codes.get(lang)
+            if code is None:
+                return lo, lo
+            lo, hi = (lo + int(x) for x in np.searchsorted(self.langs[lo:hi], [code, code + 1]))
+        return lo, hi
+
+    def raw(self, position: int) -> memoryview:
+        """UTF-8 bytes of one review, without copying."""
+        return self._view[self.offsets[position]:self.offsets[position + 1]]
+
+    def text(self, position: int) -> str:
+        return str(self.raw(position), "utf-8")
+
+    def reviews(self, pid: int, lang: Optional[str] = None, newest: Optional[int] = None) -> ReviewTexts:
+        """Reviews of a pid, newest first.
+
+        Args:
+            pid: Fragrance ID
+            lang: Optional language code
+            newest: Keep only the N most recent reviews
+
+        Returns:
+            ReviewTexts view (no text is decoded yet)
+        """
+        lo, hi = self.range(pid, lang)
+        positions = np.arange(lo, hi)
+        if lang is None:
+            # Several languages: merge them by date (stable, so ties keep store order)
+            positions = positions[np.argsort(-self.dates[lo:hi], kind="stable")]
+        else:
+            positions = positions[::-1]
+        return ReviewTexts(self, positions[:newest] if newest is not None else positions)
+
+    def to_arrow(self, pid: int, lang: Optional[str] = None) -> pa.Array:
+        """A pid's reviews in store order as a large_string array over the memory map (zero-copy)."""
+        lo, hi = self.range(pid, lang)
+        return pa.LargeStringArray.from_buffers(hi - lo, pa.py_buffer(self.offsets), pa.py_buffer(self.blob),
+                                                offset=lo)
+
+
+def main():
+    from comments_reader import CommentsReader
+    from synthetic_data import synthetic_dataset
+
+    print("=== FragDB v4.6 Review Text Store ===\n")
+
+    with tempfile.TemporaryDirectory(prefix="fragdb_reviews_") as out_dir:
+        manifest = export_review_store("../../samples/comments_sample.parquet", f"{out_dir}/sample")
+        store = ReviewStore(f"{out_dir}/sample")
+        print(f"Sample: {manifest['reviews']} reviews, {manifest['text_bytes']:,} text bytes, "
+              f"languages {manifest['languages']}")
+        reviews = store.reviews(704, newest=3)
+        for date, lang, i in zip(reviews.dates, reviews.languages, range(len(reviews))):
+            print(f"  {date} {lang}: {reviews[i][:70]}...")
+        print()
+
+        # Every review matches the parquet text
+        table = pq.read_table("../../samples/comments_sample.parquet", columns=["text"])
+        expected = table["text"].to_pylist()
+        assert [store.text(i) for i in range(len(store))] == [expected[r] for r in store.rows]
+        print("Every stored review matches comments_sample.parquet")
+        store.close()
+        print()
+
+    # Synthetic comments at 10% scale
+    with synthetic_dataset(scale=0.1, row_group_size=20_000) as data_dir:
+        path = f"{data_dir}/comments.parquet"
+
+        start = time.perf_counter()
+        manifest = export_review_store(path, f"{data_dir}/reviews")
+        export_s = time.perf_counter() - start
+        store = ReviewStore(f"{data_dir}/reviews")
+        print(f"Synthetic: {manifest['reviews']:,} reviews, {manifest['text_bytes'] / 1e6:.0f} MB of text, "
+              f"exported in {export_s:.1f} s")
+
+        texts = pq.read_table(path, columns=["text"]).to_pandas()["text"]
+        object_mb = texts.memory_usage(deep=True) / 1e6
+        del texts
+        print(f"  text as pandas object strings:  {object_mb:8.0f} MB per process")
+        print(f"  text.bin + offsets (mmap):      {(manifest['text_bytes'] + store.offsets.nbytes) / 1e6:8.0f} MB "
+              f"shared page cache, touched on demand")
+        print()
+
+        pids, counts = np.unique(np.asarray(store.pids), return_counts=True)
+        queries = pids[np.argsort(-counts, kind="stable")[:20]].tolist()
+        reader = CommentsReader(path)
+
+        start = time.perf_counter()
+        for pid in queries:
+            reader.reviews(pid, "en", newest=10, columns=["text"])["text"].tolist()
+        reader_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+        start = time.perf_counter()
+        for pid in queries:
+            list(store.reviews(pid, "en", newest=10))
+        store_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+        for pid in queries[:3]:
+            assert list(store.reviews(pid, "en", newest=10).dates) == list(
+                parse_dates(pa.array(reader.reviews(pid, "en", newest=10)["date"])).epoch.astype("datetime64[s]"))
+
+        array = store.to_arrow(queries[0])
+        print("=== Newest 10 'en' reviews of the 20 most reviewed pids ===")
+        print(f"  CommentsReader (row groups):    {reader_ms:8.2f} ms per pid")
+        print(f"  ReviewStore (mmap range):       {store_ms:8.3f} ms per pid")
+        print(f"  to_arrow({queries[0]}): {len(array):,} reviews, {array.nbytes / 1e6:.1f} MB viewed without copying")
+
+
+if __name__ == "__main__":
+    main()
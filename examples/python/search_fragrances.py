@@ -6,24 +6,42 @@ Demonstrates how to search and filter fragrances in the database.
 """
 
 import pandas as pd
+from typing import Optional
+from instrumentation import traced
 from load_database import load_fragdb, join_with_brands
+from name_index import NameIndex
 
 
-def search_by_name(df: pd.DataFrame, query: str) -> pd.DataFrame:
-    """Search fragrances by name (case-insensitive)."""
+@traced("search.name")
+def search_by_name(df: pd.DataFrame, query: str, index: Optional[NameIndex] = None) -> pd.DataFrame:
+    """Search fragrances by name (case-insensitive).
+
+    Pass a NameIndex built from df["name"] (see name_index.py) to answer
+    the query from trigram postings instead of scanning every name; the
+    index also ignores accents and punctuation.
+    """
+    if index is not None:
+        return df.iloc[index.contains(query)]
     mask = df["name"].str.lower().str.contains(query.lower(), na=False)
     return df[mask]
 
 
-def search_by_brand(df: pd.DataFrame, brand: str) -> pd.DataFrame:
+@traced("search.brand")
+def search_by_brand(df: pd.DataFrame, brand: str, index: Optional[NameIndex] = None) -> pd.DataFrame:
     """Search fragrances by brand name.
 
     Brand field format (v2.0): brand_name;brand_id
+
+    Pass a NameIndex built from the brand names of df (see brand_index())
+    to answer the query with a prefix lookup instead of scanning every row.
     """
+    if index is not None:
+        return df.iloc[index.prefix(brand)]
     mask = df["brand"].str.lower().str.startswith(brand.lower(), na=False)
     return df[mask]
 
 
+@traced("search.brand_id")
 def search_by_brand_id(df: pd.DataFrame, brand_id: str) -> pd.DataFrame:
     """Search fragrances by brand ID.
 
@@ -33,16 +51,19 @@ def search_by_brand_id(df: pd.DataFrame, brand_id: str) -> pd.DataFrame:
     return df[mask]
 
 
+@traced("search.gender")
 def filter_by_gender(df: pd.DataFrame, gender: str) -> pd.DataFrame:
     """Filter fragrances by target gender."""
     return df[df["gender"] == gender]
 
 
+@traced("search.year_range")
 def filter_by_year_range(df: pd.DataFrame, start: int, end: int) -> pd.DataFrame:
     """Filter fragrances by release year range."""
     return df[(df["year"] >= start) & (df["year"] <= end)]
 
 
+@traced("search.rating")
 def filter_by_rating(df: pd.DataFrame, min_rating: float) -> pd.DataFrame:
     """Filter fragrances by minimum rating."""
     # Rating format: average;vote_count
@@ -51,6 +72,7 @@ def filter_by_rating(df: pd.DataFrame, min_rating: float) -> pd.DataFrame:
     return df[df["rating_value"] >= min_rating]
 
 
+@traced("search.top_rated")
 def get_top_rated(df: pd.DataFrame, n: int = 10) -> pd.DataFrame:
     """Get top N rated fragrances."""
     df = df.copy()
@@ -68,6 +90,11 @@ def get_brand_name(brand_field: str) -> str:
     return brand_field.split(";")[0]
 
 
+def brand_index(df: pd.DataFrame) -> NameIndex:
+    """NameIndex over the brand name of each row of df, for search_by_brand()."""
+    return NameIndex(df["brand"].str.split(";").str[0].fillna(""))
+
+
 def main():
     # Load database
     db = load_fragdb()
@@ -91,6 +118,11 @@ def main():
         print(f"  {row['name']} ({row['year']}) - {row['gender']}")
     print()
 
+    # Same query through a prebuilt brand index
+    indexed = search_by_brand(df, "Dior", index=brand_index(df))
+    print(f"Dior fragrances via brand index: {len(indexed)} (scan: {len(results)})")
+    print()
+
     # Filter by gender
     print("Unisex fragrances:")
     results = filter_by_gender(df, "for women and men")
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+FragDB - Snapshot Cache Example (v4.6)
+
+Demonstrates how to cache the loaded CSV tables as typed Feather (Arrow IPC)
+files. The first load parses the pipe-delimited CSV as usual and writes a
+snapshot; later loads memory-map the snapshot instead of re-parsing the text.
+
+Each snapshot is keyed by the source file's size, mtime and SHA-1 content
+hash, so dropping a new CSV release into the samples directory invalidates
+the cache automatically. Entries also record the loader and SNAPSHOT_VERSION,
+so a snapshot written by another loader or an older layout is rebuilt.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import pandas as pd
+from instrumentation import span
+from load_database import load_fragdb
+
+MANIFEST_NAME = "manifest.json"
+
+# Bump when the snapshot layout or the typed output of the loaders changes
+SNAPSHOT_VERSION = 1
+
+
+def hash_file(filepath: str, block_size: int = 1 << 20) -> str:
+    """Compute the SHA-1 hex digest of a file, reading it in blocks.
+
+    Args:
+        filepath: Path to the file
+        block_size: Number of bytes read per block
+
+    Returns:
+        Hex-encoded SHA-1 digest
+    """
+    digest = hashlib.sha1()
+    with open(filepath, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def read_manifest(snapshot_dir: str) -> Dict[str, Dict]:
+    """Read the snapshot manifest (table name -> source fingerprint)."""
+    path = Path(snapshot_dir) / MANIFEST_NAME
+    if not path.exists():
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def write_manifest(snapshot_dir: str, entries: Dict[str, Dict]) -> None:
+    """Merge entries into the snapshot manifest and write it atomically.
+
+    The manifest on disk is re-read just before the write and only the given
+    entries replace its own, so workers snapshotting different tables do not
+    drop each other's entries. The result is written to a temporary file and
+    renamed into place so that no worker observes a half-written file.
+
+    Args:
+        snapshot_dir: Directory holding the manifest
+        entries: Manifest entries to add or replace (name -> entry)
+    """
+    path = Path(snapshot_dir) / MANIFEST_NAME
+    manifest = read_manifest(snapshot_dir)
+    manifest.update(entries)
+    tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def _loader_id(loader: Callable) -> str:
+    """Module-qualified name of a loader function, recorded in the manifest."""
+    return f"{getattr(loader, '__module__', '')}.{getattr(loader, '__qualname__', repr(loader))}"
+
+
+def read_snapshot(snapshot_path: str, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """Memory-map a Feather snapshot and convert it to a DataFrame.
+
+    Args:
+        snapshot_path: Path to the .feather file
+        columns: Optional list of columns to read (others are never touched)
+
+    Returns:
+        DataFrame with the snapshot's typed columns
+    """
+    import pyarrow.feather as feather
+
+    with span("load.snapshot") as s:
+        s.read(snapshot_path)
+        table = feather.read_table(snapshot_path, columns=columns, memory_map=True)
+        df = table.to_pandas()
+        s.add(rows=len(df))
+    return df
+
+
+def write_snapshot(df: pd.DataFrame, snapshot_path: str) -> None:
+    """Write a DataFrame as an uncompressed Feather file.
+
+    Uncompressed files can be memory-mapped directly, so numeric columns are
+    served from the page cache without decoding.
+    """
+    import pyarrow.feather as feather
+
+    tmp_path = f"{snapshot_path}.{os.getpid()}.tmp"
+    feather.write_feather(df, tmp_path, compression="uncompressed")
+    os.replace(tmp_path, snapshot_path)
+
+
+def load_cached(
+    name: str,
+    csv_path: str,
+    loader: Callable[[str], pd.DataFrame],
+    snapshot_dir: str,
+    columns: Optional[List[str]] = None
+) -> pd.DataFrame:
+    """Load a table from its snapshot, (re)building the snapshot if stale.
+
+    Validation is done in two steps: if size and mtime both match the
+    manifest, the snapshot is used without reading the CSV at all. If only
+    the mtime changed (e.g. the file was copied), the content hash decides.
+    Entries written by another loader or SNAPSHOT_VERSION are rebuilt.
+
+    Args:
+        name: Table name used as the manifest key (e.g. 'fragrances')
+        csv_path: Path to the source CSV file
+        loader: Function that parses the CSV into a typed DataFrame
+        snapshot_dir: Directory holding the snapshots and manifest
+        columns: Optional list of columns to return
+
+    Returns:
+        DataFrame identical to loader(csv_path), optionally projected
+    """
+    Path(snapshot_dir).mkdir(parents=True, exist_ok=True)
+    manifest = read_manifest(snapshot_dir)
+    entry = manifest.get(name)
+    loader_id = _loader_id(loader)
+
+    stat = os.stat(csv_path)
+    current = entry is not None and (entry.get("version"), entry.get("loader")) == (SNAPSHOT_VERSION, loader_id)
+    if current:
+        snapshot_path = Path(snapshot_dir) / entry["snapshot"]
+        if snapshot_path.exists() and entry["size"] == stat.st_size:
+            if entry["mtime_ns"] == stat.st_mtime_ns:
+                return read_snapshot(str(snapshot_path), columns)
+
+            if entry["sha1"] == hash_file(csv_path):
+                entry["mtime_ns"] = stat.st_mtime_ns
+                write_manifest(snapshot_dir, {name: entry})
+                return read_snapshot(str(snapshot_path), columns)
+
+    # Cache miss: parse the CSV and write a fresh snapshot
+    sha1 = hash_file(csv_path)
+    df = loader(csv_path)
+    snapshot_name = f"{name}-{sha1[:16]}.feather"
+    write_snapshot(df, str(Path(snapshot_dir) / snapshot_name))
+
+    # Remove the snapshot of the previous release
+    if entry is not None and entry["snapshot"] != snapshot_name:
+        old_path = Path(snapshot_dir) / entry["snapshot"]
+        if old_path.exists():
+            old_path.unlink()
+
+    write_manifest(snapshot_dir, {name: {
+        "source": os.path.abspath(csv_path),
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "sha1": sha1,
+        "snapshot": snapshot_name,
+        "loader": loader_id,
+        "version": SNAPSHOT_VERSION
+    }})
+
+    if columns is not None:
+        df = df[columns]
+    return df
+
+
+def main():
+    with tempfile.TemporaryDirectory() as snapshot_dir:
+        print("=== FragDB v4.6 Snapshot Cache ===\n")
+
+        start = time.perf_counter()
+        csv_db = load_fragdb()
+        print(f"CSV load:            {(time.perf_counter() - start) * 1000:.1f} ms")
+
+        start = time.perf_counter()
+        load_fragdb(snapshot_dir=snapshot_dir)
+        print(f"First snapshot load: {(time.perf_counter() - start) * 1000:.1f} ms (writes snapshots)")
+
+        start = time.perf_counter()
+        cached_db = load_fragdb(snapshot_dir=snapshot_dir)
+        print(f"Warm snapshot load:  {(time.perf_counter() - start) * 1000:.1f} ms")
+        print()
+
+        # Snapshots round-trip the typed tables (missing strings come back as None)
+        for name, df in csv_db.items():
+            assert df.equals(cached_db[name]), f"{name} snapshot differs from CSV"
+        print("Snapshot tables are identical to the CSV tables")
+        print()
+
+        print("Manifest:")
+        for name, entry in read_manifest(snapshot_dir).items():
+            print(f"  {name}: {entry['snapshot']} ({entry['size']:,} bytes)")
+
+
+if __name__ == "__main__":
+    main()
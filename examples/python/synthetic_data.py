@@ -0,0 +1,553 @@
+#!/usr/bin/env python3
+"""
+FragDB - Synthetic Dataset Example (v4.6)
+
+Demonstrates how to generate a schema-faithful FragDB at any scale so the
+examples can be measured at the size of the full database instead of the
+10-row samples:
+
+    generate_fragdb("/tmp/fragdb", scale=1.0)    # 130,949 fragrances, 4.6M comments
+    generate_fragdb("/tmp/fragdb", scale=0.05)   # 5% of every table
+
+    with synthetic_dataset(scale=0.1) as data_dir:   # removed on exit
+        ...
+
+Every file has the columns, order, dtypes and field encodings of the
+published files (pipe-delimited CSVs, ZSTD parquet):
+
+- brand                 Dolce&Gabbana;b72
+- accords               a24:100;a91:75;a33:63
+- notes_pyramid         top(n2415,1.0,5.0;n146,0.96,3.67)middle(...)base(...)
+- perfumers             Olivier Cresp;p39
+- rating                3.86;35479
+- voting fields         like_love:11500:32.29;like_like:14800:41.79;...
+- reminds_of            728:4500:1000;44034:1100:109
+- ID lists              59313;6086;78873
+- news related_*        JSON-encoded lists ('["1228", "704"]')
+
+Keys are consistent across files: every brand, perfumer, note and accord
+ID used by a fragrance exists in its reference table, fragrance news_ids
+are exactly the articles whose related_pids name it, comment pids exist
+in fragrances.csv, and reference counts (brand_count, fragrance_count, ...)
+and reviews_count are counted from the generated rows. Popularity is
+skewed (a few brands, notes and fragrances carry most of the rows), and
+the language, coverage and reply-rate mix follows the figures in the
+README. Free text (descriptions, reviews, articles) is drawn from the
+sample files, so string lengths are realistic but repetitive.
+"""
+
+import contextlib
+import json
+import shutil
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from load_database import load_fragdb
+from parse_columns import VOTING_CATEGORIES
+
+# Row counts of the full database (README)
+FULL_SIZES = {
+    "fragrances": 130_949,
+    "brands": 7_815,
+    "perfumers": 2_968,
+    "notes": 2_522,
+    "accords": 92,
+    "comments": 4_643_851,
+    "news": 24_440,
+    "news_comments": 263_798,
+}
+
+# Review languages, most reviewed first (README: English 1.69M of 4.64M)
+COMMENT_LANGUAGES = ("en", "ru", "pt", "es", "ko", "tr", "ja", "pl", "it", "hu", "sr", "sv",
+                     "de", "he", "uk", "fr", "ar", "el", "cs", "zh", "ro", "mn", "nl")
+
+NEWS_CATEGORIES = {
+    "New Fragrances": 0.349, "Fragrance Reviews": 0.228, "Niche Perfumery": 0.104,
+    "Designer Brands": 0.05, "Interviews": 0.04, "History": 0.03, "Industry News": 0.03,
+    "Raw Materials": 0.03, "Columns": 0.03, "Fragrance News": 0.03, "Perfumers": 0.02,
+    "Art Books Events": 0.02, "Vintages": 0.015, "Bath & Body": 0.024,
+}
+
+REVIEWED_SHARE = 0.706        # fragrances with at least one review
+COMMENTED_NEWS_SHARE = 0.893  # articles with at least one comment
+REPLY_RATE = 0.049
+ARCHIVED_SHARE = 0.631        # legacy articles carry date_unix 0
+ISO_DATE_SHARE = 0.05         # reviews dated 'YYYY-MM-DD' instead of the page format
+
+ROW_GROUP_SIZE = 100_000
+
+
+def table_sizes(scale: float) -> Dict[str, int]:
+    """Row count of every table at the given scale (at least 10 rows each)."""
+    return {name: max(10, int(round(size * scale))) for name, size in FULL_SIZES.items()}
+
+
+def _popularity(rng: np.random.Generator, n: int, exponent: float = 1.0) -> np.ndarray:
+    """Zipf-like probabilities over n items, in random item order."""
+    weights = 1.0 / np.arange(1, n + 1) ** exponent
+    rng.shuffle(weights)
+    return weights / weights.sum()
+
+
+def _slug(text: str) -> str:
+    return "-".join("".join(ch if ch.isalnum() else " " for ch in text).split())
+
+
+def _json_list(values: Sequence) -> str:
+    return json.dumps([str(v) for v in values], ensure_ascii=False)
+
+
+def _vocabulary(samples: Dict[str, pd.DataFrame]) -> List[str]:
+    words = set()
+    for table in ("fragrances", "brands", "notes", "accords"):
+        for name in samples[table]["name"].dropna():
+            words.update(w for w in name.split() if w.isalpha())
+    return sorted(words)
+
+
+def _names(rng: np.random.Generator, words: Sequence[str], n: int, max_words: int = 3) -> List[str]:
+    """Random 1..max_words word names."""
+    counts = rng.integers(1, max_words + 1, n)
+    picks = rng.integers(0, len(words), (n, max_words))
+    return [" ".join(words[j] for j in row[:k]) for row, k in zip(picks, counts)]
+
+
+def _items(pool: pd.Series, sep: str = ";") -> List[str]:
+    """Distinct items of a packed sample field."""
+    return sorted({item for value in pool.dropna() for item in value.split(sep) if item})
+
+
+def _reference_table(template: pd.DataFrame, prefix: str, n: int, names: List[str],
+                     count_column: str, counts: np.ndarray) -> pd.DataFrame:
+    """n rows cycled from the sample table, with new IDs, names and counts."""
+    table = template.iloc[np.arange(n) % len(template)].reset_index(drop=True)
+    table["id"] = [f"{prefix}{i}" for i in range(1, n + 1)]
+    table["name"] = names
+    table[count_column] = counts
+    return table
+
+
+def _choose_sets(rng: np.random.Generator, p: np.ndarray, sizes: np.ndarray) -> List[np.ndarray]:
+    """One set of distinct items (drawn by popularity) per row, of the given sizes."""
+    # Oversample, then keep the first occurrences (cheaper than per-row choice without replacement)
+    draws = rng.choice(len(p), size=(len(sizes), int(sizes.max(initial=0)) * 2 + 4), p=p)
+    result = []
+    for row, k in zip(draws, sizes):
+        _, first = np.unique(row, return_index=True)
+        result.append(row[np.sort(first)][:k])
+    return result
+
+
+def _voting_column(rng: np.random.Generator, field: str, totals: np.ndarray) -> List[str]:
+    """One packed voting field per row, splitting totals[i] votes over the categories."""
+    categories = VOTING_CATEGORIES[field]
+    if field == "gender_votes":
+        categories = categories[:5]
+    shares = rng.dirichlet(np.full(len(categories), 1.5), len(totals))
+    votes = np.maximum(np.round(shares * totals[:, None]), 1).astype(np.int64)
+    if field in ("season", "time_of_day"):
+        # Relative to the most voted category, as in the published files
+        percent = votes / votes.max(axis=1, keepdims=True) * 100
+    else:
+        percent = votes / votes.sum(axis=1, keepdims=True) * 100
+    percent = percent.round(2)
+    return [";".join(f"{c}:{v}:{pct}" for c, v, pct in zip(categories, row_votes, row_percent))
+            for row_votes, row_percent in zip(votes.tolist(), percent.tolist())]
+
+
+def _notes_pyramid(rng: np.random.Generator, ids: np.ndarray) -> str:
+    def layer(name: str, ids: np.ndarray) -> str:
+        opacity = np.round(np.sort(rng.uniform(0.5, 1.0, len(ids)))[::-1], 2)
+        weight = np.round(1 + opacity * rng.uniform(1, 4, len(ids)), 2)
+        return f"{name}(" + ";".join(f"n{i},{o},{w}" for i, o, w in zip(ids, opacity, weight)) + ")"
+
+    if len(ids) < 3 or rng.random() < 0.1:
+        return layer("notes", ids)
+    cut = np.sort(rng.choice(np.arange(1, len(ids)), 2, replace=False))
+    return layer("top", ids[:cut[0]]) + layer("middle", ids[cut[0]:cut[1]]) + layer("base", ids[cut[1]:])
+
+
+def generate_fragrances(rng: np.random.Generator, sizes: Dict[str, int], samples: Dict[str, pd.DataFrame],
+                        words: List[str]) -> Dict[str, pd.DataFrame]:
+    """Fragrances, the reference tables and the news metadata they link to.
+
+    Returns:
+        Dictionary with 'fragrances', 'brands', 'perfumers', 'notes', 'accords',
+        plus the links the parquet writers need ('news_nids', 'news_pids',
+        'comment_counts', brand and perfumer names per fragrance)
+    """
+    n = sizes["fragrances"]
+    frag = samples["fragrances"]
+
+    pids = np.sort(rng.choice(np.arange(1, int(n * 1.01) + 2), n, replace=False))
+    popularity = _popularity(rng, n, 0.9)
+
+    # Reviews per fragrance: about 70% of fragrances are reviewed, popular ones most
+    reviewed = rng.random(n) < REVIEWED_SHARE
+    weights = np.where(reviewed, popularity, 0.0)
+    comment_counts = rng.multinomial(sizes["comments"], weights / weights.sum())
+
+    brand_ids = rng.choice(sizes["brands"], n, p=_popularity(rng, sizes["brands"], 1.1)) + 1
+    brand_names = _names(rng, words, sizes["brands"], 2)
+
+    accord_sets = _choose_sets(rng, _popularity(rng, sizes["accords"], 0.8), rng.integers(3, 11, n))
+    note_sets = _choose_sets(rng, _popularity(rng, sizes["notes"], 1.0), rng.integers(3, 16, n))
+    perfumer_sets = _choose_sets(rng, _popularity(rng, sizes["perfumers"], 1.0),
+                                 rng.choice(4, n, p=[0.3, 0.5, 0.15, 0.05]))
+    perfumer_names = [f"{a} {b}" for a, b in zip(_names(rng, words, sizes["perfumers"], 1),
+                                                   _names(rng, words, sizes["perfumers"], 1))]
+
+    # Articles link ~4.9 fragrances each (README: 119,662 pid references);
+    # fragrance news_ids are the reverse, newest article first
+    n_news = sizes["news"]
+    nids = np.sort(rng.choice(np.arange(1, int(n_news * 1.1) + 2), n_news, replace=False))
+    news_sets = _choose_sets(rng, popularity, rng.poisson(4.9, n_news).clip(0, 40))
+    pairs_pos = np.concatenate(news_sets) if news_sets else np.zeros(0, dtype=np.int64)
+    pairs_nid = np.repeat(nids, [len(s) for s in news_sets])
+    order = np.lexsort((-pairs_nid, pairs_pos))
+    news_bounds = np.searchsorted(pairs_pos[order], np.arange(n + 1))
+    news_by_fragrance = pairs_nid[order]
+
+    reminds_sets = _choose_sets(rng, popularity, rng.integers(0, 21, n))
+    also_like_sets = _choose_sets(rng, popularity, np.full(n, 20))
+
+    by_brand = pd.Series(np.arange(n)).groupby(brand_ids).apply(np.array)
+    names = _names(rng, words, n)
+    years = np.where(rng.random(n) < 0.92, 2026 - np.minimum(rng.exponential(12, n), 120).astype(int), -1)
+    rating = np.clip(rng.normal(3.9, 0.35, n), 1, 5).round(2)
+    votes = np.maximum((popularity * n * 300 * rng.uniform(0.5, 1.5, n)).astype(np.int64), 1)
+    totals = (votes * rng.uniform(0.2, 0.6, n)).astype(np.int64)
+    voting = {field: _voting_column(rng, field, totals) for field in VOTING_CATEGORIES}
+
+    photo_pool = [u for u in _items(frag["user_photoes"]) if "photogram" in u]
+    video_pool = _items(frag["video_url"])
+    descriptions = frag["description"].dropna().tolist()
+    pros_cons = frag["pros_cons"].dropna().tolist()
+    genders = frag["gender"].dropna().unique()
+
+    rows = []
+    for i in range(n):
+        pid = int(pids[i])
+        brand = brand_names[brand_ids[i] - 1]
+        name = names[i]
+        info_card = f"https://www.fragrantica.com/mdimg/perfume-social-cards/en-p_c_{pid}.jpeg"
+        siblings = pids[by_brand[brand_ids[i]]]
+        siblings = siblings[siblings != pid]
+        designer = siblings[np.unique(rng.integers(0, len(siblings), 30))[:20]] if len(siblings) else siblings
+        reminds = reminds_sets[i][pids[reminds_sets[i]] != pid]
+        likes = rng.integers(20, 5000, len(reminds))
+        also_like = pids[also_like_sets[i]]
+        accord_strength = np.sort(rng.integers(30, 100, len(accord_sets[i])))[::-1]
+        accord_strength[0] = 100
+
+        rows.append({
+            "pid": pid,
+            "url": f"https://www.fragrantica.com/perfume/{_slug(brand)}/{_slug(name)}-{pid}.html",
+            "brand": f"{brand};b{brand_ids[i]}",
+            "name": name,
+            "year": years[i] if years[i] > 0 else None,
+            "gender": genders[rng.integers(len(genders))],
+            "collection": f"{name} by {brand}".upper() if rng.random() < 0.6 else None,
+            "main_photo": f"https://fimgs.net/mdimg/perfume-thumbs/375x500.{pid}.jpg",
+            "info_card": info_card,
+            "user_photoes": ";".join([info_card] + list(rng.choice(photo_pool, rng.integers(0, 6)))),
+            "video_url": video_pool[rng.integers(len(video_pool))] if rng.random() < 0.1 else None,
+            "accords": ";".join(f"a{a + 1}:{s}" for a, s in zip(accord_sets[i], accord_strength)),
+            "notes_pyramid": _notes_pyramid(rng, note_sets[i] + 1),
+            "perfumers": ";".join(f"{perfumer_names[p]};p{p + 1}" for p in perfumer_sets[i]) or None,
+            "description": descriptions[rng.integers(len(descriptions))],
+            "rating": f"{rating[i]};{votes[i]}",
+            "reviews_count": int(comment_counts[i]),
+            **{field: column[i] for field, column in voting.items()},
+            "pros_cons": pros_cons[rng.integers(len(pros_cons))] if rng.random() < 0.3 else None,
+            "by_designer": ";".join(map(str, designer)) or None,
+            "in_collection": ";".join(map(str, designer[:rng.integers(0, 11)])) or None,
+            "reminds_of": ";".join(f"{pids[r]}:{l}:{rng.integers(0, l)}" for r, l in zip(reminds, likes)) or None,
+            "also_like": ";".join(map(str, also_like)),
+            "news_ids": ";".join(map(str, news_by_fragrance[news_bounds[i]:news_bounds[i + 1]])) or None,
+        })
+
+    fragrances = pd.DataFrame(rows, columns=frag.columns)
+    fragrances["year"] = fragrances["year"].astype("Int64")
+
+    def usage(sets: List[np.ndarray], size: int) -> np.ndarray:
+        used = np.concatenate(sets) if sets else np.zeros(0, dtype=np.int64)
+        return np.bincount(used, minlength=size)
+
+    note_names = _names(rng, words, sizes["notes"], 2)
+    accord_names = (samples["accords"]["name"].tolist() * (sizes["accords"] // len(samples["accords"]) + 1))
+    return {
+        "fragrances": fragrances,
+        "brands": _reference_table(samples["brands"], "b", sizes["brands"], brand_names, "brand_count",
+                                   np.bincount(brand_ids - 1, minlength=sizes["brands"])),
+        "perfumers": _reference_table(samples["perfumers"], "p", sizes["perfumers"], perfumer_names,
+                                      "perfumes_count", usage(perfumer_sets, sizes["perfumers"])),
+        "notes": _reference_table(samples["notes"], "n", sizes["notes"], note_names, "fragrance_count",
+                                  usage(note_sets, sizes["notes"])),
+        "accords": _reference_table(samples["accords"], "a", sizes["accords"], accord_names[:sizes["accords"]],
+                                    "fragrance_count", usage(accord_sets, sizes["accords"])),
+        "news_nids": nids,
+        "news_pids": [pids[s] for s in news_sets],
+        "comment_counts": comment_counts,
+        "brand_names": brand_names,
+        "brand_of": brand_ids,
+        "perfumer_names": perfumer_names,
+        "perfumer_sets": perfumer_sets,
+    }
+
+
+def _pool(rng: np.random.Generator, values: Sequence, n: int) -> pa.Array:
+    """n values drawn uniformly from a small pool, as an Arrow array."""
+    return pa.array(list(values)).take(pa.array(rng.integers(0, len(values), n)))
+
+
+def write_comments(rng: np.random.Generator, path: Path, pids: np.ndarray, counts: np.ndarray,
+                   sample: pd.DataFrame, row_group_size: int = ROW_GROUP_SIZE) -> int:
+    """Stream comments.parquet in row groups, grouped by pid in catalog order.
+
+    Row groups hold whole fragrances, about row_group_size comments each.
+    """
+    lang_p = 1.0 / np.arange(1, len(COMMENT_LANGUAGES) + 1) ** 1.3
+    lang_p = lang_p / lang_p.sum()
+    schema = pa.schema([("pid", pa.int32()), ("lang", pa.string()), ("comment_id", pa.string()),
+                        ("author", pa.string()), ("date", pa.string()), ("text", pa.large_string()),
+                        ("avatar_url", pa.string()), ("gradient_class", pa.string())])
+    bounds = np.concatenate(([0], np.cumsum(counts)))
+    texts = sample["text"].tolist()
+    authors = sample["author"].tolist()
+    gradients = sample["gradient_class"].unique().tolist()
+
+    written = 0
+    with pq.ParquetWriter(path, schema, compression="zstd") as writer:
+        start = 0
+        while start < len(pids):
+            # Whole fragrances per batch, about row_group_size comments
+            stop = max(int(np.searchsorted(bounds, bounds[start] + row_group_size, side="right")) - 1, start + 1)
+            stop = min(stop, len(pids))
+            batch_pids = np.repeat(pids[start:stop], counts[start:stop]).astype(np.int32)
+            k = len(batch_pids)
+            start = stop
+            if k == 0:
+                continue
+
+            lang_codes = rng.choice(len(COMMENT_LANGUAGES), k, p=lang_p)
+            order = np.lexsort((lang_codes, batch_pids))
+            batch_pids, lang_codes = batch_pids[order], lang_codes[order]
+            langs = [COMMENT_LANGUAGES[c] for c in lang_codes]
+            hashes = rng.integers(0, 1 << 48, k)
+            # Page-formatted 'MM/DD/YY HH:MM' like the real file, a few ISO days mixed in
+            minutes = rng.integers(0, (np.datetime64("2026-06-01T00:00") - np.datetime64("2008-01-01T00:00"))
+                                   .astype(int), k)
+            stamps = pd.to_datetime(np.datetime64("2008-01-01T00:00") + minutes)
+            dates = stamps.strftime("%m/%d/%y %H:%M").to_numpy(dtype=object)
+            iso = rng.random(k) < ISO_DATE_SHARE
+            dates[iso] = stamps[iso].strftime("%Y-%m-%d")
+
+            writer.write_table(pa.table({
+                "pid": batch_pids,
+                "lang": langs,
+                "comment_id": [f"{p}_{lang}_{h:012x}" for p, lang, h in zip(batch_pids.tolist(), langs, hashes.tolist())],
+                "author": _pool(rng, authors, k),
+                "date": dates,
+                "text": _pool(rng, texts, k).cast(pa.large_string()),
+                "avatar_url": [f"https://fimgs.net/mdimg/avatari/m.{u}.jpg" for u in rng.integers(1, 900_000, k).tolist()],
+                "gradient_class": _pool(rng, gradients, k),
+            }, schema=schema))
+            written += k
+    return written
+
+
+def write_news(rng: np.random.Generator, out: Path, sizes: Dict[str, int], generated: Dict,
+               samples: Dict[str, pd.DataFrame]) -> None:
+    """Write news.parquet and news_comments.parquet."""
+    news_sample, comment_sample = samples["news"], samples["news_comments"]
+    nids = generated["news_nids"]
+    n = len(nids)
+
+    # Comments per article: ~89% of articles are commented
+    weights = np.where(rng.random(n) < COMMENTED_NEWS_SHARE, _popularity(rng, n, 0.7), 0.0)
+    comment_counts = rng.multinomial(sizes["news_comments"], weights / weights.sum())
+
+    archived = rng.random(n) < ARCHIVED_SHARE
+    # Modern articles are dated in nid order, 2008..2026
+    published = np.linspace(1_199_145_600, 1_780_000_000, n).astype(np.int64)
+
+    fragrance_names = generated["fragrances"]["name"].to_numpy()
+    brand_names, brand_of = generated["brand_names"], generated["brand_of"]
+    pid_position = pd.Index(generated["fragrances"]["pid"])
+    related_brands, related_perfumers, titles = [], [], []
+    perfumer_of = generated["perfumer_sets"]
+    for pids in generated["news_pids"]:
+        positions = pid_position.get_indexer(pids)
+        brands = sorted({brand_names[brand_of[p] - 1] for p in positions})
+        perfumers = sorted({generated["perfumer_names"][q] for p in positions[:3] for q in perfumer_of[p]})
+        related_brands.append(_json_list(b.replace(" ", "+") for b in brands))
+        related_perfumers.append(_json_list(perfumers))
+        titles.append(f"{fragrance_names[positions[0]]} by {brands[0]}" if len(pids) else
+                      news_sample["title"].iloc[rng.integers(len(news_sample))])
+
+    categories = list(NEWS_CATEGORIES)
+    category_p = np.array(list(NEWS_CATEGORIES.values()))
+    pick = rng.integers(0, len(news_sample), n)
+    news = pa.table({
+        "nid": nids.astype(np.int32),
+        "title": titles,
+        "category": [categories[c] for c in rng.choice(len(categories), n, p=category_p / category_p.sum())],
+        "author": news_sample["author"].to_numpy()[pick],
+        "description": news_sample["description"].to_numpy()[pick],
+        "text": news_sample["text"].to_numpy()[pick],
+        "text_html": news_sample["text_html"].to_numpy()[pick],
+        "main_image": [f"https://fimgs.net/mdimg/vijesti/o.{nid}.2.jpg" for nid in nids],
+        "article_images": news_sample["article_images"].to_numpy()[pick],
+        "url": [f"https://www.fragrantica.com/news/{_slug(t)}-{nid}.html" for t, nid in zip(titles, nids)],
+        "is_archived": archived,
+        "related_pids": [_json_list(sorted(map(str, p))) for p in generated["news_pids"]],
+        "related_brands": related_brands,
+        "related_perfumers": related_perfumers,
+        "comments_count": comment_counts.astype(np.int32),
+        "date_unix": np.where(archived, 0, published),
+    })
+    pq.write_table(news, out / "news.parquet", row_group_size=ROW_GROUP_SIZE, compression="zstd")
+
+    # Comments numbered per article, newest first; date_unix is always set
+    k = int(comment_counts.sum())
+    comment_nids = np.repeat(nids, comment_counts)
+    numbers = np.arange(k) - np.repeat(np.cumsum(comment_counts) - comment_counts, comment_counts) + 1
+    stamps = np.repeat(published, comment_counts) + 86_400 * 60 - numbers * rng.integers(600, 86_400, k)
+    dates = pd.to_datetime(stamps, unit="s").strftime("%m/%d/%y %H:%M")
+    pick = rng.integers(0, len(comment_sample), k)
+    news_comments = pa.table({
+        "nid": comment_nids.astype(np.int32),
+        "comment_id": [f"{nid}_{i:03d}" for nid, i in zip(comment_nids.tolist(), numbers.tolist())],
+        "author": comment_sample["author"].to_numpy()[pick],
+        "date": list(dates),
+        "date_unix": stamps.astype(np.int64),
+        "text": comment_sample["text"].to_numpy()[pick],
+        "avatar_url": comment_sample["avatar_url"].to_numpy()[pick],
+        "gradient": comment_sample["gradient"].to_numpy()[pick],
+        # The first comment of an article is never a reply
+        "is_reply": (rng.random(k) < REPLY_RATE) & (numbers > 1),
+    })
+    pq.write_table(news_comments, out / "news_comments.parquet", row_group_size=ROW_GROUP_SIZE,
+                   compression="zstd")
+
+
+def generate_fragdb(
+    out_dir: str,
+    scale: float = 1.0,
+    seed: int = 0,
+    samples_dir: str = "../../samples",
+    parquet: bool = True,
+    row_group_size: int = ROW_GROUP_SIZE
+) -> Dict[str, int]:
+    """Write a synthetic FragDB with the published schema.
+
+    Args:
+        out_dir: Output directory (created if missing); files use the full
+            database names (fragrances.csv, comments.parquet, ...)
+        scale: Fraction of the full row counts (1.0 = FULL_SIZES)
+        seed: Random seed; the same seed and scale give identical files
+        samples_dir: Directory with the sample files used as templates
+        parquet: Also write comments, news and news_comments parquet files
+        row_group_size: Approximate rows per comments.parquet row group
+
+    Returns:
+        Dictionary mapping table name to rows written
+    """
+    out = Path(out_dir)
+    out.mkdir(parents=True, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    sizes = table_sizes(scale)
+
+    samples = load_fragdb(samples_dir)
+    base = Path(samples_dir)
+    for name in ("comments", "news", "news_comments"):
+        samples[name] = pd.read_parquet(base / f"{name}_sample.parquet")
+
+    generated = generate_fragrances(rng, sizes, samples, _vocabulary(samples))
+    written = {}
+    for name in ("fragrances", "brands", "perfumers", "notes", "accords"):
+        generated[name].to_csv(out / f"{name}.csv", sep="|", index=False)
+        written[name] = len(generated[name])
+    shutil.copy(base / "translations.csv", out / "translations.csv")
+
+    if parquet:
+        written["comments"] = write_comments(rng, out / "comments.parquet",
+                                             generated["fragrances"]["pid"].to_numpy(),
+                                             generated["comment_counts"], samples["comments"], row_group_size)
+        write_news(rng, out, sizes, generated, samples)
+        written["news"] = sizes["news"]
+        written["news_comments"] = sizes["news_comments"]
+    return written
+
+
+@contextlib.contextmanager
+def synthetic_dataset(scale: float = 0.1, row_group_size: int = 20_000, **options) -> Iterator[str]:
+    """Generate a synthetic FragDB in a temporary directory, removed on exit.
+
+    Args:
+        scale: Fraction of the full row counts
+        row_group_size: Approximate rows per comments.parquet row group
+        **options: Other generate_fragdb() arguments (seed, parquet, ...)
+
+    Yields:
+        Path of the directory holding the generated files
+    """
+    with tempfile.TemporaryDirectory(prefix="fragdb_synthetic_") as out_dir:
+        generate_fragdb(out_dir, scale=scale, row_group_size=row_group_size, **options)
+        yield out_dir
+
+
+def main(out_dir: Optional[str] = None, scale: float = 0.02):
+    from parse_columns import check_against_scalar
+    from parse_dates import parse_dates
+
+    print("=== FragDB v4.6 Synthetic Dataset ===\n")
+
+    with contextlib.ExitStack() as stack:
+        if out_dir is None:
+            # Removed on exit; pass out_dir to keep the generated files
+            out_dir = stack.enter_context(tempfile.TemporaryDirectory(prefix="fragdb_synthetic_"))
+
+        start = time.perf_counter()
+        written = generate_fragdb(out_dir, scale=scale)
+        seconds = time.perf_counter() - start
+        print(f"Generated scale {scale} in {seconds:.1f} s -> {out_dir}")
+        for name, rows in written.items():
+            path = Path(out_dir) / (f"{name}.parquet" if name in ("comments", "news", "news_comments")
+                                    else f"{name}.csv")
+            print(f"  {name:15s} {rows:>10,} rows  {path.stat().st_size / 1e6:8.1f} MB")
+        print()
+
+        db = load_fragdb(out_dir)
+        print("First fragrance:")
+        for field, value in db["fragrances"].iloc[0].items():
+            print(f"  {field:14s} {str(value)[:90]}")
+        print()
+
+        # The vectorized parsers agree with the scalar ones on synthetic rows too
+        check_against_scalar(db["fragrances"].head(500))
+        print("parse_columns.py agrees with parse_fields.py on the synthetic rows")
+
+        # Foreign keys resolve
+        brand_ids = db["fragrances"]["brand"].str.split(";").str[1]
+        assert brand_ids.isin(db["brands"]["id"]).all()
+        comment_pids = pq.read_table(Path(out_dir) / "comments.parquet", columns=["pid"])["pid"].to_numpy()
+        assert np.isin(comment_pids, db["fragrances"]["pid"].to_numpy()).all()
+        print("Brand IDs and comment pids resolve against the generated tables")
+
+        # Review dates mix the page format and ISO days, and all of them parse
+        parsed = parse_dates(pq.read_table(Path(out_dir) / "comments.parquet", columns=["date"])["date"])
+        assert parsed.valid.all()
+        print(f"Review dates: {(parsed.formats == 0).mean():.0%} 'MM/DD/YY HH:MM', "
+              f"{(parsed.formats == 1).mean():.0%} ISO")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,703 @@
+#!/usr/bin/env python3
+"""
+FragDB - Full-Text Search Example (v4.6)
+
+Demonstrates how to search the text of the reviews in comments.parquet
+(4.6M rows) and of the articles in news.parquet (title and text) with
+BM25 ranking, instead of scanning every string with str.contains.
+
+build_text_index() streams a parquet file in record batches and writes
+an inverted index in segments of about SEGMENT_DOCS documents:
+
+- terms.npy      sorted 64-bit hashes of the segment's terms
+- df.npy         documents containing each term
+- docs.npy       posting lists: doc ids, delta-encoded as LEB128 varints
+- tfs.npy        term frequencies, varint-encoded, in the same order
+- *_offsets.npy  where each term's postings start in docs.npy / tfs.npy
+- pids.npy, tags.npy, days.npy, lengths.npy, rows.npy, keys.npy
+                 per document: pid, language (reviews) or category (news)
+                 code, days since 1970-01-01 (-1 if unknown), length in
+                 tokens, row in the source file and comment_id hash / nid
+
+Every file is a plain .npy array opened with mmap: a query touches only
+the postings of its terms. Segments are append-only. Building the index
+of a new snapshot into an existing directory skips the documents already
+indexed (by comment_id or nid) and adds segments for the new ones.
+delete_documents() marks documents of a segment as deleted (deleted.npy)
+instead of rewriting it; searches skip them, and a deleted document can
+be indexed again, so an edited review is a delete plus an append.
+rebase_segments() then points the older segments at the new snapshot
+(rows looked up by comment_id or nid), so old snapshots can be deleted.
+
+Tokenizing is vectorized with pyarrow.compute: NFKC normalization, lower
+case, then a split on anything that is not a letter, digit or combining
+mark, so accents, Cyrillic, Greek, Arabic or Devanagari words stay whole.
+Chinese, Japanese and Thai are written without spaces; their runs are
+indexed as overlapping character bigrams ("香水很好" -> 香水, 水很, 很好).
+
+    index = TextIndex("reviews.idx")
+    index.search("smoky vanilla", k=10, lang="en", date_from="2024-01-01")
+    index.search("oud", pid=704)
+    TextIndex("news.idx").search("chocolate", category="Raw Materials")
+"""
+
+import hashlib
+import json
+import os
+import re
+import tempfile
+import time
+from datetime import date
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from instrumentation import span
+from parse_dates import to_days
+
+INDEX_VERSION = 1
+SEGMENT_DOCS = 1 << 18
+
+POSTING_ARRAYS = ("terms", "df", "doc_offsets", "docs", "tf_offsets", "tfs")
+DOC_ARRAYS = ("pids", "tags", "days", "lengths", "rows", "keys")
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+# Split on anything but letters, digits and combining marks (Devanagari, Thai vowel signs)
+SEPARATORS = r"[^\pL\pN\pM]+"
+# Scripts written without spaces between words
+UNSPACED = r"[\p{Han}\p{Hiragana}\p{Katakana}\p{Thai}]"
+# The same scripts as character ranges for Python's re (no \p{...} classes)
+UNSPACED_CHARS = "\u0e00-\u0e7f\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff"
+# Unspaced runs in group 1, other runs unmatched by the group
+UNSPACED_RUNS = re.compile(f"([{UNSPACED_CHARS}]+)|[^{UNSPACED_CHARS}]+")
+
+# Columns read per source, the text to index and the per-document tag
+SOURCES = {
+    "comments": {"columns": ["pid", "lang", "date", "comment_id", "text"], "tag": "lang"},
+    "news": {"columns": ["nid", "category", "date_unix", "title", "text"], "tag": "category"},
+}
+
+DateLike = Union[str, date, np.datetime64]
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def _hashes(values: List[str]) -> np.ndarray:
+    return np.fromiter((_hash(v) for v in values), dtype=np.uint64, count=len(values))
+
+
+def document_keys(ids: Union[pa.Array, List], source: str) -> np.ndarray:
+    """Index keys of documents: comment_id hashes (reviews) or nids (news)."""
+    values = ids.to_pylist() if isinstance(ids, (pa.Array, pa.ChunkedArray)) else list(ids)
+    if source == "comments":
+        return _hashes([str(v) for v in values])
+    return np.array([-1 if v is None else v for v in values], dtype=np.int64).astype(np.uint64)
+
+
+def _bigrams(token: str) -> List[str]:
+    """Split a token into its spaced runs and the character bigrams of its unspaced runs."""
+    out = []
+    for match in UNSPACED_RUNS.finditer(token):
+        run = match.group(0)
+        if len(run) > 1 and match.group(1):
+            out.extend(run[i:i + 2] for i in range(len(run) - 1))
+        else:
+            out.append(run)
+    return out
+
+
+def tokenize(texts: pa.Array) -> Tuple[pa.Array, np.ndarray]:
+    """Tokens of a string array.
+
+    Args:
+        texts: (large_)string array; nulls have no tokens
+
+    Returns:
+        (tokens, parents): every token, and the index of the text it came from
+    """
+    normalized = pc.utf8_lower(pc.utf8_normalize(texts, form="NFKC"))
+    lists = pc.split_pattern_regex(normalized, pattern=SEPARATORS)
+    tokens = pc.list_flatten(lists)
+    parents = pc.list_parent_indices(lists).to_numpy()
+    keep = pc.greater(pc.utf8_length(tokens), 0)
+    tokens, parents = tokens.filter(keep), parents[keep.to_numpy(zero_copy_only=False)]
+
+    # Unspaced scripts are rare in reviews: expand just those tokens in Python
+    encoded = pc.dictionary_encode(tokens)
+    unspaced = pc.match_substring_regex(encoded.dictionary, pattern=UNSPACED).to_numpy(zero_copy_only=False)
+    unspaced = unspaced[encoded.indices.to_numpy()]
+    if not unspaced.any():
+        return tokens, parents
+    expanded = [_bigrams(token) for token in tokens.filter(pa.array(unspaced)).to_pylist()]
+    counts = np.array([len(parts) for parts in expanded], dtype=np.int64)
+    tokens = pa.concat_arrays([tokens.filter(pa.array(~unspaced)),
+                               pa.array([part for parts in expanded for part in parts], type=tokens.type)])
+    parents = np.concatenate((parents[~unspaced], np.repeat(parents[unspaced], counts)))
+    return tokens, parents
+
+
+def query_terms(query: str) -> List[str]:
+    """Distinct terms of a query, tokenized like the indexed text."""
+    tokens, _ = tokenize(pa.array([query]))
+    return list(dict.fromkeys(tokens.to_pylist()))
+
+
+def encode_varints(values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """LEB128-encode unsigned 32-bit integers.
+
+    Returns:
+        (bytes, sizes): the encoded uint8 stream and the byte count of each value
+    """
+    values = values.astype(np.uint64)
+    sizes = np.ones(len(values), dtype=np.int64)
+    for k in range(1, 5):
+        sizes += values >= (1 << (7 * k))
+    ends = np.cumsum(sizes)
+    starts = ends - sizes
+    out = np.empty(int(ends[-1]) if len(values) else 0, dtype=np.uint8)
+    for k in range(5):
+        has = sizes > k
+        more = (sizes[has] > k + 1).astype(np.uint64) << np.uint64(7)
+        out[starts[has] + k] = ((values[has] >> np.uint64(7 * k)) & np.uint64(0x7F)) | more
+    return out, sizes
+
+
+def decode_varints(data: np.ndarray) -> np.ndarray:
+    """Decode a LEB128 uint8 stream written by encode_varints()."""
+    if len(data) == 0:
+        return np.zeros(0, dtype=np.int64)
+    last = data < 0x80
+    if last.all():
+        # Every value fits in one byte: common for tf and for the gaps of frequent terms
+        return data.astype(np.int64)
+    ends = np.flatnonzero(last)
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    shifts = (np.arange(len(data)) - np.repeat(starts, ends - starts + 1)) * 7
+    parts = (data & 0x7F).astype(np.int64) << shifts
+    return np.bitwise_or.reduceat(parts, starts)
+
+
+def _to_day(value: DateLike) -> int:
+    return int(np.datetime64(value, "D").astype(np.int64))
+
+
+def _codes(values: pa.Array, tags: Dict[str, int]) -> np.ndarray:
+    """Codes of string values in the segment's tag table (extended as needed); null -> -1."""
+    encoded = pc.dictionary_encode(values)
+    mapping = np.array([tags.setdefault(v, len(tags)) for v in encoded.dictionary.to_pylist()] + [-1],
+                       dtype=np.int16)
+    return mapping[pc.fill_null(encoded.indices, len(mapping) - 1).to_numpy()]
+
+
+def _documents(batch: pa.RecordBatch, source: str, tags: Dict[str, int]) -> Tuple[pa.Array, Dict[str, np.ndarray]]:
+    """Text to index and per-document arrays of a batch."""
+    if source == "comments":
+        days = to_days(batch.column("date"))
+        pids = batch.column("pid").to_numpy(zero_copy_only=False).astype(np.int32)
+        keys = document_keys(batch.column("comment_id"), source)
+        text = batch.column("text")
+    else:
+        # date_unix is 0 for archived articles
+        seconds = pc.fill_null(batch.column("date_unix"), 0).to_numpy()
+        days = np.where(seconds > 0, seconds // 86400, -1).astype(np.int32)
+        pids = np.full(batch.num_rows, -1, dtype=np.int32)
+        keys = pc.fill_null(batch.column("nid"), -1).to_numpy().astype(np.uint64)
+        text = pc.binary_join_element_wise(pc.fill_null(batch.column("title"), ""),
+                                           pc.fill_null(batch.column("text"), ""), "\n")
+    tag = _codes(batch.column(SOURCES[source]["tag"]), tags)
+    return text, {"pids": pids, "tags": tag, "days": days, "keys": keys}
+
+
+def _write_segment(directory: Path, batches: List[Tuple[pa.Array, np.ndarray, np.ndarray, np.ndarray]],
+                   docs: Dict[str, List[np.ndarray]]) -> Dict[str, int]:
+    """Merge the (term, doc, tf) triples of a segment's batches, sort them by term hash and doc, then write."""
+    directory.mkdir(parents=True, exist_ok=True)
+    vocabulary = pc.unique(pa.chunked_array([terms for terms, _, _, _ in batches]).combine_chunks())
+    hashes = _hashes(vocabulary.to_pylist())
+    by_hash = np.argsort(hashes, kind="stable")
+    rank = np.empty(len(by_hash), dtype=np.int64)
+    rank[by_hash] = np.arange(len(by_hash))
+
+    # Batch term numbers -> the term's rank in the segment's sorted hashes
+    term_ids = np.concatenate([rank[pc.index_in(terms, value_set=vocabulary).to_numpy()][ids]
+                               for terms, ids, _, _ in batches])
+    doc_ids = np.concatenate([doc_ids for _, _, doc_ids, _ in batches])
+    tfs = np.concatenate([tfs for _, _, _, tfs in batches])
+    order = np.lexsort((doc_ids, term_ids))
+    term_ids, doc_ids, tfs = term_ids[order], doc_ids[order], tfs[order]
+
+    df = np.bincount(term_ids, minlength=len(hashes))
+    firsts = np.cumsum(df) - df
+    deltas = np.diff(doc_ids, prepend=0)
+    deltas[firsts] = doc_ids[firsts]
+    bounds = np.concatenate((firsts, [len(doc_ids)]))
+    doc_bytes, doc_sizes = encode_varints(deltas)
+    tf_bytes, tf_sizes = encode_varints(tfs)
+
+    np.save(directory / "terms.npy", hashes[by_hash])
+    np.save(directory / "df.npy", df.astype(np.uint32))
+    np.save(directory / "docs.npy", doc_bytes)
+    np.save(directory / "doc_offsets.npy", np.concatenate(([0], np.cumsum(doc_sizes)))[bounds].astype(np.int64))
+    np.save(directory / "tfs.npy", tf_bytes)
+    np.save(directory / "tf_offsets.npy", np.concatenate(([0], np.cumsum(tf_sizes)))[bounds].astype(np.int64))
+    for name in DOC_ARRAYS:
+        np.save(directory / f"{name}.npy", np.concatenate(docs[name]))
+    return {"terms": len(hashes), "postings": len(doc_ids), "posting_bytes": len(doc_bytes) + len(tf_bytes)}
+
+
+def _save_manifest(path: Path, manifest: Dict) -> None:
+    tmp_path = path / f"manifest.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, path / "manifest.json")
+
+
+def _live_keys(directory: Path, entry: Dict) -> np.ndarray:
+    """Keys of the documents of a segment that are not deleted."""
+    keys = np.load(directory / "keys.npy")
+    if entry.get("deleted"):
+        keys = keys[~np.load(directory / "deleted.npy")]
+    return keys
+
+
+def delete_documents(out_dir: str, ids: Union[pa.Array, List]) -> int:
+    """Mark documents as deleted in every segment that holds them.
+
+    Args:
+        out_dir: Index directory (see build_text_index)
+        ids: comment_ids (reviews) or nids (news)
+
+    Returns:
+        Number of documents newly marked as deleted
+    """
+    path = Path(out_dir)
+    with open(path / "manifest.json", encoding="utf-8") as f:
+        manifest = json.load(f)
+    doomed = np.unique(document_keys(ids, manifest["source"]))
+    total = 0
+    with span("index.text_delete", rows=len(doomed)):
+        for segment in manifest["segments"]:
+            directory = path / segment["name"]
+            keys = np.load(directory / "keys.npy", mmap_mode="r")
+            deleted = np.load(directory / "deleted.npy") if segment.get("deleted") else np.zeros(len(keys), bool)
+            at = np.minimum(np.searchsorted(doomed, keys), max(len(doomed) - 1, 0))
+            hit = (doomed[at] == keys) & ~deleted if len(doomed) else np.zeros(len(keys), bool)
+            if hit.any():
+                deleted |= hit
+                np.save(directory / "deleted.npy", deleted)
+                segment["deleted"] = int(deleted.sum())
+                total += int(hit.sum())
+    manifest["deleted"] = manifest.get("deleted", 0) + total
+    _save_manifest(path, manifest)
+    return total
+
+
+def rebase_segments(out_dir: str, parquet_path: str) -> Dict:
+    """Point every segment at parquet_path, a later snapshot of the same table.
+
+    Each document's row is looked up again by its key (comment_id or nid),
+    so the text of a document is read from the new snapshot: delete the
+    documents that changed or were removed first (see delete_documents).
+    Afterwards the earlier snapshot files are no longer needed.
+
+    Args:
+        out_dir: Index directory (see build_text_index)
+        parquet_path: The new snapshot
+
+    Returns:
+        The manifest written to out_dir/manifest.json
+
+    Raises:
+        ValueError: If a live document of the index is not in parquet_path
+    """
+    path = Path(out_dir)
+    with open(path / "manifest.json", encoding="utf-8") as f:
+        manifest = json.load(f)
+    source = manifest["source"]
+    column = "comment_id" if source == "comments" else "nid"
+    keys = document_keys(pq.read_table(parquet_path, columns=[column]).column(column), source)
+    order = np.argsort(keys, kind="stable")
+    sorted_keys = keys[order]
+
+    stat = os.stat(parquet_path)
+    snapshot = {"path": os.path.abspath(parquet_path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+    moved: Dict[str, np.ndarray] = {}
+    with span("index.text_rebase", rows=len(keys)):
+        for segment in manifest["segments"]:
+            if segment["snapshot"] == snapshot:
+                continue
+            directory = path / segment["name"]
+            segment_keys = np.load(directory / "keys.npy")
+            at = np.minimum(np.searchsorted(sorted_keys, segment_keys), max(len(keys) - 1, 0))
+            found = sorted_keys[at] == segment_keys if len(keys) else np.zeros(len(segment_keys), bool)
+            live = ~np.load(directory / "deleted.npy") if segment.get("deleted") else True
+            missing = int((~found & live).sum())
+            if missing:
+                raise ValueError(f"{missing:,} documents of {segment['name']} are not in {parquet_path}")
+            # Deleted documents may be gone from the snapshot; they are never read
+            moved[segment["name"]] = np.where(found, order[at], -1).astype(np.int64)
+
+        # Nothing is written unless every segment can be moved
+        for segment in manifest["segments"]:
+            rows = moved.get(segment["name"])
+            if rows is not None:
+                tmp_path = path / segment["name"] / f"rows.{os.getpid()}.tmp.npy"
+                np.save(tmp_path, rows)
+                os.replace(tmp_path, path / segment["name"] / "rows.npy")
+                segment["snapshot"] = snapshot
+    _save_manifest(path, manifest)
+    return manifest
+
+
+def build_text_index(parquet_path: str, out_dir: str, batch_size: int = 65536,
+                     segment_docs: int = SEGMENT_DOCS) -> Dict:
+    """Index the text of comments.parquet or news.parquet, appending to out_dir.
+
+    Documents already in the index (same comment_id or nid) are skipped, so
+    indexing each new snapshot into the same directory only adds segments
+    for what is new. The manifest is rewritten after every segment: an
+    interrupted build leaves a valid index.
+
+    Args:
+        parquet_path: comments.parquet or news.parquet (detected from the schema)
+        out_dir: Index directory (created if missing)
+        batch_size: Rows read per batch
+        segment_docs: Documents per segment
+
+    Returns:
+        The manifest written to out_dir/manifest.json
+    """
+    path = Path(out_dir)
+    path.mkdir(parents=True, exist_ok=True)
+    parquet_file = pq.ParquetFile(parquet_path, memory_map=True)
+    source = "news" if "nid" in parquet_file.schema_arrow.names else "comments"
+
+    manifest = {"version": INDEX_VERSION, "source": source, "tag_field": SOURCES[source]["tag"],
+                "docs": 0, "tokens": 0, "segments": []}
+    if (path / "manifest.json").exists():
+        with open(path / "manifest.json", encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get("version") != INDEX_VERSION or manifest["source"] != source:
+            raise ValueError(f"{out_dir} is not a version {INDEX_VERSION} {source} index")
+    indexed = [_live_keys(path / segment["name"], segment) for segment in manifest["segments"]]
+    indexed = np.sort(np.concatenate(indexed)) if indexed else np.zeros(0, dtype=np.uint64)
+
+    stat = os.stat(parquet_path)
+    snapshot = {"path": os.path.abspath(parquet_path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+    triples: List[Tuple[pa.Array, np.ndarray, np.ndarray, np.ndarray]] = []
+    docs: Dict[str, List[np.ndarray]] = {name: [] for name in DOC_ARRAYS}
+    tags: Dict[str, int] = {}
+    count = 0
+
+    def flush():
+        nonlocal triples, docs, tags, count
+        if count:
+            name = f"seg_{len(manifest['segments']):06d}"
+            with span("index.text_segment", rows=count):
+                stats = _write_segment(path / name, triples, docs)
+            tokens = int(sum(int(lengths.sum()) for lengths in docs["lengths"]))
+            manifest["segments"].append({"name": name, "docs": count, "tokens": tokens, **stats,
+                                         "tags": sorted(tags, key=tags.get), "snapshot": snapshot})
+            manifest["docs"] += count
+            manifest["tokens"] += tokens
+            _save_manifest(path, manifest)
+        triples, docs, tags, count = [], {name: [] for name in DOC_ARRAYS}, {}, 0
+
+    first_row = 0
+    with span("index.text") as s:
+        for batch in parquet_file.iter_batches(batch_size=batch_size, columns=SOURCES[source]["columns"]):
+            rows = np.arange(first_row, first_row + batch.num_rows, dtype=np.int64)
+            first_row += batch.num_rows
+            text, arrays = _documents(batch, source, tags)
+            new = np.ones(len(rows), dtype=bool)
+            if len(indexed):
+                at = np.minimum(np.searchsorted(indexed, arrays["keys"]), len(indexed) - 1)
+                new = indexed[at] != arrays["keys"]
+            if not new.any():
+                continue
+            if not new.all():
+                text = text.filter(pa.array(new))
+                arrays = {name: values[new] for name, values in arrays.items()}
+                rows = rows[new]
+
+            tokens, parents = tokenize(text)
+            lengths = np.bincount(parents, minlength=len(rows)).astype(np.int32)
+            # Count (term, doc) pairs on integer keys: term number in the high bits, doc in the low
+            encoded = pc.dictionary_encode(tokens)
+            keys = (encoded.indices.to_numpy().astype(np.int64) << 32) | parents
+            keys, tfs = np.unique(keys, return_counts=True)
+            triples.append((encoded.dictionary, keys >> 32, (keys & 0xFFFFFFFF) + count, tfs))
+            for name, values in {**arrays, "lengths": lengths, "rows": rows}.items():
+                docs[name].append(values)
+            count += len(rows)
+            s.add(rows=len(rows), bytes_read=text.nbytes)
+            if count >= segment_docs:
+                flush()
+        flush()
+    _save_manifest(path, manifest)
+    return manifest
+
+
+class _Segment:
+    """Memory-mapped arrays of one segment."""
+
+    def __init__(self, directory: Path, entry: Dict):
+        self.entry = entry
+        self.tag_codes = {tag: code for code, tag in enumerate(entry["tags"])}
+        for name in POSTING_ARRAYS + DOC_ARRAYS:
+            setattr(self, name, np.load(directory / f"{name}.npy", mmap_mode="r"))
+        self.deleted = np.load(directory / "deleted.npy") if entry.get("deleted") else None
+
+    def find(self, term_hash: np.uint64) -> int:
+        """Position of a term in the segment, or -1."""
+        i = int(np.searchsorted(self.terms, term_hash))
+        return i if i < len(self.terms) and self.terms[i] == term_hash else -1
+
+    def postings(self, i: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Doc ids and term frequencies of the i-th term."""
+        docs = np.cumsum(decode_varints(self.docs[self.doc_offsets[i]:self.doc_offsets[i + 1]]))
+        return docs, decode_varints(self.tfs[self.tf_offsets[i]:self.tf_offsets[i + 1]])
+
+
+class TextIndex:
+    """BM25 search over an index written by build_text_index()."""
+
+    def __init__(self, directory: str):
+        """
+        Args:
+            directory: Output directory of build_text_index()
+        """
+        path = Path(directory)
+        with open(path / "manifest.json", encoding="utf-8") as f:
+            self.manifest = json.load(f)
+        if self.manifest.get("version") != INDEX_VERSION:
+            raise ValueError(f"{directory} is not a version {INDEX_VERSION} text index")
+        self.source = self.manifest["source"]
+        self.segments = [_Segment(path / entry["name"], entry) for entry in self.manifest["segments"]]
+        self.avg_length = self.manifest["tokens"] / max(self.manifest["docs"], 1)
+        self._norm_cache: Dict[int, np.ndarray] = {}
+
+    def __len__(self) -> int:
+        return self.manifest["docs"]
+
+    def _norms(self, number: int) -> np.ndarray:
+        """BM25 length normalization of every document of a segment (cached)."""
+        if number not in self._norm_cache:
+            lengths = np.asarray(self.segments[number].lengths, dtype=np.float32)
+            self._norm_cache[number] = K1 * (1 - B + B * lengths / np.float32(self.avg_length))
+        return self._norm_cache[number]
+
+    def _check_filters(self, pid: Optional[int], lang: Optional[str], category: Optional[str]) -> Optional[str]:
+        """The tag filter of this source; raises ValueError for filters it does not have."""
+        if self.source == "news" and (pid is not None or lang is not None):
+            raise ValueError("news articles can be filtered by category and date, not by pid or lang")
+        if self.source == "comments" and category is not None:
+            raise ValueError("reviews can be filtered by pid, lang and date, not by category")
+        return lang if self.source == "comments" else category
+
+    def search(self, query: str, k: int = 10, pid: Optional[int] = None, lang: Optional[str] = None,
+               category: Optional[str] = None, date_from: Optional[DateLike] = None,
+               date_to: Optional[DateLike] = None, match_all: bool = False) -> pd.DataFrame:
+        """Top k documents for a query by BM25.
+
+        Args:
+            query: Free text, tokenized like the indexed text
+            k: Number of results
+            pid: Only reviews of this fragrance (reviews)
+            lang: Only reviews in this language (reviews)
+            category: Only articles of this category (news)
+            date_from: Only documents dated on or after this day
+            date_to: Only documents dated on or before this day
+            match_all: Require every query term (default: any term)
+
+        Returns:
+            DataFrame sorted by score, with segment, row (in the segment's
+            source file), pid / nid, lang / category and date
+        """
+        tag = self._check_filters(pid, lang, category)
+        terms = query_terms(query)
+        hashes = _hashes(terms)
+        day_from = _to_day(date_from) if date_from is not None else None
+        day_to = _to_day(date_to) if date_to is not None else None
+
+        with span("search.text") as s:
+            # Term positions per segment, and document frequencies over the whole index
+            found = [[segment.find(h) for h in hashes] for segment in self.segments]
+            df = np.zeros(len(terms))
+            for segment, positions in zip(self.segments, found):
+                df += [segment.df[i] if i >= 0 else 0 for i in positions]
+            n = len(self)
+            idf = np.log1p((n - df + 0.5) / (df + 0.5))
+
+            candidates = []
+            for number, (segment, positions) in enumerate(zip(self.segments, found)):
+                code = segment.tag_codes.get(tag, -2) if tag is not None else None
+                docs, scores = [], []
+                for weight, i in zip(idf, positions):
+                    if i < 0:
+                        continue
+                    ids, tfs = segment.postings(i)
+                    s.add(rows=len(ids))
+                    keep = None if segment.deleted is None else ~segment.deleted[ids]
+                    if pid is not None:
+                        keep = (segment.pids[ids] == pid) & (keep if keep is not None else True)
+                    if code is not None:
+                        keep = (segment.tags[ids] == code) & (keep if keep is not None else True)
+                    if day_from is not None or day_to is not None:
+                        days = segment.days[ids]
+                        in_range = (days >= (day_from if day_from is not None else 0)) & (
+                            days <= (day_to if day_to is not None else np.iinfo(np.int32).max))
+                        keep = in_range & (keep if keep is not None else True)
+                    if keep is not None:
+                        ids, tfs = ids[keep], tfs[keep]
+                    docs.append(ids)
+                    scores.append(weight * tfs * (K1 + 1) / (tfs + self._norms(number)[ids]))
+                if not docs:
+                    continue
+                if len(docs) == 1:
+                    ids, total = docs[0], scores[0]
+                else:
+                    # Sum the scores of each doc: sort-based for short lists, dense for long ones
+                    ids = np.concatenate(docs)
+                    if len(ids) * 8 < segment.entry["docs"]:
+                        ids, slots = np.unique(ids, return_inverse=True)
+                    else:
+                        ids, slots = np.arange(segment.entry["docs"]), ids
+                    total = np.bincount(slots, weights=np.concatenate(scores), minlength=len(ids))
+                    matched = np.bincount(slots, minlength=len(ids)) >= (len(terms) if match_all else 1)
+                    ids, total = ids[matched], total[matched]
+                if match_all and len(docs) < len(terms):
+                    continue
+                top = np.argpartition(-total, k)[:k] if len(total) > k else np.arange(len(total))
+                candidates.append((np.full(len(top), number), ids[top], total[top]))
+
+        columns = ["score", "segment", "row", "pid" if self.source == "comments" else "nid",
+                   self.manifest["tag_field"], "date"]
+        if not candidates:
+            return pd.DataFrame(columns=columns)
+        numbers, ids, total = (np.concatenate(parts) for parts in zip(*candidates))
+        best = np.lexsort((ids, numbers, -total))[:k]
+        hits = []
+        for number, doc, score in zip(numbers[best].tolist(), ids[best].tolist(), total[best].tolist()):
+            segment = self.segments[number]
+            code, day = int(segment.tags[doc]), int(segment.days[doc])
+            hits.append((score, number, int(segment.rows[doc]),
+                         int(segment.pids[doc] if self.source == "comments" else segment.keys[doc]),
+                         segment.entry["tags"][code] if code >= 0 else None,
+                         np.datetime64(day, "D") if day >= 0 else np.datetime64("NaT")))
+        return pd.DataFrame(hits, columns=columns)
+
+    def texts(self, results: pd.DataFrame) -> List[str]:
+        """Text of search results, read from the snapshot files the segments were built from.
+
+        Raises:
+            ValueError: If a snapshot file changed since it was indexed
+        """
+        texts: Dict[Tuple[int, int], str] = {}
+        for number, rows in results.groupby("segment")["row"]:
+            snapshot = self.segments[number].entry["snapshot"]
+            stat = os.stat(snapshot["path"])
+            if (stat.st_size, stat.st_mtime_ns) != (snapshot["size"], snapshot["mtime_ns"]):
+                raise ValueError(f"{snapshot['path']} changed since it was indexed")
+            parquet_file = pq.ParquetFile(snapshot["path"], memory_map=True)
+            starts = np.cumsum([0] + [parquet_file.metadata.row_group(i).num_rows
+                                      for i in range(parquet_file.num_row_groups)])
+            wanted = np.unique(rows.to_numpy())
+            groups = np.unique(np.searchsorted(starts, wanted, side="right") - 1)
+            for group in groups:
+                column = parquet_file.read_row_group(int(group), columns=["text"]).column("text")
+                in_group = wanted[(wanted >= starts[group]) & (wanted < starts[group + 1])]
+                for row, text in zip(in_group, column.take(in_group - starts[group]).to_pylist()):
+                    texts[(number, int(row))] = text
+        return [texts[(number, row)] for number, row in zip(results["segment"], results["row"])]
+
+
+def main():
+    from synthetic_data import synthetic_dataset
+
+    print("=== FragDB v4.6 Full-Text Search ===\n")
+
+    print("Tokenizer:")
+    samples = ["Crème brûlée, TRÈS bien!", "Это мой любимый аромат", "香水很好闻", "Chanel №5 ist ein Klassiker"]
+    for text in samples:
+        print(f"  {text!r:36} -> {query_terms(text)}")
+    print()
+
+    with tempfile.TemporaryDirectory(prefix="fragdb_text_") as out_dir:
+        build_text_index("../../samples/comments_sample.parquet", f"{out_dir}/sample_reviews")
+        reviews = TextIndex(f"{out_dir}/sample_reviews")
+        hits = reviews.search("shalimar vanille", k=3)
+        print(f"=== Sample reviews ({len(reviews)}): 'shalimar vanille' ===")
+        for hit, text in zip(hits.itertuples(), reviews.texts(hits)):
+            print(f"  {hit.score:5.2f}  pid {hit.pid} {hit.lang} {hit.date:%Y-%m-%d}  {text[:60]}...")
+        print()
+
+        build_text_index("../../samples/news_sample.parquet", f"{out_dir}/sample_news")
+        news = TextIndex(f"{out_dir}/sample_news")
+        hits = news.search("chocolate cocoa", k=3)
+        print(f"=== Sample news ({len(news)}): 'chocolate cocoa' ===")
+        for hit in hits.itertuples():
+            print(f"  {hit.score:5.2f}  nid {hit.nid:<6} {hit.category}")
+        print()
+
+    # Synthetic comments at 10% scale, indexed as two snapshots
+    with synthetic_dataset(scale=0.1, row_group_size=20_000) as data_dir:
+        path = f"{data_dir}/comments.parquet"
+        parquet_file = pq.ParquetFile(path)
+        first = f"{data_dir}/comments_first.parquet"
+        with pq.ParquetWriter(first, parquet_file.schema_arrow) as writer:
+            for group in range(parquet_file.num_row_groups // 2):
+                writer.write_table(parquet_file.read_row_group(group))
+
+        index_dir = f"{data_dir}/reviews.idx"
+        start = time.perf_counter()
+        manifest = build_text_index(first, index_dir, segment_docs=100_000)
+        first_s = time.perf_counter() - start
+        first_docs = manifest["docs"]
+        start = time.perf_counter()
+        manifest = build_text_index(path, index_dir, segment_docs=100_000)
+        second_s = time.perf_counter() - start
+
+        index = TextIndex(index_dir)
+        texts = pq.read_table(path, columns=["pid", "text"]).to_pandas()
+        posting_mb = sum(segment["posting_bytes"] for segment in manifest["segments"]) / 1e6
+        print("=== Synthetic reviews (10% scale) ===")
+        print(f"  first snapshot:  {first_docs:,} reviews indexed in {first_s:.1f} s")
+        print(f"  second snapshot: {manifest['docs'] - first_docs:,} new reviews appended in {second_s:.1f} s "
+              f"({len(manifest['segments'])} segments)")
+        print(f"  postings: {sum(segment['postings'] for segment in manifest['segments']):,} "
+              f"in {posting_mb:.0f} MB for {texts['text'].str.len().sum() / 1e6:.0f}M characters of text")
+        print()
+
+        queries = [("perfume", {}), ("аромат", {"lang": "ru"}), ("аромат который", {"match_all": True}),
+                   ("parfum", {"lang": "fr", "date_from": "2020-01-01"}),
+                   ("perfume like", {"pid": int(texts["pid"].iloc[0])})]
+        print("=== Query times ===")
+        for query, filters in queries:
+            index.search(query, **filters)
+            start = time.perf_counter()
+            hits = index.search(query, **filters)
+            search_ms = (time.perf_counter() - start) * 1000
+            word = query.split()[0]
+            assert all(word in text.lower() for text in index.texts(hits))
+            print(f"  {query!r:16} {str(filters):44} {search_ms:6.2f} ms  {len(hits)} hits, "
+                  f"top score {hits['score'].max():.2f}")
+
+        start = time.perf_counter()
+        matches = texts["text"].str.contains("perfume", case=False, regex=False)
+        scan_ms = (time.perf_counter() - start) * 1000
+        print(f"  str.contains('perfume') scan of {len(texts):,} loaded reviews: {scan_ms:.0f} ms "
+              f"({int(matches.sum()):,} matches, unranked)")
+
+
+if __name__ == "__main__":
+    main()